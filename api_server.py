@@ -0,0 +1,239 @@
+"""Headless HTTP API for querying and ingesting collections.
+
+Runs next to the Streamlit UI and uses the same process-wide pipeline and
+Chroma client registries. Queries use the async pipeline path; opening
+pipelines and ingestion run on bounded worker pools.
+
+    uvicorn api_server:app --host 0.0.0.0 --port 8000
+    python api_server.py --port 8000
+"""
+from database.vector_db import get_persistent_client, get_vector_manager, collection_name_for
+from rag_pipeline.create_rag import RAGPipeline
+from rag_pipeline.registry import pipeline_registry
+from rag_pipeline.cascade import cascade_stats
+from utils.scheduler import get_scheduler
+from utils.metrics import metrics_registry, start_metrics_file
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+load_dotenv()
+
+PERSIST_DIR = os.getenv("PERSISTENT_DIR")
+QUERY_WORKERS = int(os.getenv("API_QUERY_WORKERS", "8"))
+INGEST_WORKERS = int(os.getenv("API_INGEST_WORKERS", "1"))
+
+app = FastAPI(title="Universal RAG System API")
+start_metrics_file()
+query_executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="api-query")
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="api-ingest")
+ingest_jobs = {}
+ingest_jobs_lock = threading.Lock()
+
+
+class QueryRequest(BaseModel):
+    collection: str
+    question: str
+    k: Optional[int] = None
+    llm_model: Optional[str] = None
+
+
+class SearchRequest(BaseModel):
+    query: str
+    collection: Optional[str] = None
+    collections: Optional[List[str]] = None
+    k: int = 5
+
+
+class IngestRequest(BaseModel):
+    folder_path: str
+    embeddings_model: Optional[str] = None
+    llm_model: Optional[str] = None
+    parent_retrieval: bool = False
+
+
+def serialize_document(doc) -> Dict[str, Any]:
+    return {"content": doc.page_content, "metadata": doc.metadata}
+
+
+def serialize_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {key: value for key, value in result.items() if key != "source_documents"}
+    payload["sources"] = [serialize_document(doc) for doc in result.get("source_documents", [])]
+    return payload
+
+
+def get_pipeline(collection_name: str, llm_model: Optional[str] = None) -> RAGPipeline:
+    """Open (or reuse) a query-only pipeline for a collection using the models it was built with."""
+    try:
+        collection = get_persistent_client(PERSIST_DIR).get_collection(name=collection_name)
+    except Exception:
+        raise HTTPException(status_code=404, detail=f"Collection '{collection_name}' not found")
+    metadata = collection.metadata or {}
+    source_dir = metadata.get("source_directory")
+    if not source_dir:
+        raise HTTPException(status_code=409, detail=f"Collection '{collection_name}' has no source_directory metadata")
+    return pipeline_registry.get(
+        rag_dir=source_dir,
+        persist_dir=PERSIST_DIR,
+        embeddings_model=metadata.get("embeddings_model") or os.getenv("EMBEDDINGS_MODEL"),
+        llm_model=llm_model or os.getenv("LLM_MODEL"),
+        query_only=True,
+        small_llm_model=os.getenv("SMALL_LLM_MODEL")
+    )
+
+
+async def run_blocking(executor: ThreadPoolExecutor, func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/collections")
+async def list_collections():
+    def collect():
+        collections = []
+        for collection in get_persistent_client(PERSIST_DIR).list_collections():
+            metadata = collection.metadata or {}
+            collections.append({
+                "name": collection.name,
+                "chunks": collection.count(),
+                "source_directory": metadata.get("source_directory"),
+                "embeddings_model": metadata.get("embeddings_model"),
+                "retrieval_mode": metadata.get("retrieval_mode", "chunk")
+            })
+        return collections
+    return {"collections": await run_blocking(query_executor, collect)}
+
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    pipeline = await run_blocking(query_executor, get_pipeline, request.collection, request.llm_model)
+    start_time = time.perf_counter()
+    result = await pipeline.aask_detailed(request.question, k=request.k)
+    if "error" in result:
+        raise HTTPException(status_code=502, detail=result["error"])
+    payload = serialize_result(result)
+    payload["latency"] = time.perf_counter() - start_time
+    return payload
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """Newline-delimited JSON: {"type": "token"} events, then one {"type": "done"} event with the sources.
+
+    Streams from the large model directly; the SMALL_LLM_MODEL cascade only applies to /query.
+    """
+    pipeline = await run_blocking(query_executor, get_pipeline, request.collection, request.llm_model)
+    stream = await run_blocking(query_executor, pipeline.ask_stream, request.question, request.k)
+
+    def events():
+        for token in stream:
+            yield json.dumps({"type": "token", "content": token}) + "\n"
+        done = serialize_result(stream.result or {})
+        done["type"] = "done"
+        yield json.dumps(done) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    if request.collection:
+        pipeline = await run_blocking(query_executor, get_pipeline, request.collection)
+        docs = await pipeline.asearch(request.query, k=request.k)
+        return {"collection_name": request.collection, "query": request.query,
+                "results": [serialize_document(doc) for doc in docs]}
+    # No single collection: federated search across the requested (or all) collections
+    manager = await run_blocking(query_executor, get_vector_manager, PERSIST_DIR, os.getenv("EMBEDDINGS_MODEL"))
+    return await run_blocking(query_executor, manager.federated_search,
+                              request.query, request.collections, request.k)
+
+
+def run_ingest(job_id: str, request: IngestRequest):
+    with ingest_jobs_lock:
+        ingest_jobs[job_id].update(status="running", started_at=time.time())
+    try:
+        pipeline = RAGPipeline(
+            rag_dir=request.folder_path,
+            persist_dir=PERSIST_DIR,
+            embeddings_model=request.embeddings_model or os.getenv("EMBEDDINGS_MODEL"),
+            llm_model=request.llm_model or os.getenv("LLM_MODEL"),
+            parent_retrieval=request.parent_retrieval
+        )
+        pipeline_registry.invalidate(pipeline.vectordb.collection_name)
+        with ingest_jobs_lock:
+            ingest_jobs[job_id].update(status="done", chunks=pipeline.vectordb._collection.count())
+    except Exception as e:
+        with ingest_jobs_lock:
+            ingest_jobs[job_id].update(status="failed", error=str(e))
+    finally:
+        with ingest_jobs_lock:
+            ingest_jobs[job_id]["finished_at"] = time.time()
+
+
+@app.post("/ingest", status_code=202)
+async def ingest(request: IngestRequest):
+    folder = Path(request.folder_path).expanduser().resolve()
+    if not folder.is_dir():
+        raise HTTPException(status_code=400, detail=f"Folder '{request.folder_path}' does not exist")
+    request.folder_path = str(folder)
+    job_id = uuid.uuid4().hex
+    with ingest_jobs_lock:
+        ingest_jobs[job_id] = {
+            "job_id": job_id,
+            "folder_path": request.folder_path,
+            "collection_name": collection_name_for(request.folder_path),
+            "status": "queued",
+            "queued_at": time.time()
+        }
+    ingest_executor.submit(run_ingest, job_id, request)
+    return ingest_jobs[job_id]
+
+
+@app.get("/ingest/{job_id}")
+async def ingest_status(job_id: str):
+    with ingest_jobs_lock:
+        job = ingest_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown ingest job '{job_id}'")
+        return dict(job)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: stage durations, counters and Ollama queue waits."""
+    return metrics_registry.export_prometheus()
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "scheduler": get_scheduler().metrics(),
+        "pipelines": pipeline_registry.stats(),
+        "cascade": cascade_stats.stats(),
+        "stages": metrics_registry.stage_summary()
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Universal RAG System HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
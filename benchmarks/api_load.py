@@ -0,0 +1,106 @@
+"""Load test for the HTTP API against a local fake Ollama.
+
+Starts the fake Ollama, builds a throwaway collection through POST /ingest,
+then fires --requests queries at /query (or /query/stream) from --clients
+concurrent HTTP clients and reports throughput and latency percentiles.
+
+Usage (from the repository root):
+    python -m benchmarks.api_load --requests 200 --clients 20
+    python -m benchmarks.api_load --endpoint /query/stream
+"""
+from testing.fake_ollama import FakeOllamaServer, FakeOllamaConfig
+from benchmarks.async_throughput import build_corpus
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+from utils.metrics import percentile
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def call(base_url: str, path: str, payload=None):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = Request(base_url + path, data=data, headers={"Content-Type": "application/json"})
+    with urlopen(request, timeout=120) as response:
+        return response.read()
+
+
+def timed_query(base_url: str, endpoint: str, payload):
+    start_time = time.perf_counter()
+    try:
+        call(base_url, endpoint, payload)
+        return time.perf_counter() - start_time, None
+    except Exception as e:
+        return time.perf_counter() - start_time, str(e)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--endpoint", default="/query", choices=["/query", "/query/stream", "/search"])
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--chat-latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        embed_latency=args.embed_latency,
+        chat_latency=args.chat_latency,
+        tokens_per_second=args.tokens_per_second
+    )
+    with FakeOllamaServer(config=config) as fake, tempfile.TemporaryDirectory() as workdir:
+        os.environ["OLLAMA_BASE_URL"] = fake.base_url
+        os.environ["PERSISTENT_DIR"] = os.path.join(workdir, "chroma")
+        os.environ["EMBEDDINGS_MODEL"] = config.models[0]
+        os.environ["LLM_MODEL"] = config.models[1]
+        import uvicorn
+        from api_server import app
+
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        base_url = f"http://127.0.0.1:{port}"
+
+        rag_dir = os.path.join(workdir, "bench", "corpus")
+        os.makedirs(rag_dir)
+        build_corpus(rag_dir)
+        job = json.loads(call(base_url, "/ingest", {"folder_path": rag_dir}))
+        while job["status"] in ("queued", "running"):
+            time.sleep(0.2)
+            job = json.loads(call(base_url, f"/ingest/{job['job_id']}"))
+        if job["status"] != "done":
+            raise SystemExit(f"❌ Ingestion failed: {job.get('error')}")
+        print(f"✅ Ingested {job['chunks']} chunks into {job['collection_name']}")
+
+        topics = ["termination", "policy", "revenue", "warranty", "vacation"]
+        payloads = []
+        for i in range(args.requests):
+            question = f"Question {i}: what do the documents say about {topics[i % len(topics)]}?"
+            if args.endpoint == "/search":
+                payloads.append({"query": question, "collection": job["collection_name"]})
+            else:
+                payloads.append({"question": question, "collection": job["collection_name"]})
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as clients:
+            results = list(clients.map(lambda p: timed_query(base_url, args.endpoint, p), payloads))
+        wall_time = time.perf_counter() - start_time
+        server.should_exit = True
+
+        latencies = [latency for latency, error in results if error is None]
+        errors = [error for _, error in results if error is not None]
+        print('-' * 50)
+        print(f"{args.endpoint}: {len(payloads)} requests, {args.clients} clients, {wall_time:.2f}s "
+              f"({len(payloads) / wall_time:.1f} req/s)")
+        if latencies:
+            print(f"latency p50 {percentile(latencies, 50) * 1000:.0f}ms  "
+                  f"p95 {percentile(latencies, 95) * 1000:.0f}ms  "
+                  f"p99 {percentile(latencies, 99) * 1000:.0f}ms")
+        if errors:
+            print(f"⚠️  {len(errors)} requests failed, first error: {errors[0]}")
@@ -0,0 +1,97 @@
+"""Sync vs async RAGPipeline throughput against a local fake Ollama.
+
+Builds a small throwaway collection, then answers the same questions with
+ask_detailed one at a time and with aask_detailed on a single event loop with
+up to --concurrency questions in flight.
+
+Usage (from the repository root):
+    python -m benchmarks.async_throughput --questions 50 --concurrency 25
+"""
+from testing.fake_ollama import FakeOllamaServer, FakeOllamaConfig
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+CORPUS = [
+    "The termination clause allows either party to end the agreement with thirty days notice.",
+    "Policy number AX-4411 covers water damage but excludes flooding from external sources.",
+    "Quarterly revenue grew by twelve percent, driven mostly by the subscription business.",
+    "The warranty period for all hardware components is two years from the date of purchase.",
+    "Employees accrue one and a half vacation days for every month of continuous service.",
+]
+
+
+def build_corpus(folder: str, copies: int = 4):
+    for i in range(copies):
+        with open(os.path.join(folder, f"doc_{i}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(CORPUS[i % len(CORPUS):] + CORPUS[:i % len(CORPUS)]))
+
+
+def run_sync(rag_pipeline, questions):
+    start_time = time.perf_counter()
+    for question in questions:
+        rag_pipeline.ask_detailed(question)
+    return time.perf_counter() - start_time
+
+
+async def run_async(rag_pipeline, questions, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ask(question):
+        async with semaphore:
+            return await rag_pipeline.aask_detailed(question)
+
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(ask(q) for q in questions))
+    errors = [r["error"] for r in results if "error" in r]
+    if errors:
+        print(f"⚠️  {len(errors)} async questions failed, first error: {errors[0]}")
+    return time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--chat-latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        embed_latency=args.embed_latency,
+        chat_latency=args.chat_latency,
+        tokens_per_second=args.tokens_per_second
+    )
+    with FakeOllamaServer(config=config) as server, tempfile.TemporaryDirectory() as workdir:
+        os.environ["OLLAMA_BASE_URL"] = server.base_url
+        # Both passes ask the same questions; the second must not be served from the query cache
+        os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+        from rag_pipeline.create_rag import RAGPipeline
+
+        rag_dir = os.path.join(workdir, "bench", "corpus")
+        os.makedirs(rag_dir)
+        build_corpus(rag_dir)
+        rag_pipeline = RAGPipeline(
+            rag_dir=rag_dir,
+            persist_dir=os.path.join(workdir, "chroma"),
+            embeddings_model=config.models[0],
+            llm_model=config.models[1]
+        )
+
+        topics = ["termination", "policy", "revenue", "warranty", "vacation"]
+        questions = [f"Question {i}: what do the documents say about {topics[i % len(topics)]}?"
+                     for i in range(args.questions)]
+
+        sync_time = run_sync(rag_pipeline, questions)
+        async_time = asyncio.run(run_async(rag_pipeline, questions, args.concurrency))
+
+        print('-' * 50)
+        print(f"Questions: {len(questions)}  (fake Ollama: {args.embed_latency * 1000:.0f}ms embed, "
+              f"{args.chat_latency * 1000:.0f}ms to first token, {args.tokens_per_second:.0f} tok/s)")
+        print(f"sync  ask_detailed : {sync_time:7.2f}s  {len(questions) / sync_time:7.2f} q/s")
+        print(f"async aask_detailed: {async_time:7.2f}s  {len(questions) / async_time:7.2f} q/s  "
+              f"(concurrency {args.concurrency})")
+        print(f"speed-up: {sync_time / async_time:.1f}x")
@@ -0,0 +1,132 @@
+"""Interactive query latency while background ingestion runs, per scheduler limit.
+
+Starts a fake Ollama that serves --parallel requests at once (like
+OLLAMA_NUM_PARALLEL) and answers --questions questions from --clients
+threads, first on an idle server and then while --ingests threads keep
+re-ingesting their own collections at BACKGROUND priority. This is repeated
+for every scheduler limit in --limits (0 means no total limit), so the p95
+shows what the priority ordering buys once the client queues instead of Ollama.
+
+Limit 0 is the default configuration (no OLLAMA_MAX_CONCURRENCY or
+OLLAMA_NUM_PARALLEL set on the client): interactive calls are unlimited and
+background ingestion is capped at DEFAULT_BACKGROUND_CONCURRENCY (2) slots.
+
+Usage (from the repository root):
+    python -m benchmarks.interactive_latency --parallel 4 --limits 0,4
+"""
+from testing.fake_ollama import FakeOllamaServer, FakeOllamaConfig
+from benchmarks.async_throughput import build_corpus
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+TOPICS = ["termination", "policy", "revenue", "warranty", "vacation"]
+
+
+def answer_all(rag_pipeline, questions, clients):
+    """Latency (seconds) of every question, asked from ``clients`` threads."""
+    def ask(question):
+        start_time = time.perf_counter()
+        result = rag_pipeline.ask_detailed(question)
+        if "error" in result:
+            print(f"⚠️  Question failed: {result['error']}")
+        return time.perf_counter() - start_time
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        return list(executor.map(ask, questions))
+
+
+def keep_ingesting(rag_pipeline, stop, counts, index):
+    while not stop.is_set():
+        counts[index] += rag_pipeline._ingest_documents() or 0
+
+
+def run_scenario(limit, pipeline, background, questions, clients):
+    from utils import scheduler
+    from utils.metrics import percentile
+
+    # Replace the process-wide scheduler so every call below goes through this limit
+    scheduler._scheduler = scheduler.OllamaScheduler(max_concurrency=limit or None)
+    rows = []
+    for label, ingests in (("idle", []), ("ingesting", background)):
+        stop = threading.Event()
+        counts = [0] * len(ingests)
+        threads = [threading.Thread(target=keep_ingesting, args=(p, stop, counts, i), daemon=True)
+                   for i, p in enumerate(ingests)]
+        for thread in threads:
+            thread.start()
+        start_time = time.perf_counter()
+        latencies = answer_all(pipeline, questions, clients)
+        elapsed = time.perf_counter() - start_time
+        stop.set()
+        for thread in threads:
+            thread.join()
+        rows.append({
+            "limit": limit or "default",
+            "load": label,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "qps": len(questions) / elapsed,
+            "chunks_ingested": sum(counts)
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--ingests", type=int, default=4, help="Background ingestion threads")
+    parser.add_argument("--ingest-copies", type=int, default=40, help="Corpus files per ingested collection")
+    parser.add_argument("--parallel", type=int, default=4, help="Requests the fake Ollama serves at once")
+    parser.add_argument("--limits", default=None,
+                        help="Comma-separated scheduler limits to compare (default: 0,<parallel>)")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    args = parser.parse_args()
+    limits = [int(v) for v in (args.limits or f"0,{args.parallel}").split(",")]
+
+    config = FakeOllamaConfig(
+        embed_latency=args.embed_latency,
+        chat_latency=args.chat_latency,
+        tokens_per_second=args.tokens_per_second,
+        parallel=args.parallel
+    )
+    with FakeOllamaServer(config=config) as server, tempfile.TemporaryDirectory() as workdir:
+        os.environ["OLLAMA_BASE_URL"] = server.base_url
+        # Every scenario asks the same questions; later ones must not be served from the query cache
+        os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+        from rag_pipeline.create_rag import RAGPipeline
+
+        def make_pipeline(name, copies):
+            rag_dir = os.path.join(workdir, name, "corpus")
+            os.makedirs(rag_dir)
+            build_corpus(rag_dir, copies=copies)
+            return RAGPipeline(
+                rag_dir=rag_dir,
+                persist_dir=os.path.join(workdir, "chroma"),
+                embeddings_model=config.models[0],
+                llm_model=config.models[1]
+            )
+
+        pipeline = make_pipeline("interactive", 4)
+        background = [make_pipeline(f"ingest{i}", args.ingest_copies) for i in range(args.ingests)]
+        questions = [f"Question {i}: what do the documents say about {TOPICS[i % len(TOPICS)]}?"
+                     for i in range(args.questions)]
+
+        rows = []
+        for limit in limits:
+            rows.extend(run_scenario(limit, pipeline, background, questions, args.clients))
+
+        print('-' * 70)
+        print(f"Fake Ollama: {args.parallel} parallel, {args.embed_latency * 1000:.0f}ms embed, "
+              f"{args.chat_latency * 1000:.0f}ms to first token, {args.tokens_per_second:.0f} tok/s; "
+              f"{args.clients} clients, {args.ingests} background ingests")
+        print(f"{'limit':>8} {'load':>10} {'p50 (s)':>9} {'p95 (s)':>9} {'q/s':>7} {'chunks ingested':>16}")
+        for row in rows:
+            print(f"{row['limit']:>8} {row['load']:>10} {row['p50']:9.3f} {row['p95']:9.3f} "
+                  f"{row['qps']:7.2f} {row['chunks_ingested']:16d}")
@@ -0,0 +1,71 @@
+"""Index size and prompt size of parent retrieval vs regular chunks.
+
+Splits a corpus the way regular collections are built (1000-character chunks,
+200 overlap) and the way parent-retrieval collections are built (small
+children without overlap, grouped into parent windows), then reports the
+number of vectors each would embed and the context tokens k results put in
+the prompt: k chunks or k parent windows, capped at the ContextPacker token
+budget like the pipeline does. Nothing is embedded, so it runs offline in
+seconds.
+
+Without --corpus the plain-text documentation of a few standard library
+modules serves as a corpus of about 1 MB of prose.
+
+Usage (from the repository root):
+    python -m benchmarks.parent_chunk_sizes
+    python -m benchmarks.parent_chunk_sizes --corpus docs/ --child-size 200,400,600 --k 4,10
+"""
+from langchain_core.documents import Document
+from database.parent_store import CHILD_CHUNK_SIZE, CHILDREN_PER_PARENT
+from database.streaming_text_loader import text_splitter
+from rag_pipeline.context_packer import estimate_tokens
+import argparse
+import importlib
+import pydoc
+
+DEMO_MODULES = ["os", "json", "argparse", "asyncio", "collections", "logging", "email", "http.client",
+                "sqlite3", "threading", "subprocess", "unittest", "typing", "decimal", "datetime",
+                "re", "csv", "pathlib", "zipfile", "socket"]
+
+
+def demo_documents():
+    return [Document(page_content=pydoc.render_doc(importlib.import_module(name), renderer=pydoc.plaintext),
+                     metadata={"source": name})
+            for name in DEMO_MODULES]
+
+
+def average_tokens(documents) -> float:
+    return sum(estimate_tokens(d.page_content) for d in documents) / len(documents) if documents else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Folder of documents (default: standard library documentation)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--child-size", default=str(CHILD_CHUNK_SIZE), help="Comma-separated child chunk sizes")
+    parser.add_argument("--children-per-parent", type=int, default=CHILDREN_PER_PARENT)
+    parser.add_argument("--k", default="4,5,10", help="Comma-separated k values")
+    parser.add_argument("--token-budget", type=int, default=2000, help="ContextPacker budget (context_token_budget)")
+    args = parser.parse_args()
+
+    from database.document_processor import DocumentProcessor
+    documents = DocumentProcessor(args.corpus).create_documents() if args.corpus else demo_documents()
+    ks = [int(k) for k in args.k.split(",")]
+
+    chunks = text_splitter(args.chunk_size, args.chunk_overlap).split_documents(documents)
+    chunk_tokens = average_tokens(chunks)
+    print(f"{sum(len(d.page_content) for d in documents):,} characters in {len(documents)} documents")
+    header = f"{'mode':<28}{'vectors':>9}{'vs chunks':>11}{'parents':>9}" + \
+             "".join(f"{f'tokens k={k}':>13}" for k in ks)
+    print(header)
+    print('-' * len(header))
+    print(f"{f'chunks {args.chunk_size}/{args.chunk_overlap}':<28}{len(chunks):>9}{1:>11.2f}{'-':>9}" +
+          "".join(f"{min(k * chunk_tokens, args.token_budget):>13.0f}" for k in ks))
+
+    for child_size in [int(c) for c in args.child_size.split(",")]:
+        children, parents = DocumentProcessor.split_with_parents(documents, child_size, args.children_per_parent)
+        parent_tokens = average_tokens(list(parents.values()))
+        label = f"parent {child_size}x{args.children_per_parent}/0"
+        print(f"{label:<28}{len(children):>9}{len(children) / len(chunks):>11.2f}{len(parents):>9}" +
+              "".join(f"{min(k * parent_tokens, args.token_budget):>13.0f}" for k in ks))
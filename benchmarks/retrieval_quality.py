@@ -0,0 +1,217 @@
+"""Retrieval quality vs latency across k, chunk size and embedding model.
+
+Each line of the query file is a labelled query:
+
+    {"query": "What is the policy number?", "expected_sources": ["policy"]}
+    {"query": "termination notice", "expected_text": "thirty days notice"}
+
+``expected_sources`` (or ``expected_source``) match the chunk's ``source``
+metadata (the file name without extension); ``expected_text`` matches a
+substring of the chunk. Every configuration runs Retriever.search for every
+query and reports recall@k, MRR and p50/p95/p99 latency side by side.
+
+Runs offline: by default query and chunk embeddings come from the fake
+Ollama's deterministic hash embedder (``--embedder fake``); ``--embedder
+ollama`` uses OLLAMA_BASE_URL instead. With ``--snapshot`` an existing
+persisted collection is benchmarked as is and only k varies; query it with
+the embedder it was built with.
+
+Usage (from the repository root):
+    python -m benchmarks.retrieval_quality --demo
+    python -m benchmarks.retrieval_quality --corpus docs/ --queries labelled.jsonl \\
+        --k 3,5,10 --chunk-size 500,1000 --embeddings-model nomic-embed-text:latest
+    python -m benchmarks.retrieval_quality --snapshot chroma_db/ --corpus docs/ --queries labelled.jsonl
+"""
+from testing.fake_ollama import FakeOllamaServer
+from benchmarks.async_throughput import CORPUS
+from utils.metrics import percentile
+from typing import Any, Dict, List
+import argparse
+import json
+import os
+import tempfile
+import time
+
+DEMO_QUERIES = [
+    {"query": "How much notice is needed to end the agreement?", "expected_sources": ["doc_0"], "expected_texts": []},
+    {"query": "Does the policy cover flooding?", "expected_sources": ["doc_1"], "expected_texts": []},
+    {"query": "What drove revenue growth this quarter?", "expected_sources": ["doc_2"], "expected_texts": []},
+    {"query": "How long is the hardware warranty?", "expected_sources": ["doc_3"], "expected_texts": []},
+    {"query": "How many vacation days do employees accrue?", "expected_sources": ["doc_4"], "expected_texts": []},
+]
+
+
+def _normalize_source(value: str) -> str:
+    return os.path.splitext(os.path.basename(str(value)))[0].lower()
+
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            sources = item.get("expected_sources") or ([item["expected_source"]] if item.get("expected_source") else [])
+            texts = item.get("expected_texts") or ([item["expected_text"]] if item.get("expected_text") else [])
+            if not sources and not texts:
+                raise ValueError(f"Query '{item.get('query')}' has no expected_sources or expected_text")
+            queries.append({"query": item["query"], "expected_sources": sources, "expected_texts": texts})
+    return queries
+
+
+def relevant_targets(doc, query: Dict[str, Any]) -> List[str]:
+    """Expected items (sources or texts) this retrieved document satisfies."""
+    matched = []
+    source = _normalize_source(doc.metadata.get("source", ""))
+    for expected in query["expected_sources"]:
+        if _normalize_source(expected) == source:
+            matched.append(f"source:{expected}")
+    for expected in query["expected_texts"]:
+        if expected.lower() in doc.page_content.lower():
+            matched.append(f"text:{expected}")
+    return matched
+
+
+def evaluate(retriever, queries: List[Dict[str, Any]], k: int) -> Dict[str, Any]:
+    # One untimed query so connection setup is not charged to the first sample
+    retriever.search(queries[0]["query"], k=k)
+    latencies = []
+    recalls = []
+    reciprocal_ranks = []
+    for query in queries:
+        start_time = time.perf_counter()
+        docs = retriever.search(query["query"], k=k)
+        latencies.append(time.perf_counter() - start_time)
+
+        expected = len(query["expected_sources"]) + len(query["expected_texts"])
+        found = set()
+        first_rank = None
+        for rank, doc in enumerate(docs, start=1):
+            matched = relevant_targets(doc, query)
+            if matched and first_rank is None:
+                first_rank = rank
+            found.update(matched)
+        recalls.append(len(found) / expected)
+        reciprocal_ranks.append(1.0 / first_rank if first_rank else 0.0)
+
+    return {
+        "recall": sum(recalls) / len(recalls),
+        "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99)
+    }
+
+
+def build_collection(documents, persist_dir: str, rag_dir: str, embeddings_model: str,
+                     chunk_size: int, chunk_overlap: int):
+    """Chunk the loaded documents and embed them into a fresh collection."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from database.vector_db import VectorDB
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+    chunks = splitter.split_documents(documents)
+    vectordb = VectorDB(rag_dir=rag_dir, persist_directory=persist_dir, embeddings_model=embeddings_model)
+    start_time = time.perf_counter()
+    vectordb.add_documents(chunks)
+    return vectordb, len(chunks), time.perf_counter() - start_time
+
+
+def run(args, queries: List[Dict[str, Any]], workdir: str) -> List[Dict[str, Any]]:
+    from database.document_processor import DocumentProcessor
+    from database.retriever import Retriever
+    from database.vector_db import VectorDB, get_persistent_client, collection_name_for
+
+    ks = [int(k) for k in args.k.split(",")]
+    rows = []
+    if args.snapshot:
+        collection = get_persistent_client(args.snapshot).get_collection(collection_name_for(args.corpus))
+        model = (collection.metadata or {}).get("embeddings_model")
+        vectordb = VectorDB(rag_dir=args.corpus, persist_directory=args.snapshot,
+                            embeddings_model=model, create_if_missing=False)
+        retriever = Retriever(vectordb, parent_store=vectordb.get_parent_store())
+        for k in ks:
+            rows.append({"embeddings_model": model, "chunk_size": "snapshot", "chunks": collection.count(),
+                         "k": k, **evaluate(retriever, queries, k)})
+        return rows
+
+    # Load (and OCR) the corpus once; only chunking and embedding vary per configuration
+    documents = DocumentProcessor(args.corpus).create_documents()
+    for model in args.embeddings_model.split(","):
+        for chunk_size in [int(c) for c in args.chunk_size.split(",")]:
+            persist_dir = os.path.join(workdir, f"{model.replace(':', '_').replace('/', '_')}-{chunk_size}")
+            overlap = min(args.chunk_overlap, chunk_size // 2)
+            vectordb, num_chunks, ingest_time = build_collection(
+                documents, persist_dir, args.corpus, model, chunk_size, overlap
+            )
+            retriever = Retriever(vectordb)
+            for k in ks:
+                rows.append({"embeddings_model": model, "chunk_size": chunk_size, "chunks": num_chunks,
+                             "ingest_time": ingest_time, "k": k, **evaluate(retriever, queries, k)})
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    header = f"{'embeddings model':<28}{'chunk':>8}{'chunks':>8}{'k':>4}{'recall@k':>10}{'MRR':>8}" \
+             f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        print(f"{row['embeddings_model'][:27]:<28}{row['chunk_size']:>8}{row['chunks']:>8}{row['k']:>4}"
+              f"{row['recall']:>10.3f}{row['mrr']:>8.3f}{row['p50'] * 1000:>9.1f}"
+              f"{row['p95'] * 1000:>9.1f}{row['p99'] * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Folder of documents (the collection's RAG_DIR)")
+    parser.add_argument("--queries", help="Labelled query set (JSONL)")
+    parser.add_argument("--demo", action="store_true", help="Use a small built-in corpus and query set")
+    parser.add_argument("--snapshot", help="Persist directory of an existing collection built from --corpus")
+    parser.add_argument("--k", default="1,3,5", help="Comma-separated k values")
+    parser.add_argument("--chunk-size", default="1000", help="Comma-separated chunk sizes (characters)")
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--embeddings-model", default=os.getenv("EMBEDDINGS_MODEL") or "nomic-embed-text:latest",
+                        help="Comma-separated embedding models")
+    parser.add_argument("--embedder", choices=["fake", "ollama"], default="fake",
+                        help="fake: deterministic hash embeddings from a local fake Ollama (offline)")
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.demo:
+            args.corpus = os.path.join(workdir, "demo", "corpus")
+            os.makedirs(args.corpus)
+            for i, text in enumerate(CORPUS):
+                with open(os.path.join(args.corpus, f"doc_{i}.txt"), "w", encoding="utf-8") as f:
+                    f.write(text)
+            queries = DEMO_QUERIES
+        elif not (args.corpus and args.queries):
+            parser.error("--corpus and --queries are required unless --demo is given")
+        else:
+            queries = load_queries(args.queries)
+
+        # Every k repeats the same queries; measure embedding them, not the query cache
+        os.environ.setdefault("EMBEDDING_CACHE_SIZE", "0")
+        fake_server = None
+        if args.embedder == "fake":
+            fake_server = FakeOllamaServer().start()
+            os.environ["OLLAMA_BASE_URL"] = fake_server.base_url
+        try:
+            rows = run(args, queries, workdir)
+        finally:
+            if fake_server is not None:
+                fake_server.stop()
+
+    print(f"\n{len(queries)} labelled queries, embedder: {args.embedder}")
+    print_table(rows)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,146 @@
+"""Import time of every entry point (main.py, api_server.py and each Streamlit page).
+
+Each entry point's module-level imports run in a fresh interpreter, --runs
+times; the table shows the median, min and max, and which of the deferred
+heavy modules (chromadb, the document loaders, OCR, langchain.chains) the
+imports pulled in. ``streamlit`` alone is measured as the baseline every page
+pays. The scripts themselves are not executed, so no Ollama or database is
+needed.
+
+Usage (from the repository root):
+    python -m benchmarks.startup_time
+    python -m benchmarks.startup_time --runs 10 --importtime 15 --check
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+# Only needed once a database is opened, a file is ingested or a question is answered
+DEFERRED_MODULES = (
+    "chromadb",
+    "langchain.chains",
+    "langchain_community.document_loaders",
+    "langchain.text_splitter",
+    "pdf2image",
+    "pytesseract",
+)
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+
+def entry_points() -> List[str]:
+    pages = sorted(str(p.relative_to(ROOT)) for p in (ROOT / "pages").glob("*.py"))
+    return ["main.py", "api_server.py", "main_streamlit.py"] + pages
+
+
+def top_level_imports(path: Path) -> str:
+    """The import statements a script runs at module level, as source."""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    imports = []
+    for node in tree.body:
+        if isinstance(node, ast.Try):
+            node_imports = [n for n in node.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            node_imports = [node]
+        else:
+            node_imports = []
+        imports.extend(ast.unparse(n) for n in node_imports
+                       if not (isinstance(n, ast.ImportFrom) and n.module == "__future__"))
+    return "\n".join(imports)
+
+
+def _run(imports: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    command += ["-c", PROBE.format(imports=imports, deferred=DEFERRED_MODULES)]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.getenv("PYTHONPATH")])))
+    return subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+def measure(imports: str, runs: int) -> Dict[str, Any]:
+    times = []
+    loaded = []
+    for _ in range(runs):
+        result = _run(imports)
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            return {"error": lines[-1] if lines else f"exit code {result.returncode}"}
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        times.append(probe["seconds"])
+        loaded = probe["loaded"]
+    return {"median": statistics.median(times), "min": min(times), "max": max(times), "deferred_loaded": loaded}
+
+
+def slowest_imports(imports: str, top: int) -> List[Dict[str, Any]]:
+    """Top-level packages by cumulative import time, from ``python -X importtime``."""
+    result = _run(imports, importtime=True)
+    packages = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented; keep the outermost ones
+        if name.startswith("  "):
+            continue
+        packages.append({"module": name.strip(), "seconds": int(cumulative) / 1e6})
+    return sorted(packages, key=lambda p: p["seconds"], reverse=True)[:top]
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    header = f"{'entry point':<34}{'median ms':>11}{'min ms':>9}{'max ms':>9}  deferred modules loaded"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        if "error" in row:
+            print(f"{row['entry']:<34}  failed: {row['error']}")
+            continue
+        print(f"{row['entry']:<34}{row['median'] * 1000:>11.0f}{row['min'] * 1000:>9.0f}{row['max'] * 1000:>9.0f}"
+              f"  {', '.join(row['deferred_loaded']) or '-'}")
+
+
+def run(entries: Optional[List[str]], runs: int, importtime: int) -> List[Dict[str, Any]]:
+    rows = [{"entry": "streamlit (baseline)", **measure("import streamlit", runs)}]
+    for entry in entries or entry_points():
+        imports = top_level_imports(ROOT / entry)
+        row = {"entry": entry, **measure(imports, runs)}
+        if importtime and "error" not in row:
+            row["slowest_imports"] = slowest_imports(imports, importtime)
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entries", nargs="*", help="Entry points to measure (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="Also list the N slowest top-level imports of each entry point")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with status 1 if any entry point imports a deferred module")
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    rows = run(args.entries, args.runs, args.importtime)
+    print_table(rows)
+    for row in rows:
+        if row.get("slowest_imports"):
+            print(f"\n{row['entry']}:")
+            for entry in row["slowest_imports"]:
+                print(f"  {entry['seconds'] * 1000:>8.0f} ms  {entry['module']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.check and any(row.get("deferred_loaded") for row in rows[1:]):
+        sys.exit(1)
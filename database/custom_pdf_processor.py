@@ -1,5 +1,6 @@
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 import pytesseract as pt 
+from utils.metrics import timed
 
 class CustomPDFProcessor:
     def __init__(self, file_path):
@@ -7,8 +8,14 @@ class CustomPDFProcessor:
     
     def extract_text(self):
         all_text = ""
-        pdf_image = convert_from_path(self.file_path)
-        for idx, page in enumerate(pdf_image):
-            text = pt.image_to_string(page)
+        # Render one page at a time: converting a whole scanned PDF at once
+        # keeps every page image in memory until OCR is done
+        page_count = pdfinfo_from_path(self.file_path)["Pages"]
+        for page_number in range(1, page_count + 1):
+            with timed("render"):
+                page = convert_from_path(self.file_path, first_page=page_number, last_page=page_number)[0]
+            with timed("ocr"):
+                text = pt.image_to_string(page)
+            page.close()
             all_text += text + "\n"
-        return all_text
\ No newline at end of file
+        return all_text
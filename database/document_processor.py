@@ -1,32 +1,95 @@
-from langchain.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader
-from database.custom_pdf_processor import CustomPDFProcessor
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from langchain.schema import Document
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import ExitStack
+from langchain_core.documents import Document
+from utils.metrics import metrics_registry, timed
+from utils.profiling import profiled
+from utils.memory import MB, MemoryMonitor, memory_stage
+from database.streaming_text_loader import StreamingTextLoader, text_splitter
+from database.worker_pool import ResilientProcessPool, WorkerTaskError
+from database.ingest_scheduler import IngestPlan, limit_worker_threads
+from database.parent_store import CHILD_CHUNK_SIZE, CHILDREN_PER_PARENT
+import hashlib
+import importlib
+import json
 import os
+import time
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# The loaders (and pdf2image/pytesseract behind CustomPDFProcessor) are slow to
+# import, so they are imported when a file of their type is first processed
+LOADERS = {".pdf": "PyPDFLoader", ".docx": "Docx2txtLoader", ".txt": "TextLoader"}
+
+
+def preload_loaders(extensions: Iterable[str]):
+    """Import the loaders for these file types, so the first file does not pay for the import."""
+    extensions = set(extensions)
+    if not extensions:
+        return
+    loaders = importlib.import_module("langchain.document_loaders")
+    for ext in extensions & set(LOADERS):
+        getattr(loaders, LOADERS[ext])
+    if ".pdf" in extensions:
+        importlib.import_module("database.custom_pdf_processor")
+
+
+def init_worker(threads: int, extensions: Iterable[str]):
+    """Pool initializer: cap OCR threads and import the pool's loaders before its first file."""
+    limit_worker_threads(threads)
+    try:
+        preload_loaders(extensions)
+    except ImportError:
+        # Let the files fail with the import error instead of the worker crashing before any file
+        pass
+
+
+def _load_with_metrics(loader: Callable[[str], List[Document]],
+                       file_path: str) -> Tuple[List[Document], Dict[str, Any], float]:
+    """Worker-process entry point: load one file and hand back the metrics it recorded and its duration."""
+    file_type = os.path.splitext(file_path)[1].lower().lstrip('.')
+    start_time = time.perf_counter()
+    with profiled(f"load_{file_type}"), timed("load", file_type=file_type):
+        docs = loader(file_path)
+    metrics_registry.inc("rag_files_loaded_total", file_type=file_type)
+    return docs, metrics_registry.drain(), time.perf_counter() - start_time
+
 
 class DocumentProcessor:
     def __init__(self, parent_dir: str):
         self.parent_dir = parent_dir
         self.valid_ext = [".pdf", ".txt", ".docx"]
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        # Peak RSS and throttling of the last create_documents() run
+        self.memory_report = None
+        self.chunk_size = 1000
+        self.chunk_overlap = 200
+        self.text_splitter = text_splitter(self.chunk_size, self.chunk_overlap)
+        # Text files this large are not loaded whole; stream_chunks() splits them window by window
+        self.streaming_threshold = int(float(os.getenv("STREAMING_TEXT_THRESHOLD_MB", "64")) * MB)
+        self.streaming_batch_size = int(os.getenv("STREAMING_BATCH_SIZE", "512"))
+        # Large text files found by the last create_documents() run
+        self.streamed_files = []
+        # Files that failed on every attempt in the last create_documents() run
+        self.failed_files = []
+        self.pool_report = None
+        # Worker counts, makespan and ideal makespan of the last create_documents() run
+        self.schedule_report = None
 
     def get_doc_paths(self) -> List[str]:
         all_files = []
-        for root, dirs, files in os.walk(self.parent_dir):
-            for file in files:
-                print(f"FILE NAME: {file}")
-                all_files.append(os.path.join(root, file))
+        with timed("scan"):
+            for root, dirs, files in os.walk(self.parent_dir):
+                for file in files:
+                    print(f"FILE NAME: {file}")
+                    all_files.append(os.path.join(root, file))
         return all_files
     
+    def is_streamed(self, file_path: str) -> bool:
+        return (self.streaming_threshold > 0 and file_path.lower().endswith(".txt")
+                and os.path.getsize(file_path) >= self.streaming_threshold)
+
     def process_pdf(self, file_path: str) -> List[Document]:
+        from database.custom_pdf_processor import CustomPDFProcessor
+        from langchain.document_loaders import PyPDFLoader
         file_name, _ = os.path.splitext(os.path.basename(file_path))
         try: 
             loader = CustomPDFProcessor(file_path)
@@ -51,6 +114,7 @@ class DocumentProcessor:
             return loaded_docs
         
     def process_docx(self, file_path: str) -> List[Document]:
+        from langchain.document_loaders import Docx2txtLoader
         file_name, _ = os.path.splitext(os.path.basename(file_path))
         loader = Docx2txtLoader(file_path)
         loaded_docs = loader.load()
@@ -64,6 +128,7 @@ class DocumentProcessor:
         return loaded_docs
     
     def process_txt(self, file_path: str) -> List[Document]:
+        from langchain.document_loaders import TextLoader
         file_name, _ = os.path.splitext(os.path.basename(file_path))
         loader = TextLoader(file_path, encoding = 'utf-8')
         loaded_docs = loader.load()
@@ -76,6 +141,7 @@ class DocumentProcessor:
             })
         return loaded_docs
 
+    @profiled("create_documents")
     def create_documents(self) -> List[Document]:
         file_paths = self.get_doc_paths()
         documents = []
@@ -86,23 +152,234 @@ class DocumentProcessor:
             ".txt": self.process_txt
         }
 
-        with ProcessPoolExecutor() as executor:
-            future_to_file = {
-                executor.submit(processor_map[os.path.splitext(fp)[1].lower()], fp): fp
-                for fp in file_paths if os.path.splitext(fp)[1].lower() in processor_map
+        queue = [fp for fp in file_paths if os.path.splitext(fp)[1].lower() in processor_map]
+        streamed = {fp for fp in queue if self.is_streamed(fp)}
+        self.streamed_files = [fp for fp in queue if fp in streamed]
+        queue = [fp for fp in queue if fp not in streamed]
+        for fp in self.streamed_files:
+            print(f"🌊 {os.path.basename(fp)} is {os.path.getsize(fp) / MB:.0f} MB, it will be streamed in batches")
+
+        # Each file type gets its own pool out of the CPU budget; files go out largest first
+        with timed("scan"):
+            plan = IngestPlan(queue)
+        if queue:
+            print(f"🗂️  Loading {len(queue)} files on {plan.cpus} CPUs with {', '.join(plan.describe())}")
+
+        # Files are submitted through a window instead of all at once, so the
+        # memory monitor can hold back new files while workers are near the
+        # INGEST_MEMORY_BUDGET_MB budget
+        self.failed_files = []
+        durations = {}
+        start_time = time.perf_counter()
+        with ExitStack() as pools_stack, MemoryMonitor() as monitor, memory_stage("load"):
+            pools = {
+                ext: pools_stack.enter_context(ResilientProcessPool(
+                    max_workers=count, initializer=init_worker, initargs=(plan.ocr_threads, (ext,))
+                ))
+                for ext, count in plan.workers.items()
             }
+            max_window = sum(plan.workers.values())
+            window = max_window
+            future_to_file = {}
+            in_flight = {}
+            while len(plan) or future_to_file:
+                window = monitor.window(window, max_window)
+                while len(future_to_file) < window:
+                    fp = plan.next_file(in_flight)
+                    if fp is None:
+                        break
+                    ext = os.path.splitext(fp)[1].lower()
+                    future = pools[ext].submit(_load_with_metrics, processor_map[ext], fp)
+                    future_to_file[future] = fp
+                    in_flight[ext] = in_flight.get(ext, 0) + 1
+                monitor.watch([pid for pool in pools.values() for pid in pool.pids()])
+                done, _ = wait(future_to_file, timeout=monitor.interval, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    file_path = future_to_file.pop(future)
+                    in_flight[os.path.splitext(file_path)[1].lower()] -= 1
+                    try:
+                        docs, worker_metrics, seconds = future.result()
+                        metrics_registry.merge(worker_metrics)
+                        documents.extend(docs)
+                        durations[file_path] = seconds
+                    except WorkerTaskError as e:
+                        metrics_registry.inc("rag_files_failed_total",
+                                             file_type=os.path.splitext(file_path)[1].lower().lstrip('.'),
+                                             reason=e.kind)
+                        self.failed_files.append({"path": file_path, "reason": e.kind, "error": str(e),
+                                                  "attempts": e.attempts})
+                        print(f"Error processing {file_path}: {e}")
+            reports = [pool.report() for pool in pools.values()]
+            self.pool_report = {key: sum(r[key] for r in reports) for key in (reports[0] if reports else {})}
 
-            for future in as_completed(future_to_file):
-                file_path = future_to_file[future]
-                try:
-                    docs = future.result()
-                    documents.extend(docs)
-                except Exception as e:
-                    print(f"Error processing {file_path}: {e}")
+        self.schedule_report = plan.report(durations, time.perf_counter() - start_time)
+        if durations:
+            metrics_registry.observe("rag_ingest_makespan_seconds", self.schedule_report["makespan"])
+            metrics_registry.observe("rag_ingest_ideal_makespan_seconds", self.schedule_report["ideal_makespan"])
+            print(f"⏱️  Loading took {self.schedule_report['makespan']:.1f}s, ideal "
+                  f"{self.schedule_report['ideal_makespan']:.1f}s ({self.schedule_report['efficiency']:.0%}); "
+                  f"longest file {os.path.basename(self.schedule_report['longest_file'])} "
+                  f"{self.schedule_report['longest_file_seconds']:.1f}s")
 
+        if self.pool_report.get("timeouts") or self.pool_report.get("crashes") or self.pool_report.get("recycled"):
+            print(f"♻️  Workers: {self.pool_report['timeouts']} timed out, {self.pool_report['crashes']} crashed, "
+                  f"{self.pool_report['recycled']} recycled, {self.pool_report['retried']} files retried")
+        if self.failed_files:
+            self._write_failed_files()
+        self.memory_report = monitor.report()
+        budget = f" (budget {self.memory_report['budget_mb']:.0f} MB)" if self.memory_report['budget_mb'] else ""
+        print(f"🧠 Peak RSS while loading: {self.memory_report['peak_total_mb']:.0f} MB total, "
+              f"{self.memory_report['peak_worker_mb']:.0f} MB largest worker{budget}")
         return documents
 
+    def _write_failed_files(self, failures: Optional[List[Dict[str, Any]]] = None):
+        """Print the skipped files and, with INGEST_FAILED_FILES set, append them there as JSON lines."""
+        failures = self.failed_files if failures is None else failures
+        print(f"⚠️  Skipped {len(failures)} file(s) that failed on every attempt")
+        failed_path = os.getenv("INGEST_FAILED_FILES")
+        if not failed_path:
+            return
+        with open(failed_path, "a", encoding="utf-8") as f:
+            for failure in failures:
+                f.write(json.dumps({"collection_dir": self.parent_dir, **failure}) + "\n")
+        print(f"📝 Failed files listed in {failed_path}")
+
+    @profiled("chunk_docs")
     def chunk_docs(self):
         documents = self.create_documents()
-        chunks = self.text_splitter.split_documents(documents)
-        return chunks
\ No newline at end of file
+        with timed("chunk"), memory_stage("chunk"):
+            chunks = self.text_splitter.split_documents(documents)
+        metrics_registry.inc("rag_chunks_total", len(chunks))
+        return chunks
+
+    @profiled("chunk_docs")
+    def chunk_docs_with_parents(self, child_chunk_size: int = CHILD_CHUNK_SIZE,
+                                children_per_parent: int = CHILDREN_PER_PARENT
+                                ) -> Tuple[List[Document], Dict[str, Document]]:
+        """Split documents into small, non-overlapping child chunks grouped into parent windows.
+
+        Only the children are meant to be embedded. Each child carries the
+        ``parent_id`` of the window it came from so retrieval can hand the
+        whole window to the LLM.
+        """
+        documents = self.create_documents()
+        with timed("chunk"), memory_stage("chunk"):
+            children, parents = self.split_with_parents(documents, child_chunk_size, children_per_parent)
+        metrics_registry.inc("rag_chunks_total", len(children))
+        return children, parents
+
+    @staticmethod
+    def split_with_parents(documents: List[Document], child_chunk_size: int = CHILD_CHUNK_SIZE,
+                           children_per_parent: int = CHILDREN_PER_PARENT
+                           ) -> Tuple[List[Document], Dict[str, Document]]:
+        """Children are split from the whole document, so no child is cut short at a parent boundary."""
+        child_splitter = text_splitter(child_chunk_size, 0)
+        children = []
+        parents = {}
+        for document in documents:
+            text = document.page_content
+            group = []
+            search_from = 0
+            for child in child_splitter.split_documents([document]):
+                start = text.find(child.page_content, search_from)
+                child.metadata['start_index'] = start
+                search_from = start + len(child.page_content)
+                group.append(child)
+                if len(group) == children_per_parent:
+                    DocumentProcessor._add_parent(group, text, parents, children)
+                    group = []
+            if group:
+                DocumentProcessor._add_parent(group, text, parents, children)
+        return children, parents
+
+    @staticmethod
+    def _add_parent(group: List[Document], text: Optional[str], parents: Dict[str, Document],
+                    children: List[Document]):
+        """Make the window spanning ``group`` (consecutive children of one document) their parent."""
+        first, last = group[0], group[-1]
+        start = first.metadata['start_index']
+        if text is not None:
+            content = text[start:last.metadata['start_index'] + len(last.page_content)]
+        else:
+            # Streamed files are not held in memory; the whitespace between children is lost
+            content = "\n".join(child.page_content for child in group)
+        digest = hashlib.sha1(
+            f"{first.metadata.get('source')}:{start}:{content}".encode('utf-8')
+        ).hexdigest()
+        parent_id = digest[:16]
+        metadata = dict(first.metadata)
+        metadata['parent_id'] = parent_id
+        parents[parent_id] = Document(page_content=content, metadata=metadata)
+        for child in group:
+            child.metadata['parent_id'] = parent_id
+            children.append(child)
+
+    def _streaming_loader(self, file_path: str, chunk_size: int, chunk_overlap: int) -> StreamingTextLoader:
+        file_name, _ = os.path.splitext(os.path.basename(file_path))
+        return StreamingTextLoader(file_path, chunk_size=chunk_size, chunk_overlap=chunk_overlap, metadata={
+            'source': file_name,
+            'file_name': file_name,
+            'file_type': 'txt',
+            'file_size': Path(file_path).stat().st_size
+        })
+
+    def _stream_failed(self, file_path: str, error: Exception):
+        """Record a streamed file that could not be read to the end, like a file the pool gave up on.
+
+        Chunks already read from it are still stored; the rest of the file is skipped.
+        """
+        metrics_registry.inc("rag_files_failed_total", file_type="txt", reason="error")
+        failure = {"path": file_path, "reason": "error", "error": str(error), "attempts": 1}
+        self.failed_files.append(failure)
+        print(f"Error streaming {file_path}: {error}")
+        self._write_failed_files([failure])
+
+    def stream_chunks(self) -> Iterator[List[Document]]:
+        """Chunks of the large text files create_documents() skipped, ``streaming_batch_size`` at a time."""
+        batch = []
+        for file_path in self.streamed_files:
+            try:
+                for chunk in self._streaming_loader(file_path, self.chunk_size, self.chunk_overlap).lazy_load():
+                    batch.append(chunk)
+                    if len(batch) >= self.streaming_batch_size:
+                        metrics_registry.inc("rag_chunks_total", len(batch))
+                        yield batch
+                        batch = []
+            except Exception as e:
+                self._stream_failed(file_path, e)
+            else:
+                metrics_registry.inc("rag_files_loaded_total", file_type="txt")
+        if batch:
+            metrics_registry.inc("rag_chunks_total", len(batch))
+            yield batch
+
+    def stream_chunks_with_parents(self, child_chunk_size: int = CHILD_CHUNK_SIZE,
+                                   children_per_parent: int = CHILDREN_PER_PARENT
+                                   ) -> Iterator[Tuple[List[Document], Dict[str, Document]]]:
+        """Like stream_chunks(), but yields (children, parents) batches as chunk_docs_with_parents() builds them."""
+        children = []
+        parents = {}
+        for file_path in self.streamed_files:
+            group = []
+            try:
+                for child in self._streaming_loader(file_path, child_chunk_size, 0).lazy_load():
+                    group.append(child)
+                    if len(group) < children_per_parent:
+                        continue
+                    self._add_parent(group, None, parents, children)
+                    group = []
+                    if len(children) >= self.streaming_batch_size:
+                        metrics_registry.inc("rag_chunks_total", len(children))
+                        yield children, parents
+                        children = []
+                        parents = {}
+            except Exception as e:
+                self._stream_failed(file_path, e)
+            else:
+                metrics_registry.inc("rag_files_loaded_total", file_type="txt")
+            if group:
+                self._add_parent(group, None, parents, children)
+        if children:
+            metrics_registry.inc("rag_chunks_total", len(children))
+            yield children, parents
\ No newline at end of file
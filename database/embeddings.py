@@ -0,0 +1,101 @@
+from langchain_core.embeddings import Embeddings
+from utils.scheduler import BACKGROUND, current_priority, get_scheduler
+from utils.metrics import metrics_registry, timed
+from collections import OrderedDict
+from typing import List, Optional
+import os
+import threading
+
+
+class ScheduledEmbeddings(Embeddings):
+    """Routes every embedding request through the shared Ollama scheduler.
+
+    Background (ingestion) calls are split into small batches that each wait
+    for their own slot, so interactive queries can get in between batches
+    instead of queueing behind one huge request.
+
+    With EMBEDDING_CACHE_SIZE > 0 (default 0: off), query embeddings are kept
+    in an LRU cache of that many entries, so repeated questions skip Ollama.
+    """
+
+    def __init__(self, embeddings: Embeddings, flow: Optional[str] = None, background_batch_size: int = 32,
+                 cache_size: Optional[int] = None):
+        self.embeddings = embeddings
+        self.flow = flow
+        self.background_batch_size = background_batch_size
+        self.cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", "0")) if cache_size is None else cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Expose the wrapped model's attributes (model, base_url, ...)
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    def _batch_size(self, texts: List[str]) -> int:
+        if current_priority() == BACKGROUND:
+            return self.background_batch_size
+        return max(1, len(texts))
+
+    def _cached(self, text: str) -> Optional[List[float]]:
+        if not self.cache_size:
+            return None
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+        metrics_registry.inc("rag_embedding_cache_total", collection=self.flow,
+                             result="hit" if vector is not None else "miss")
+        return list(vector) if vector is not None else None
+
+    def _remember(self, text: str, vector: List[float]):
+        if not self.cache_size:
+            return
+        with self._cache_lock:
+            self._cache[text] = list(vector)
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        size = self._batch_size(texts)
+        for i in range(0, len(texts), size):
+            with get_scheduler().slot(flow=self.flow):
+                with timed("embed", collection=self.flow, kind="documents"):
+                    vectors.extend(self.embeddings.embed_documents(texts[i:i + size]))
+        metrics_registry.inc("rag_embedded_texts_total", len(texts), collection=self.flow, kind="documents")
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._cached(text)
+        if vector is not None:
+            return vector
+        with get_scheduler().slot(flow=self.flow):
+            with timed("embed", collection=self.flow, kind="query"):
+                vector = self.embeddings.embed_query(text)
+        metrics_registry.inc("rag_embedded_texts_total", collection=self.flow, kind="query")
+        self._remember(text, vector)
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        size = self._batch_size(texts)
+        for i in range(0, len(texts), size):
+            async with get_scheduler().aslot(flow=self.flow):
+                with timed("embed", collection=self.flow, kind="documents"):
+                    vectors.extend(await self.embeddings.aembed_documents(texts[i:i + size]))
+        metrics_registry.inc("rag_embedded_texts_total", len(texts), collection=self.flow, kind="documents")
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._cached(text)
+        if vector is not None:
+            return vector
+        async with get_scheduler().aslot(flow=self.flow):
+            with timed("embed", collection=self.flow, kind="query"):
+                vector = await self.embeddings.aembed_query(text)
+        metrics_registry.inc("rag_embedded_texts_total", collection=self.flow, kind="query")
+        self._remember(text, vector)
+        return vector
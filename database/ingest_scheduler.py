@@ -0,0 +1,148 @@
+"""CPU-aware planning of the file-loading stage of ingestion.
+
+One worker per core oversubscribes the machine as soon as tesseract runs
+several OpenMP threads per worker, and a big PDF submitted last becomes the
+straggler that everyone waits for. IngestPlan:
+
+- estimates each file's load time from its page count (PDFs, which are
+  OCR'd page by page) or its size; page counts come from poppler's pdfinfo
+  in a subprocess with a short timeout, so a malformed PDF cannot hang or
+  crash planning, and falls back to the size estimate when pdfinfo fails
+- gives every file type its own worker count out of a CPU budget
+  (INGEST_CPUS, default the CPUs this process may run on), in proportion
+  to its estimated work; an OCR worker costs TESSERACT_THREADS CPUs
+- hands out files largest-first (LPT) across the types with a free worker
+- compares the measured makespan with the ideal one for the same CPUs
+"""
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+import os
+
+# Rough single-thread load time per unit, only used to rank and balance work.
+# PDFs are OCR'd at about a second per page; without a page count, a scanned
+# page is taken to be ~250 KB
+PDF_SECONDS_PER_PAGE = 1.0
+SECONDS_PER_MB = {".pdf": 4.0, ".docx": 0.2, ".txt": 0.02}
+MIN_ESTIMATE = 0.01
+# Seconds pdfinfo gets per PDF before it is killed and the size estimate is used
+PDFINFO_TIMEOUT = 5
+# pdfinfo subprocesses run at once while planning
+PDFINFO_WORKERS = 8
+
+
+def available_cpus() -> int:
+    """INGEST_CPUS, else the CPUs this process is allowed to run on."""
+    if os.getenv("INGEST_CPUS"):
+        return max(1, int(os.getenv("INGEST_CPUS")))
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def ocr_threads() -> int:
+    return max(1, int(os.getenv("TESSERACT_THREADS", "1")))
+
+
+def limit_worker_threads(threads: int):
+    """Pool initializer: cap OpenMP threads for tesseract processes started by this worker."""
+    os.environ["OMP_THREAD_LIMIT"] = str(threads)
+
+
+def pdf_page_count(file_path: str, timeout: float = PDFINFO_TIMEOUT) -> Optional[int]:
+    """Page count from pdfinfo, which runs in a subprocess killed after ``timeout``; None if it fails."""
+    try:
+        from pdf2image import pdfinfo_from_path
+        return int(pdfinfo_from_path(file_path, timeout=timeout)["Pages"])
+    except Exception:
+        return None
+
+
+def estimate_seconds(file_path: str) -> Dict[str, Any]:
+    """Estimated load time of one file, and its page count for PDFs."""
+    ext = os.path.splitext(file_path)[1].lower()
+    size_mb = os.path.getsize(file_path) / (1024 * 1024)
+    pages = pdf_page_count(file_path) if ext == ".pdf" else None
+    if pages is not None:
+        seconds = pages * PDF_SECONDS_PER_PAGE
+    else:
+        seconds = size_mb * SECONDS_PER_MB.get(ext, 1.0)
+    return {"seconds": max(MIN_ESTIMATE, seconds), "size_mb": size_mb, "pages": pages}
+
+
+class IngestPlan:
+    """Worker counts per file type and largest-first order for one folder's files."""
+
+    def __init__(self, file_paths: Iterable[str], cpus: Optional[int] = None, threads: Optional[int] = None):
+        self.cpus = cpus or available_cpus()
+        self.ocr_threads = threads or ocr_threads()
+        file_paths = list(file_paths)
+        # Each PDF costs a pdfinfo subprocess; wait on several at once
+        with ThreadPoolExecutor(max_workers=max(1, min(PDFINFO_WORKERS, len(file_paths)))) as executor:
+            self.estimates = dict(zip(file_paths, executor.map(estimate_seconds, file_paths)))
+        by_type = {}
+        for path in sorted(self.estimates, key=lambda p: self.estimates[p]["seconds"], reverse=True):
+            by_type.setdefault(os.path.splitext(path)[1].lower(), []).append(path)
+        self.queues = {ext: deque(paths) for ext, paths in by_type.items()}
+        self.workers = self._allocate({ext: len(paths) for ext, paths in by_type.items()})
+
+    def cost(self, ext: str) -> int:
+        """CPUs one worker of this type keeps busy."""
+        return self.ocr_threads if ext == ".pdf" else 1
+
+    def _allocate(self, files: Dict[str, int]) -> Dict[str, int]:
+        work = {ext: sum(self.estimates[p]["seconds"] for p in self.queues[ext]) for ext in files}
+        total = sum(work.values())
+        # Every type present gets a worker, even when that exceeds a tiny CPU budget
+        workers = {
+            ext: max(1, min(files[ext], int(self.cpus * work[ext] / total / self.cost(ext))))
+            for ext in files
+        }
+        # Give the CPUs left over from rounding to the types with the most work per worker
+        used = sum(workers[ext] * self.cost(ext) for ext in workers)
+        while True:
+            candidates = [ext for ext in workers
+                          if workers[ext] < files[ext] and used + self.cost(ext) <= self.cpus]
+            if not candidates:
+                return workers
+            ext = max(candidates, key=lambda e: work[e] / workers[e])
+            workers[ext] += 1
+            used += self.cost(ext)
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def next_file(self, in_flight: Dict[str, int]) -> Optional[str]:
+        """The largest remaining file among types that have an idle worker."""
+        heads = [(self.estimates[queue[0]]["seconds"], ext) for ext, queue in self.queues.items()
+                 if queue and in_flight.get(ext, 0) < self.workers[ext]]
+        if not heads:
+            return None
+        return self.queues[max(heads)[1]].popleft()
+
+    def ideal_makespan(self, durations: Dict[str, float]) -> float:
+        """Lower bound for these measured durations on this CPU budget: perfect packing or the longest file."""
+        if not durations:
+            return 0.0
+        cpu_seconds = sum(d * self.cost(os.path.splitext(p)[1].lower()) for p, d in durations.items())
+        return max(cpu_seconds / self.cpus, max(durations.values()))
+
+    def report(self, durations: Dict[str, float], makespan: float) -> Dict[str, Any]:
+        ideal = self.ideal_makespan(durations)
+        straggler = max(durations, key=durations.get) if durations else None
+        return {
+            "cpus": self.cpus,
+            "ocr_threads": self.ocr_threads,
+            "workers": dict(self.workers),
+            "files": len(durations),
+            "size_mb": sum(e["size_mb"] for e in self.estimates.values()),
+            "pages": sum(e["pages"] or 0 for e in self.estimates.values()),
+            "makespan": makespan,
+            "ideal_makespan": ideal,
+            "efficiency": ideal / makespan if makespan else None,
+            "longest_file": straggler,
+            "longest_file_seconds": durations.get(straggler) if straggler else None
+        }
+
+    def describe(self) -> List[str]:
+        return [f"{ext.lstrip('.')}={count} x {self.cost(ext)} CPU" for ext, count in sorted(self.workers.items())]
@@ -0,0 +1,73 @@
+from langchain_core.documents import Document
+from typing import Dict, List
+import json
+import os
+import sqlite3
+import zlib
+
+# Small children match precisely; four consecutive children (about 1600
+# characters) make the parent window handed to the LLM. The prompt stays
+# within the pipeline's context_token_budget because ContextPacker packs the
+# parents, not because fewer of them are returned
+CHILD_CHUNK_SIZE = 400
+CHILDREN_PER_PARENT = 4
+
+class ParentDocumentStore:
+    """Compact on-disk store for the parent windows used by small-to-big retrieval.
+
+    Only the small child chunks are embedded; their parents live here, keyed by
+    parent chunk ID, as zlib-compressed text in a single SQLite file that sits
+    next to the Chroma data.
+    """
+
+    def __init__(self, persist_directory: str, collection_name: str):
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self.db_path = os.path.join(persist_directory, "parent_documents.sqlite3")
+        os.makedirs(persist_directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS parents ("
+                "collection TEXT NOT NULL, parent_id TEXT NOT NULL, "
+                "content BLOB NOT NULL, metadata TEXT NOT NULL, "
+                "PRIMARY KEY (collection, parent_id))"
+            )
+
+    def _connect(self):
+        # One short-lived connection per call keeps the store safe to share across threads
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def add_documents(self, parents: Dict[str, Document]) -> None:
+        rows = [
+            (self.collection_name, parent_id,
+             zlib.compress(doc.page_content.encode('utf-8')),
+             json.dumps(doc.metadata))
+            for parent_id, doc in parents.items()
+        ]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO parents VALUES (?, ?, ?, ?)", rows)
+
+    def get_documents(self, parent_ids: List[str]) -> Dict[str, Document]:
+        if not parent_ids:
+            return {}
+        placeholders = ",".join("?" * len(parent_ids))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT parent_id, content, metadata FROM parents "
+                f"WHERE collection = ? AND parent_id IN ({placeholders})",
+                [self.collection_name, *parent_ids]
+            ).fetchall()
+        return {
+            parent_id: Document(page_content=zlib.decompress(content).decode('utf-8'),
+                                metadata=json.loads(metadata))
+            for parent_id, content, metadata in rows
+        }
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM parents WHERE collection = ?",
+                                (self.collection_name,)).fetchone()[0]
+
+    def delete_collection(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM parents WHERE collection = ?", (self.collection_name,))
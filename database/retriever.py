@@ -1,20 +1,126 @@
-from database.vector_db import VectorDB
-from typing import List, Dict, Optional
-from langchain.schema import Document
+from database.vector_db import VectorDB, unpack_query_result
+from database.parent_store import ParentDocumentStore
+from utils.metrics import timed
+from typing import List, Dict, Optional, Any
+from langchain_core.documents import Document
+import asyncio
+import threading
+import time
+
 class Retriever:
-    def __init__(self, vectordb: VectorDB, search_kwargs: Optional[Dict] = None):
+    def __init__(self, vectordb: VectorDB, search_kwargs: Optional[Dict] = None,
+                 parent_store: Optional[ParentDocumentStore] = None, child_fetch_multiplier: int = 4):
         self.vectordb = vectordb
-        self.search_kwargs = search_kwargs or {'k': 5}
+        # Small-to-big: match on child chunks, return their parent windows
+        self.parent_store = parent_store
+        self.child_fetch_multiplier = child_fetch_multiplier
+        self.search_kwargs = dict(search_kwargs or {'k': 5})
         self.retriever = self.vectordb.as_retriever(search_kwargs=self.search_kwargs)
+        self._lock = threading.Lock()
     
     def get_retriever(self):
         return self.retriever
     
-    def search(self, query: str, k: Optional[int] = None) -> List[Document]:
+    def _resolve_params(self, k: Optional[int], search_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        params = {**self.search_kwargs, **search_kwargs}
         if k is not None:
-            self.retriever = self.vectordb.as_retriever(search_kwargs={'k': k})
-        return self.retriever.get_relevant_documents(query)
+            params['k'] = k
+        params.setdefault('k', 5)
+        return params
+    
+    def search(self, query: str, k: Optional[int] = None, **search_kwargs) -> List[Document]:
+        """Stateless search: per-call parameters never touch the shared retriever.
+
+        Safe to call from many threads at once with different ``k`` values.
+        """
+        # Embedded here rather than inside similarity_search so the "embed" and
+        # "retrieve" stages are timed separately
+        embedding = self.vectordb.embedding_func.embed_query(query)
+        return self.search_by_vector(embedding, k, **search_kwargs)
+    
+    def search_by_vector(self, embedding: List[float], k: Optional[int] = None, **search_kwargs) -> List[Document]:
+        """Same as search() for a query that is already embedded."""
+        params = self._resolve_params(k, search_kwargs)
+        k = params['k']
+        fetch_k = k if self.parent_store is None else k * self.child_fetch_multiplier
+        with timed("retrieve", collection=self.vectordb.collection_name):
+            docs = self.vectordb.similarity_search_by_vector(embedding, k=fetch_k, filter=params.get('filter'))
+            return docs if self.parent_store is None else self._expand_to_parents(docs, k)
+    
+    async def asearch(self, query: str, k: Optional[int] = None, **search_kwargs) -> List[Document]:
+        """Async search: the query is embedded over Ollama's async client and the
+        local Chroma lookup runs in a worker thread so the event loop stays free."""
+        embedding = await self.vectordb.embedding_func.aembed_query(query)
+        return await asyncio.to_thread(self.search_by_vector, embedding, k, **search_kwargs)
+    
+    def _expand_to_parents(self, children: List[Document], k: int) -> List[Document]:
+        """Replace ranked child chunks with their distinct parent windows, best match first."""
+        ranked = []
+        seen = set()
+        for child in children:
+            parent_id = child.metadata.get('parent_id')
+            key = parent_id or id(child)
+            if key in seen:
+                continue
+            seen.add(key)
+            ranked.append((parent_id, child))
+            if len(ranked) == k:
+                break
+        parents = self.parent_store.get_documents([pid for pid, _ in ranked if pid])
+        # Fall back to the child itself if its parent is missing from the store
+        return [parents.get(parent_id, child) if parent_id else child for parent_id, child in ranked]
+    
+    def search_many(self, queries: List[str], k: Optional[int] = None,
+                    batch_size: int = 64) -> Dict[str, Any]:
+        """Embed queries in batched calls and run them as a single multi-query vector search.
+
+        Results are returned in the same order as ``queries``.
+        """
+        k = k if k is not None else self.search_kwargs.get('k', 5)
+        start_time = time.perf_counter()
+        if not queries:
+            return {"results": [], "num_queries": 0, "embedding_time": 0.0,
+                    "search_time": 0.0, "total_time": 0.0, "queries_per_second": 0.0}
+
+        query_vectors = []
+        for i in range(0, len(queries), batch_size):
+            query_vectors.extend(self.vectordb.embedding_func.embed_documents(queries[i:i + batch_size]))
+        embedding_time = time.perf_counter() - start_time
+
+        search_start = time.perf_counter()
+        collection = self.vectordb._collection
+        fetch_k = k if self.parent_store is None else k * self.child_fetch_multiplier
+        with timed("retrieve", collection=self.vectordb.collection_name, batch="true"):
+            result = collection.query(
+                query_embeddings=query_vectors,
+                n_results=fetch_k,
+                include=["documents", "metadatas", "distances"]
+            )
+            space = (collection.metadata or {}).get("hnsw:space", "l2")
+            results = [
+                [doc for doc, _ in unpack_query_result(result, index=i, space=space)]
+                for i in range(len(queries))
+            ]
+            if self.parent_store is not None:
+                results = [self._expand_to_parents(children, k) for children in results]
+        search_time = time.perf_counter() - search_start
+
+        total_time = time.perf_counter() - start_time
+        return {
+            "results": results,
+            "num_queries": len(queries),
+            "embedding_time": embedding_time,
+            "search_time": search_time,
+            "total_time": total_time,
+            "queries_per_second": len(queries) / total_time if total_time > 0 else 0.0
+        }
     
     def update_search_params(self, **kwargs):
-        self.search_kwargs.update(kwargs)
-        self.retriever = self.vectordb.as_retriever(search_kwargs=self.search_kwargs)
\ No newline at end of file
+        # Build new objects and swap the references so concurrent readers only
+        # ever see a complete old or a complete new configuration
+        with self._lock:
+            search_kwargs = {**self.search_kwargs, **kwargs}
+            retriever = self.vectordb.as_retriever(search_kwargs=search_kwargs)
+            self.search_kwargs = search_kwargs
+            self.retriever = retriever
+
@@ -0,0 +1,92 @@
+from langchain_core.documents import Document
+from utils.metrics import timed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+def text_splitter(chunk_size: int, chunk_overlap: int):
+    """The recursive character splitter every ingestion path uses."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=SEPARATORS
+    )
+
+
+class StreamingTextLoader:
+    """Split a text file of any size into chunks without reading it all at once.
+
+    The file is read ``window_size`` characters at a time. Each window is
+    split together with the text carried over from the previous one; chunks
+    close to the end of the window are held back and split again with the
+    next window, starting exactly where the first held-back chunk started.
+    That chunk already overlaps the last emitted one, so overlap works across
+    window boundaries the same as inside a window, and memory stays at about
+    one window plus the carry regardless of file size.
+
+    Chunks are yielded as Documents whose ``start_index`` is their character
+    offset in the file. Undecodable bytes are replaced rather than aborting a
+    multi-GB file near its end.
+    """
+
+    def __init__(self, file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200,
+                 window_size: int = 4 * 1024 * 1024, encoding: str = "utf-8", errors: str = "replace",
+                 metadata: Optional[Dict[str, Any]] = None):
+        if window_size < 4 * chunk_size:
+            raise ValueError(f"window_size ({window_size}) must be at least 4 x chunk_size ({chunk_size})")
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.window_size = window_size
+        self.encoding = encoding
+        self.errors = errors
+        self.metadata = metadata or {}
+        self.splitter = text_splitter(chunk_size, chunk_overlap)
+
+    def _split(self, text: str) -> List[Tuple[int, str]]:
+        """(start offset, chunk) pairs for one window."""
+        chunks = []
+        search_from = 0
+        with timed("chunk"):
+            for chunk in self.splitter.split_text(text):
+                start = text.find(chunk, search_from)
+                chunks.append((start, chunk))
+                # Skip past the overlap so a repeated chunk is not matched at its predecessor
+                search_from = max(start + 1, start + len(chunk) - self.chunk_overlap)
+        return chunks
+
+    def lazy_load(self) -> Iterator[Document]:
+        carry = ""
+        # Character offset of the start of ``carry`` in the file
+        offset = 0
+        with open(self.file_path, encoding=self.encoding, errors=self.errors) as f:
+            while True:
+                window = f.read(self.window_size)
+                at_end = len(window) < self.window_size
+                text = carry + window
+                chunks = self._split(text)
+
+                keep = len(chunks)
+                if not at_end:
+                    # Where a chunk ends depends on the text after it, which for the
+                    # last chunks may still be in the next window
+                    limit = len(text) - 2 * self.chunk_size
+                    # A blank window has no chunks: nothing is held back and the whole text is dropped
+                    keep = max(0, len(chunks) - 1)
+                    while keep > 0 and chunks[keep - 1][0] + len(chunks[keep - 1][1]) > limit:
+                        keep -= 1
+
+                for start, chunk in chunks[:keep]:
+                    yield Document(page_content=chunk, metadata={**self.metadata, "start_index": offset + start})
+                if at_end:
+                    return
+
+                cut = chunks[keep][0] if keep < len(chunks) else len(text)
+                carry = text[cut:]
+                offset += cut
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
@@ -1,46 +1,110 @@
 from langchain.vectorstores import Chroma
 from langchain_ollama.embeddings import OllamaEmbeddings
-import chromadb
+from langchain_core.documents import Document
+from database.parent_store import ParentDocumentStore
+from database.embeddings import ScheduledEmbeddings
+from utils.ollama import get_keep_alive_seconds, get_ollama_base_url
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
 import datetime
-from typing import Optional, Dict, Any, List
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_persistent_client(persist_directory: str):
+    """Process-wide Chroma client per persist directory, shared by every VectorDB and page."""
+    path = os.path.abspath(os.path.expanduser(persist_directory))
+    with _clients_lock:
+        client = _clients.get(path)
+        if client is None:
+            # chromadb takes a long time to import; pages that never open a database should not pay for it
+            import chromadb
+            client = chromadb.PersistentClient(path=path)
+            _clients[path] = client
+        return client
+
+
+def collection_name_for(rag_dir: str) -> str:
+    """Collection name VectorDB derives from a source directory (parent-folder)."""
+    parent_dir = os.path.dirname(rag_dir).split('/')[-1]
+    return '_'.join(parent_dir.split()) + "-" + '_'.join(os.path.basename(rag_dir).split())
+
+
+def distance_to_score(distance: float, space: str = "l2") -> float:
+    """Map a Chroma distance onto a 0-1 relevance score (higher is better)."""
+    if space in ("cosine", "ip"):
+        score = 1.0 - distance
+    else:
+        # Chroma reports squared L2; Ollama embeddings are unit length so d = 2 - 2cos
+        score = 1.0 - distance / 2.0
+    return max(0.0, min(1.0, score))
+
+
+def unpack_query_result(result: Dict[str, Any], index: int = 0,
+                        space: str = "l2") -> List[Tuple[Document, float]]:
+    """Turn the index-th query of a raw collection.query() result into (Document, score) pairs."""
+    documents = (result.get('documents') or [[]])[index] or []
+    metadatas = (result.get('metadatas') or [[]])[index] or []
+    distances = (result.get('distances') or [[]])[index] or []
+    pairs = []
+    for i, content in enumerate(documents):
+        metadata = metadatas[i] if i < len(metadatas) and metadatas[i] else {}
+        distance = distances[i] if i < len(distances) else 0.0
+        pairs.append((Document(page_content=content or "", metadata=metadata),
+                      distance_to_score(distance, space)))
+    return pairs
 
 class VectorDB(Chroma):
     
-    def __init__(self, rag_dir: str, persist_directory: str, embeddings_model: str):
+    def __init__(self, rag_dir: str, persist_directory: str, embeddings_model: str,
+                 retrieval_mode: str = "chunk", create_if_missing: bool = True):
         self.persist_directory = persist_directory
         self.rag_dir = rag_dir
         self.embeddings_model = embeddings_model
         
-        # Create embedding function
-        self.embedding_func = OllamaEmbeddings(
-            model=self.embeddings_model,
-            base_url="http://localhost:11434"
-        )
-        
         # Generate unique collection name from directory structure
-        parent_dir = os.path.dirname(self.rag_dir).split('/')[-1]
-        self.collection_name = '_'.join(parent_dir.split()) + "-" + '_'.join(os.path.basename(self.rag_dir).split())
+        self.collection_name = collection_name_for(self.rag_dir)
+        
+        # Create embedding function; requests go through the shared Ollama scheduler
+        self.embedding_func = ScheduledEmbeddings(
+            OllamaEmbeddings(
+                model=self.embeddings_model,
+                base_url=get_ollama_base_url(),
+                keep_alive=get_keep_alive_seconds()
+            ),
+            flow=self.collection_name
+        )
         collection_metadata = {
             "description": f"RAG collection for documents from {rag_dir}",
             "source_directory": rag_dir,
             "embeddings_model": embeddings_model,
             "created_at": str(datetime.datetime.now()),
+            "retrieval_mode": retrieval_mode,
             "version": "1.0"
         }
 
-        client = chromadb.PersistentClient(path=self.persist_directory)
+        client = get_persistent_client(self.persist_directory)
         
         try:
             collection = client.get_collection(name=self.collection_name)
             print(f"Collection '{self.collection_name}' already exists")
         except Exception:
+            if not create_if_missing:
+                raise ValueError(f"Collection '{self.collection_name}' does not exist")
             collection = client.create_collection(
                 name=self.collection_name,
                 metadata=collection_metadata
             )
             print(f"Created new collection '{self.collection_name}' with metadata")
         
+        # "parent" collections embed small child chunks and keep their parent
+        # windows in a ParentDocumentStore; an existing collection keeps the mode it was built with
+        self.retrieval_mode = (collection.metadata or {}).get("retrieval_mode", "chunk")
+        
         # Initialize parent Chroma class
         super().__init__(
             persist_directory=self.persist_directory,
@@ -49,6 +113,11 @@ class VectorDB(Chroma):
             client=client
         )
 
+    def get_parent_store(self) -> Optional[ParentDocumentStore]:
+        if self.retrieval_mode != "parent":
+            return None
+        return ParentDocumentStore(self.persist_directory, self.collection_name)
+
     def get_collection_metadata(self) -> Dict[str, Any]:
         try:
             collection = self._collection
@@ -73,7 +142,7 @@ class VectorDB(Chroma):
                     "persist_directory": self.persist_directory,
                     "embeddings_model": self.embeddings_model,
                     "rag_directory": self.rag_dir,
-                    "base_url": "http://localhost:11434"
+                    "base_url": get_ollama_base_url()
                 },
                 "current_collection": {
                     "name": self.collection_name,
@@ -119,14 +188,64 @@ class VectorDB(Chroma):
         
 # vector_db.py
 class VectorManager:
-    def __init__(self, vector_db):
+    def __init__(self, vector_db=None, persist_directory: Optional[str] = None,
+                 embeddings_model: Optional[str] = None):
         """
-        vector_db: Instance of existing VectorDB class
+        vector_db: Instance of existing VectorDB class, or None to manage every
+        collection in persist_directory without opening one for a source folder
+        embeddings_model: Model for collections whose metadata does not name one
         """
         self.vector_db = vector_db
-        self.client = vector_db._client
-        self.embedding_func = vector_db.embedding_func
-        self.persist_directory = vector_db.persist_directory
+        if vector_db is not None:
+            persist_directory = vector_db.persist_directory
+            embeddings_model = vector_db.embeddings_model
+        self.client = vector_db._client if vector_db is not None else get_persistent_client(persist_directory)
+        self.persist_directory = persist_directory
+        self.embeddings_model = embeddings_model
+        # Open collection handles and per-model embedders, reused across searches
+        self._collections = {}
+        self._embedders = {}
+        self._lock = threading.Lock()
+        if vector_db is not None:
+            self._collections[vector_db.collection_name] = vector_db._collection
+            self._embedders[embeddings_model] = vector_db.embedding_func
+            self.embedding_func = vector_db.embedding_func
+        else:
+            self.embedding_func = self._get_embedder(embeddings_model) if embeddings_model else None
+
+    def _get_collection(self, collection_name):
+        """Return a cached handle for the named collection"""
+        with self._lock:
+            collection = self._collections.get(collection_name)
+        if collection is None:
+            collection = self.client.get_collection(name=collection_name)
+            with self._lock:
+                self._collections[collection_name] = collection
+        return collection
+
+    def _get_embedder(self, embeddings_model):
+        """Return a cached embedding function for the given Ollama model"""
+        with self._lock:
+            embedder = self._embedders.get(embeddings_model)
+            if embedder is None:
+                embedder = ScheduledEmbeddings(
+                    OllamaEmbeddings(
+                        model=embeddings_model,
+                        base_url=get_ollama_base_url(),
+                        keep_alive=get_keep_alive_seconds()
+                    ),
+                    flow="federated"
+                )
+                self._embedders[embeddings_model] = embedder
+            return embedder
+
+    def _collection_model(self, collection):
+        metadata = getattr(collection, "metadata", None) or {}
+        return metadata.get("embeddings_model") or self.embeddings_model
+
+    def _collection_space(self, collection):
+        metadata = getattr(collection, "metadata", None) or {}
+        return metadata.get("hnsw:space", "l2")
 
     def list_collections(self):
         """Return all collection names"""
@@ -240,7 +359,7 @@ class VectorManager:
                 "total_collections": len([c for c in collections if isinstance(c, str)]),
                 "total_docs_across_all": total_docs,
                 "total_chunks_across_all": total_chunks,
-                "current_collection": self.vector_db.collection_name,
+                "current_collection": self.vector_db.collection_name if self.vector_db is not None else None,
                 "all_collections": all_collection_stats
             }
             
@@ -250,27 +369,24 @@ class VectorManager:
     def search_in_collection(self, collection_name, query, k=5):
         """Search for similar documents in a specific collection"""
         try:
-            from langchain.vectorstores import Chroma
-            
-            # Create temporary Chroma instance for this collection
-            temp_chroma = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embedding_func,
-                collection_name=collection_name,
-                client=self.client
+            collection = self._get_collection(collection_name)
+            query_vector = self._get_embedder(self._collection_model(collection)).embed_query(query)
+            result = collection.query(
+                query_embeddings=[query_vector],
+                n_results=k,
+                include=["documents", "metadatas", "distances"]
             )
             
-            results = temp_chroma.similarity_search(query, k=k)
-            
             return {
                 "collection_name": collection_name,
                 "query": query,
                 "results": [
                     {
                         "content": doc.page_content,
-                        "metadata": doc.metadata
+                        "metadata": doc.metadata,
+                        "score": score
                     }
-                    for doc in results
+                    for doc, score in unpack_query_result(result, space=self._collection_space(collection))
                 ]
             }
             
@@ -280,10 +396,107 @@ class VectorManager:
                 "error": f"Failed to search collection: {str(e)}"
             }
 
+    def federated_search(self, query, collection_names=None, k=5, max_workers=None):
+        """Search many collections concurrently and merge the hits into one ranked list.
+
+        The query is embedded once per embeddings model (collections built with
+        different models cannot share a vector) and each collection is queried
+        on a thread pool through its cached handle.
+        """
+        start_time = time.perf_counter()
+        names = collection_names if collection_names is not None else self.list_collections()
+        errors = {}
+        targets = {}
+
+        for name in names:
+            try:
+                targets[name] = self._get_collection(name)
+            except Exception as e:
+                errors[name] = f"Failed to open collection: {str(e)}"
+
+        embed_start = time.perf_counter()
+        query_vectors = {}
+        for model in {self._collection_model(c) for c in targets.values()}:
+            try:
+                query_vectors[model] = self._get_embedder(model).embed_query(query)
+            except Exception as e:
+                for name, collection in list(targets.items()):
+                    if self._collection_model(collection) == model:
+                        errors[name] = f"Failed to embed query with '{model}': {str(e)}"
+                        del targets[name]
+        embed_time = time.perf_counter() - embed_start
+
+        def query_one(name, collection):
+            query_start = time.perf_counter()
+            result = collection.query(
+                query_embeddings=[query_vectors[self._collection_model(collection)]],
+                n_results=k,
+                include=["documents", "metadatas", "distances"]
+            )
+            hits = unpack_query_result(result, space=self._collection_space(collection))
+            return hits, time.perf_counter() - query_start
+
+        merged = []
+        collection_timings = {}
+        if targets:
+            with ThreadPoolExecutor(max_workers=max_workers or min(8, len(targets))) as executor:
+                future_to_name = {
+                    executor.submit(query_one, name, collection): name
+                    for name, collection in targets.items()
+                }
+                for future in as_completed(future_to_name):
+                    name = future_to_name[future]
+                    try:
+                        hits, elapsed = future.result()
+                        collection_timings[name] = elapsed
+                        for doc, score in hits:
+                            merged.append({
+                                "collection_name": name,
+                                "content": doc.page_content,
+                                "metadata": doc.metadata,
+                                "score": score
+                            })
+                    except Exception as e:
+                        errors[name] = f"Failed to search collection: {str(e)}"
+
+        merged.sort(key=lambda hit: hit["score"], reverse=True)
+        return {
+            "query": query,
+            "results": merged[:k],
+            "collection_timings": collection_timings,
+            "embedding_time": embed_time,
+            "total_time": time.perf_counter() - start_time,
+            "errors": errors
+        }
+
     def delete_collection(self, collection_name):
         """Delete entire collection from DB"""
         try:
             self.client.delete_collection(name=collection_name)
+            with self._lock:
+                self._collections.pop(collection_name, None)
+            if os.path.exists(os.path.join(self.persist_directory, "parent_documents.sqlite3")):
+                ParentDocumentStore(self.persist_directory, collection_name).delete_collection()
             return {"success": f"Collection '{collection_name}' deleted successfully"}
         except Exception as e:
             return {"error": f"Failed to delete collection '{collection_name}': {str(e)}"}
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_vector_manager(persist_directory: str, embeddings_model: Optional[str] = None) -> VectorManager:
+    """Process-wide VectorManager over every collection in a persist directory.
+
+    Built on the shared Chroma client rather than a VectorDB, so it neither
+    needs nor creates a collection for any source folder; pages and the API
+    reuse its collection handles and embedders instead of building new ones.
+    """
+    key = (os.path.abspath(os.path.expanduser(persist_directory)), embeddings_model)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = VectorManager(persist_directory=persist_directory, embeddings_model=embeddings_model)
+            _managers[key] = manager
+        return manager
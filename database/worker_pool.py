@@ -0,0 +1,317 @@
+"""Process pool for ingestion that survives hung, crashed and leaking workers.
+
+Unlike ProcessPoolExecutor, every worker has its own pipe, so the pool knows
+which task each worker is running:
+
+- a task running longer than ``task_timeout`` gets its worker killed and
+  replaced; the other workers keep going
+- a worker that dies (segfault, OOM kill) fails only its own task; the pool
+  starts a replacement instead of breaking
+- a worker is replaced after ``max_tasks_per_worker`` tasks or once its RSS
+  passes ``max_worker_rss_mb``, so leaks (pdf2image/PIL) cannot build up
+- a task that crashed its worker or raised is retried ``max_retries`` times;
+  once it has failed for good (timeouts are not retried) its future fails
+  with WorkerTaskError and it is added to ``failures``
+
+Results already returned are never lost when a worker is replaced.
+
+Workers are started from a forkserver where the platform has one (spawn
+otherwise), never forked from the pool's manager thread: a plain fork while
+another thread holds a lock (metrics_registry's, say) leaves that lock held
+forever in the child.
+"""
+from concurrent.futures import Future
+from multiprocessing.connection import wait as wait_connections
+from utils.memory import MB, rss_bytes
+from utils.metrics import metrics_registry
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+import multiprocessing
+import os
+import threading
+import time
+
+
+def default_context():
+    """forkserver where available, else the platform default (spawn on Windows and macOS)."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context()
+
+
+class WorkerTaskError(Exception):
+    """A task failed on every attempt; ``kind`` is "timeout", "crash" or "error"."""
+
+    def __init__(self, kind: str, message: str, attempts: int):
+        super().__init__(message)
+        self.kind = kind
+        self.attempts = attempts
+
+
+def _worker_main(conn, initializer, initargs):
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        task_id, fn, args = task
+        try:
+            conn.send((task_id, True, fn(*args)))
+        except Exception as e:
+            # The exception itself may not be picklable
+            conn.send((task_id, False, f"{type(e).__name__}: {e}"))
+
+
+class _Task:
+    def __init__(self, task_id: int, fn: Callable, args: tuple, future: Future):
+        self.task_id = task_id
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.attempts = 0
+
+
+class _Worker:
+    def __init__(self, context, initializer: Optional[Callable] = None, initargs: tuple = ()):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, initializer, initargs), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.started_at = None
+        self.tasks_done = 0
+        self.retired_at = None
+
+    def run(self, task: _Task):
+        self.task = task
+        self.started_at = time.monotonic()
+        self.conn.send((task.task_id, task.fn, task.args))
+
+    def retire(self):
+        """Ask the worker to exit after its current task without waiting for it; see reap()."""
+        self.retired_at = time.monotonic()
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+
+    def reap(self, grace: float = 5.0) -> bool:
+        """True once a retired worker has exited (it is killed after ``grace`` seconds)."""
+        if self.process.is_alive():
+            if time.monotonic() - self.retired_at < grace:
+                return False
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        return True
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=None if kill else 5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ResilientProcessPool:
+    """Executor-like pool: ``submit()`` returns a Future, ``with`` shuts it down."""
+
+    def __init__(self, max_workers: Optional[int] = None, task_timeout: Optional[float] = None,
+                 max_tasks_per_worker: Optional[int] = None, max_worker_rss_mb: Optional[float] = None,
+                 max_retries: Optional[int] = None, mp_context=None,
+                 initializer: Optional[Callable] = None, initargs: tuple = ()):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.task_timeout = float(os.getenv("INGEST_TASK_TIMEOUT", "600")) if task_timeout is None else task_timeout
+        self.max_tasks_per_worker = (int(os.getenv("INGEST_WORKER_MAX_TASKS", "100"))
+                                     if max_tasks_per_worker is None else max_tasks_per_worker)
+        self.max_worker_rss_mb = (float(os.getenv("INGEST_WORKER_MAX_RSS_MB", "2048"))
+                                  if max_worker_rss_mb is None else max_worker_rss_mb)
+        self.max_retries = int(os.getenv("INGEST_TASK_RETRIES", "1")) if max_retries is None else max_retries
+        self._context = mp_context or default_context()
+        # Run in every worker (including replacements) before its first task
+        self.initializer = initializer
+        self.initargs = initargs
+        self._workers = []
+        # Recycled workers that were told to exit and have not been reaped yet
+        self._retiring = []
+        self._pending = deque()
+        self._lock = threading.Lock()
+        # Written to by submit()/shutdown() so the manager does not sit out its poll interval
+        self._wakeup_reader, self._wakeup_writer = multiprocessing.Pipe(duplex=False)
+        self._shutdown = False
+        self._task_ids = 0
+        self.failures = []
+        self.stats = {"completed": 0, "retried": 0, "timeouts": 0, "crashes": 0, "errors": 0, "recycled": 0}
+        self._thread = threading.Thread(target=self._run, name="resilient-pool", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit to a pool that has been shut down")
+            self._task_ids += 1
+            self._pending.append(_Task(self._task_ids, fn, args, future))
+        self._wake()
+        return future
+
+    def pids(self) -> List[int]:
+        """Current worker pids, for the memory monitor (workers are replaced over time)."""
+        with self._lock:
+            return [w.process.pid for w in self._workers if w.process.pid]
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            self._shutdown = True
+        self._wake()
+        if wait:
+            self._thread.join()
+
+    def _wake(self):
+        try:
+            self._wakeup_writer.send_bytes(b"")
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def _run(self):
+        try:
+            self._manage()
+        except Exception as e:
+            # Never leave callers waiting on futures nobody will complete
+            with self._lock:
+                self._shutdown = True
+                tasks = list(self._pending) + [w.task for w in self._workers if w.task is not None]
+                self._pending.clear()
+                workers, self._workers = self._workers, []
+            for task in tasks:
+                task.future.set_exception(WorkerTaskError("error", f"worker pool failed: {e}", task.attempts))
+            for worker in workers + self._retiring:
+                worker.stop(kill=True)
+            raise
+
+    def _manage(self):
+        while True:
+            with self._lock:
+                while self._pending and len(self._workers) < self.max_workers:
+                    self._workers.append(_Worker(self._context, self.initializer, self.initargs))
+                for worker in list(self._workers):
+                    if worker.task is None and self._pending:
+                        task = self._pending.popleft()
+                        try:
+                            worker.run(task)
+                        except (BrokenPipeError, OSError):
+                            # The worker died while idle; hand the task to its replacement
+                            self._pending.appendleft(task)
+                            self._workers.remove(worker)
+                            worker.stop(kill=True)
+                busy = [w for w in self._workers if w.task is not None]
+                if self._shutdown and not busy and not self._pending:
+                    break
+
+            ready = wait_connections([self._wakeup_reader] + [w.conn for w in busy] +
+                                     [w.process.sentinel for w in busy], timeout=self._poll_timeout(busy))
+            while self._wakeup_reader.poll():
+                self._wakeup_reader.recv_bytes()
+            self._retiring = [w for w in self._retiring if not w.reap()]
+            for worker in busy:
+                if worker.conn in ready or worker.process.sentinel in ready:
+                    self._collect(worker)
+                elif self.task_timeout and time.monotonic() - worker.started_at > self.task_timeout:
+                    self._fail(worker, "timeout", f"timed out after {self.task_timeout:.0f}s", kill=True)
+
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+        for worker in self._retiring:
+            worker.stop()
+        self._retiring = []
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+    def _poll_timeout(self, busy: List[_Worker]) -> float:
+        if not self.task_timeout or not busy:
+            return 0.1
+        remaining = min(self.task_timeout - (time.monotonic() - w.started_at) for w in busy)
+        return max(0.0, min(0.1, remaining))
+
+    def _collect(self, worker: _Worker):
+        try:
+            task_id, ok, payload = worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join(timeout=1)
+            code = worker.process.exitcode
+            self._fail(worker, "crash", f"worker exited with code {code}", kill=True)
+            return
+        except Exception as e:
+            ok, payload = False, f"could not read the result: {e}"
+        task = worker.task
+        worker.task = None
+        worker.tasks_done += 1
+        if ok:
+            self.stats["completed"] += 1
+            task.future.set_result(payload)
+        else:
+            self._retry_or_give_up(task, "error", payload)
+        self._maybe_recycle(worker)
+
+    def _fail(self, worker: _Worker, kind: str, message: str, kill: bool):
+        task = worker.task
+        worker.task = None
+        self._replace(worker, kill=kill)
+        self._retry_or_give_up(task, kind, message)
+
+    def _retry_or_give_up(self, task: _Task, kind: str, message: str):
+        self.stats[{"timeout": "timeouts", "crash": "crashes", "error": "errors"}[kind]] += 1
+        metrics_registry.inc("rag_worker_task_failures_total", kind=kind)
+        task.attempts += 1
+        # A file that hung once will hang again; only crashes and errors are retried
+        if kind != "timeout" and task.attempts <= self.max_retries:
+            self.stats["retried"] += 1
+            with self._lock:
+                self._pending.append(task)
+            return
+        self.failures.append({"args": task.args, "kind": kind, "error": message, "attempts": task.attempts})
+        task.future.set_exception(WorkerTaskError(kind, message, task.attempts))
+
+    def _maybe_recycle(self, worker: _Worker):
+        reason = None
+        if self.max_tasks_per_worker and worker.tasks_done >= self.max_tasks_per_worker:
+            reason = "tasks"
+        elif self.max_worker_rss_mb and (rss_bytes(worker.process.pid) or 0) > self.max_worker_rss_mb * MB:
+            reason = "rss"
+        if reason:
+            self.stats["recycled"] += 1
+            metrics_registry.inc("rag_worker_recycled_total", reason=reason)
+            self._replace(worker, kill=False)
+
+    def _replace(self, worker: _Worker, kill: bool):
+        if kill:
+            worker.stop(kill=True)
+        else:
+            # Joining here would hold up dispatch; the manager loop reaps it later
+            worker.retire()
+            self._retiring.append(worker)
+        with self._lock:
+            self._workers.remove(worker)
+            # A new worker is started on the next dispatch if there is work left
+
+    def report(self) -> Dict[str, Any]:
+        return {**self.stats, "failed": len(self.failures)}
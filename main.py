@@ -1,25 +1,73 @@
 from rag_pipeline.create_rag import RAGPipeline
+from rag_pipeline.batch_qa import BatchQuestionAnswerer, load_questions
+from utils.ollama import get_model_manager
+from utils.metrics import format_stage_summary, metrics_registry, start_metrics_file
+from utils.profiling import enable_profiling
+from pathlib import Path
+import argparse
+import atexit
 import os 
 from dotenv import load_dotenv
 import time
 load_dotenv()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask questions about the documents in RAG_DIR")
+    parser.add_argument("--batch", help="JSONL or CSV file of questions to answer non-interactively")
+    parser.add_argument("--output", help="JSONL file for batch answers (default: <batch>.answers.jsonl); "
+                                         "re-running with the same file resumes an interrupted run")
+    parser.add_argument("--workers", type=int, default=4, help="Questions generated in parallel in batch mode")
+    parser.add_argument("--k", type=int, default=None, help="Documents retrieved per question")
+    parser.add_argument("--answer-mode", choices=["generate", "extractive", "auto"],
+                        default=os.getenv("ANSWER_MODE", "generate"),
+                        help="extractive returns highlighted passages without the LLM; auto decides per question")
+    parser.add_argument("--stage-timings", action="store_true", help="Print per-stage timings on exit")
+    parser.add_argument("--profile", choices=["cprofile", "sample", "both"],
+                        help="Profile ingestion and questions (same as RAG_PROFILE)")
+    parser.add_argument("--profile-dir", help="Where profiles are written (default: ./profiles)")
+    args = parser.parse_args()
+    if args.profile:
+        # Set before the pipeline starts so ingestion worker processes inherit it
+        enable_profiling(args.profile, args.profile_dir)
+    metrics_writer = start_metrics_file()
+    if metrics_writer is not None:
+        atexit.register(metrics_writer.stop)
+    if args.stage_timings:
+        atexit.register(lambda: print(format_stage_summary(metrics_registry.stage_summary())))
+
     rag_dir = os.getenv("RAG_DIR")
     persistent_dir = os.getenv("PERSISTENT_DIR")
     embeddings_model = os.getenv("EMBEDDINGS_MODEL")
     llm_model = os.getenv("LLM_MODEL")
+    # Load the models into Ollama in the background while the pipeline opens
+    model_manager = get_model_manager().start()
     start_time = time.time()
     rag_pipeline = RAGPipeline(
         rag_dir=rag_dir,    
         persist_dir=persistent_dir,
         embeddings_model=embeddings_model,
-        llm_model=llm_model
+        llm_model=llm_model,
+        answer_mode=args.answer_mode,
+        small_llm_model=os.getenv("SMALL_LLM_MODEL")
     )
     end_time = time.time()
     print(f"Time taken to set up RAG Pipeline: {end_time - start_time} seconds")
     print("RAG Pipeline is set up and ready to use!")
     
+    if args.batch:
+        output_path = args.output or str(Path(args.batch).with_suffix(".answers.jsonl"))
+        model_manager.touch()
+        summary = BatchQuestionAnswerer(rag_pipeline, workers=args.workers, k=args.k).run(
+            load_questions(args.batch), output_path
+        )
+        print(f"✅ Answered {summary['answered']} questions ({summary['failed']} failed, "
+              f"{summary['skipped']} already done) in {summary['wall_time']:.2f}s, "
+              f"{summary['questions_per_second']:.2f} q/s")
+        print(f"Retrieval: {summary['retrieval_time']:.2f}s, generation: {summary['generation_time']:.2f}s "
+              f"(summed over workers)")
+        print(f"Answers written to {output_path}")
+        raise SystemExit(1 if summary['failed'] else 0)
+    
     
     while True: 
         print('-' * 50)
@@ -28,7 +76,22 @@ if __name__ == "__main__":
             print("Exiting the RAG system. Goodbye!")
             break
         
-        response = rag_pipeline.ask_detailed(query)
+        model_manager.touch()
+        stream = rag_pipeline.ask_stream(query, k=args.k)
+        print("\nANSWER: ")
+        for token in stream:
+            print(token, end="", flush=True)
+        print("\n\n")
+        
+        response = stream.result
         source = response['source_documents']
-        answer = response['answer']
-        print(f"\nANSWER: \n{answer}\n\n")
\ No newline at end of file
+        context = response.get('context', {})
+        if 'packed_tokens' in context:
+            print(f"Context: {context['packed_tokens']} of {context['input_tokens']} tokens packed "
+                  f"({context['documents_packed']}/{context['documents_in']} documents), "
+                  f"prefill {context['prefill_time']:.2f}s")
+        if response.get('answer_mode') == 'extractive' or response.get('route_reason'):
+            print(f"Answer mode: {response.get('answer_mode')} ({response.get('route_reason') or 'forced'})")
+        if context.get('time_to_first_token') is not None:
+            print(f"Time to first token: {context['time_to_first_token']:.2f}s, "
+                  f"total: {context['total_time']:.2f}s")
@@ -3,9 +3,16 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 import requests
+from utils.ollama import get_ollama_base_url, get_model_manager
+from utils.metrics import start_metrics_file
 
 load_dotenv()
 
+# Start loading the configured models into Ollama while the page renders
+model_manager = get_model_manager().start()
+start_metrics_file()
+model_manager.touch()
+
 st.set_page_config(
     page_title="Universal RAG System",
     page_icon="🚀",
@@ -111,6 +118,7 @@ p {
 }
 
 .status-success { background: #10b981; }
+.status-warning { background: #f59e0b; }
 .status-error { background: #ef4444; }
 
 /* Header styling */
@@ -200,7 +208,7 @@ st.markdown("""
 
 # Check Ollama status
 try:
-    response = requests.get("http://localhost:11434/api/tags", timeout=3)
+    response = requests.get(f"{get_ollama_base_url()}/api/tags", timeout=3)
     if response.status_code == 200:
         st.markdown('<div class="status-item"><span class="status-dot status-success"></span>Ollama: Online</div>', unsafe_allow_html=True)
     else:
@@ -208,6 +216,26 @@ try:
 except:
     st.markdown('<div class="status-item"><span class="status-dot status-error"></span>Ollama: Offline</div>', unsafe_allow_html=True)
 
+# Model load status
+state_styles = {
+    "loaded": "status-success",
+    "loading": "status-warning",
+    "not loaded": "status-warning",
+    "expired": "status-warning",
+    "error": "status-error",
+}
+for model_name, model_state in model_manager.status().items():
+    detail = model_state["state"].capitalize()
+    if model_state["state"] == "loaded" and model_state.get("load_time") is not None:
+        detail += f" (warm-up {model_state['load_time']:.1f}s, keep-alive {model_manager.keep_alive})"
+    elif model_state["state"] == "error":
+        detail += f" ({model_state['error']})"
+    st.markdown(
+        f'<div class="status-item"><span class="status-dot {state_styles.get(model_state["state"], "status-error")}"></span>'
+        f'{model_state["kind"].upper()} {model_name}: {detail}</div>',
+        unsafe_allow_html=True
+    )
+
 # Database status
 persist_dir = Path(os.getenv("PERSISTENT_DIR", ""))
 if persist_dir.exists():
@@ -1,7 +1,8 @@
 import streamlit as st
 import requests
 from database.vector_db import VectorDB, VectorManager
-from rag_pipeline.create_rag import RAGPipeline
+from rag_pipeline.registry import pipeline_registry
+from utils.ollama import get_model_manager
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -185,6 +186,9 @@ except Exception as e:
     st.error(f"Database Error: {str(e)}")
     collections = []
 
+# An active chat session keeps the models warm in Ollama
+get_model_manager().start().touch()
+
 # Initialize session state
 if "chat_histories" not in st.session_state:
     st.session_state.chat_histories = {}
@@ -245,11 +249,14 @@ if selected_collection:
     if source_dir:
         try:
             with st.spinner("📄 Loading collection..."):
-                rag_pipeline = RAGPipeline(
+                # Cached across reruns; switching back to a recent collection is instant
+                rag_pipeline = pipeline_registry.get(
                     rag_dir=source_dir,
                     persist_dir=os.getenv("PERSISTENT_DIR"),
                     embeddings_model=os.getenv("EMBEDDINGS_MODEL"),
                     llm_model=os.getenv("LLM_MODEL"),
+                    query_only=True,
+                    small_llm_model=os.getenv("SMALL_LLM_MODEL"),
                 )
                 st.success("✅ Collection loaded successfully!")
         except Exception as e:
@@ -340,31 +347,23 @@ if selected_collection:
                 current_messages.append({"role": "user", "content": user_input})
                 st.session_state.chat_histories[selected_collection] = current_messages
                 
-                # Generate response
-                with st.spinner("🤔 Thinking..."):
-                    response = rag_pipeline.ask_detailed(user_input)
-                    answer = response.get("answer", "I couldn't generate an answer.")
-                    
-                    # Add assistant message and update session state
-                    current_messages.append({"role": "assistant", "content": answer})
-                    st.session_state.chat_histories[selected_collection] = current_messages
+                # Show the question right away and stream the answer under it
+                st.markdown(f"""
+                <div class="user-message">
+                    <strong>You:</strong><br>
+                    {user_input}
+                </div>
+                """, unsafe_allow_html=True)
+                st.markdown("**Assistant:**")
+                with st.spinner("🔍 Searching documents..."):
+                    stream = rag_pipeline.ask_stream(user_input)
+                streamed_answer = st.write_stream(stream)
+                response = stream.result or {}
+                answer = response.get("answer") or streamed_answer or "I couldn't generate an answer."
                 
-                # Update the UI
-                for message in current_messages:
-                    if message["role"] == "user":
-                        st.markdown(f"""
-                        <div class="user-message">
-                            <strong>You:</strong><br>
-                            {message["content"]}
-                        </div>
-                        """, unsafe_allow_html=True)
-                    else:
-                        st.markdown(f"""
-                        <div class="assistant-message">
-                            <strong>Assistant:</strong><br>
-                            {message["content"]}
-                        </div>
-                        """, unsafe_allow_html=True)
+                # Add assistant message and update session state
+                current_messages.append({"role": "assistant", "content": answer})
+                st.session_state.chat_histories[selected_collection] = current_messages
                 
                 # Clear input (using a new key to force reset)
                 st.session_state["chat_input"] = ""
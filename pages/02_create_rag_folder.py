@@ -1,7 +1,9 @@
 import streamlit as st
 import requests
+from utils.ollama import get_ollama_base_url
 from database.vector_db import VectorDB, VectorManager
 from rag_pipeline.create_rag import RAGPipeline
+from rag_pipeline.registry import pipeline_registry
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -199,7 +201,7 @@ div[data-testid="stSpinner"] {
 def categorize_models():
     """Get available models from Ollama"""
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = requests.get(f"{get_ollama_base_url()}/api/tags", timeout=5)
         data = response.json()
 
         llms, embedding_models = [], []
@@ -300,6 +302,12 @@ with st.form("create_collection_form", clear_on_submit=False):
                 help="Model for creating document embeddings"
             )
         
+        parent_retrieval = st.checkbox(
+            "🧩 Small-to-big retrieval",
+            value=False,
+            help="Embed small chunks for precise matching but answer from their larger parent sections"
+        )
+        
         create_button = st.form_submit_button("🚀 Create Collection", type="primary")
         
         if create_button and folder_path:
@@ -338,7 +346,10 @@ with st.form("create_collection_form", clear_on_submit=False):
                                 persist_dir=os.getenv("PERSISTENT_DIR"),
                                 embeddings_model=selected_embedding,
                                 llm_model=selected_llm,
+                                parent_retrieval=parent_retrieval,
                             )
+                            # Chat must not keep serving a pipeline cached before the rebuild
+                            pipeline_registry.invalidate(rag_pipeline.vectordb.collection_name)
                             
                             status_text.text("✨ Processing documents...")
                             progress_bar.progress(80)
@@ -1,6 +1,10 @@
 import streamlit as st
-from database.vector_db import VectorDB, VectorManager
+from database.vector_db import get_vector_manager
+from rag_pipeline.registry import pipeline_registry
+from utils.metrics import (STAGE_HISTOGRAM, counter_rate_history, counter_totals, histogram_summary,
+                           metrics_registry, read_metrics_file, window_snapshot)
 from dotenv import load_dotenv
+import datetime
 import os
 
 load_dotenv()
@@ -175,14 +179,12 @@ div[data-testid="stAlert"][data-baseweb="notification"][kind="info"] {
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize DB and Manager
+# Shared manager: reruns reuse its client and embedder instead of building new ones
 try:
-    vdb = VectorDB(
-        rag_dir=os.getenv('RAG_DIR'), 
-        persist_directory=os.getenv('PERSISTENT_DIR'), 
+    manager = get_vector_manager(
+        persist_directory=os.getenv('PERSISTENT_DIR'),
         embeddings_model=os.getenv('EMBEDDINGS_MODEL')
     )
-    manager = VectorManager(vdb)
     db_stats = manager.database_stats()
 except Exception as e:
     st.error(f"Database connection error: {e}")
@@ -223,6 +225,106 @@ with col2:
 with col3:
     st.metric("Chunks", f"{total_chunks:,}")
 
+# Performance
+st.markdown("---")
+st.subheader("Performance")
+
+QUERY_STAGES = ("embed", "retrieve", "pack", "generate")
+# Window length and throughput chart bin, in seconds
+WINDOWS = {"Last hour": (3600, 60), "Last 24 hours": (86400, 300), "Last 7 days": (7 * 86400, 3600),
+           "All time": (None, 3600)}
+
+
+@st.cache_data(ttl=30)
+def load_metrics_records(path):
+    return read_metrics_file(path)
+
+
+def to_ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+metrics_path = os.getenv("METRICS_FILE")
+metrics_records = load_metrics_records(metrics_path) if metrics_path else []
+window_name = st.selectbox("Window", list(WINDOWS), index=1, key="perf_window")
+window_seconds, bin_seconds = WINDOWS[window_name]
+
+if metrics_records:
+    perf = window_snapshot(metrics_records, window_seconds)
+    st.caption(f"From {len(metrics_records)} snapshots in {metrics_path}; processes write every "
+               f"{os.getenv('METRICS_INTERVAL', '60')}s, so the last minute may be missing.")
+else:
+    perf = metrics_registry.snapshot(include_samples=False)
+    st.caption("METRICS_FILE is not set or empty; showing only this Streamlit process since it started. "
+               "Set METRICS_FILE for the API, CLI and UI to share a persisted history.")
+
+# Query latency per collection and stage
+st.markdown("##### Query latency by stage")
+latency = histogram_summary(perf, STAGE_HISTOGRAM, by=("collection", "stage"), kind="query")
+for stage in QUERY_STAGES[1:]:
+    latency.update(histogram_summary(perf, STAGE_HISTOGRAM, by=("collection", "stage"), stage=stage))
+latency_rows = [
+    {"collection": collection or "(none)", "stage": stage, "count": entry["count"],
+     "p50 ms": to_ms(entry["p50"]), "p95 ms": to_ms(entry["p95"]), "p99 ms": to_ms(entry["p99"])}
+    for (collection, stage), entry in sorted(
+        latency.items(), key=lambda item: (item[0][0] or "", QUERY_STAGES.index(item[0][1])))
+]
+if latency_rows:
+    st.dataframe(latency_rows, use_container_width=True, hide_index=True)
+else:
+    st.info("No queries recorded in this window.")
+
+# Ingestion throughput
+st.markdown("##### Ingestion throughput")
+col1, col2, col3 = st.columns(3)
+upserted = sum(counter_totals(perf, "rag_upserted_chunks_total").values())
+upsert_time = sum(entry["count"] * entry["mean"] for entry in
+                  histogram_summary(perf, STAGE_HISTOGRAM, stage="upsert").values())
+with col1:
+    st.metric("Files loaded", f"{sum(counter_totals(perf, 'rag_files_loaded_total').values()):,.0f}")
+with col2:
+    st.metric("Chunks upserted", f"{upserted:,.0f}")
+with col3:
+    st.metric("Upsert rate", f"{upserted / upsert_time:,.1f} chunks/s" if upsert_time else "—")
+
+if metrics_records:
+    since = datetime.datetime.now().timestamp() - window_seconds if window_seconds else 0
+    history = [
+        {"time": datetime.datetime.fromtimestamp(start), "chunks/s": round(rate, 2)}
+        for start, rate in counter_rate_history(metrics_records, "rag_upserted_chunks_total", bin_seconds)
+        if start >= since - bin_seconds
+    ]
+    if history:
+        st.line_chart(history, x="time", y="chunks/s")
+    else:
+        st.info("No ingestion recorded in this window.")
+
+# Embedding cache and Ollama queue wait per collection
+cache = counter_totals(perf, "rag_embedding_cache_total", by=("collection", "result"))
+queue_wait = histogram_summary(perf, "ollama_queue_wait_seconds", by=("collection",))
+collection_rows = []
+for collection in sorted({c for c, _ in cache} | {c for (c,) in queue_wait}, key=lambda c: c or ""):
+    hits = cache.get((collection, "hit"), 0)
+    lookups = hits + cache.get((collection, "miss"), 0)
+    wait = queue_wait.get((collection,), {})
+    collection_rows.append({
+        "collection": collection or "(none)",
+        "cache lookups": int(lookups),
+        "cache hit rate": f"{hits / lookups:.0%}" if lookups else None,
+        "Ollama requests": wait.get("count", 0),
+        "queue wait p50 ms": to_ms(wait.get("p50")),
+        "queue wait p95 ms": to_ms(wait.get("p95")),
+        "queue wait mean ms": to_ms(wait.get("mean"))
+    })
+
+st.markdown("##### Embedding cache and Ollama queue wait")
+if int(os.getenv("EMBEDDING_CACHE_SIZE", "0")) <= 0:
+    st.caption("The query embedding cache is off; set EMBEDDING_CACHE_SIZE to enable it.")
+if collection_rows:
+    st.dataframe(collection_rows, use_container_width=True, hide_index=True)
+else:
+    st.info("No embedding or Ollama requests recorded in this window.")
+
 # Collection Details
 st.markdown("---")
 st.subheader("Collection Details")
@@ -275,6 +377,7 @@ else:
                         try:
                             result = manager.delete_collection(collection_name)
                             if "success" in result:
+                                pipeline_registry.invalidate(collection_name)
                                 st.success(f"Collection '{collection_name}' deleted!")
                                 st.session_state.pop(confirm_key, None)
                                 st.rerun()
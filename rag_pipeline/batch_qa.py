@@ -0,0 +1,205 @@
+from rag_pipeline.create_rag import RAGPipeline
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+import csv
+import json
+import os
+import threading
+import time
+
+
+def load_questions(path: str) -> List[Dict[str, str]]:
+    """Read questions from JSONL or CSV.
+
+    JSONL lines are either strings or objects with a "question" field; CSV
+    files need a "question" column. An optional "id" field/column is kept,
+    otherwise the 1-based row number is used, so ids stay stable across runs.
+    """
+    questions = []
+    if Path(path).suffix.lower() == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            if "question" not in (reader.fieldnames or []):
+                raise ValueError(f"CSV file '{path}' has no 'question' column")
+            for row_number, row in enumerate(reader, start=1):
+                if (row.get("question") or "").strip():
+                    questions.append({"id": row.get("id") or str(row_number), "question": row["question"].strip()})
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if isinstance(item, str):
+                    item = {"question": item}
+                if not (item.get("question") or "").strip():
+                    continue
+                questions.append({"id": str(item.get("id", line_number)), "question": item["question"].strip()})
+    return questions
+
+
+def load_records(output_path: str) -> Dict[str, Dict[str, Any]]:
+    """The latest record per id in an output file, in the order the ids first appear."""
+    records = {}
+    if not Path(output_path).exists():
+        return records
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of a run that was killed mid-write
+                continue
+            records[str(record["id"])] = record
+    return records
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """Ids already answered in an earlier (possibly interrupted) run; failed ones are retried."""
+    return {record_id for record_id, record in load_records(output_path).items() if "error" not in record}
+
+
+def compact_output(output_path: str) -> int:
+    """Rewrite the output file with only the latest record per id; returns the number of records kept.
+
+    A retried question appends a new record after its failed one, so the
+    file is compacted before and after every run. The rewrite goes through a
+    temporary file, so an interruption leaves either the old or the new file.
+    """
+    records = load_records(output_path)
+    if not Path(output_path).exists():
+        return 0
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for record in records.values():
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    os.replace(temp_path, output_path)
+    return len(records)
+
+
+class BatchQuestionAnswerer:
+    """Answer a list of questions against one pipeline and append the results to JSONL.
+
+    Questions are retrieved in batches with a single embedding call per batch
+    (search_documents_many), and answers are generated by up to ``workers``
+    threads. At most ``max_in_flight`` answers (default 2 x workers) are
+    queued at a time, so the next batch is retrieved while the previous one
+    is still generating without holding every retrieved context in memory.
+    Every answer is written as soon as it is ready, so an interrupted run can
+    be resumed with the same output file.
+    """
+
+    def __init__(self, rag_pipeline: RAGPipeline, workers: int = 4, batch_size: int = 32,
+                 k: Optional[int] = None, max_in_flight: Optional[int] = None):
+        self.rag_pipeline = rag_pipeline
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight or 2 * workers
+        self.k = k if k is not None else rag_pipeline.retriever.search_kwargs.get('k', 5)
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def _record(item: Dict[str, str], result: Dict[str, Any], retrieval_time: float,
+                generation_time: float) -> Dict[str, Any]:
+        record = {
+            "id": item["id"],
+            "question": item["question"],
+            "answer": result.get("answer", ""),
+            "sources": [
+                {"source": doc.metadata.get("source"), "page": doc.metadata.get("page"),
+                 "content": doc.page_content}
+                for doc in result.get("source_documents", [])
+            ],
+            "timings": {
+                "retrieval": retrieval_time,
+                "generation": generation_time,
+                "total": retrieval_time + generation_time
+            },
+            "context": result.get("context", {})
+        }
+        if "error" in result:
+            record["error"] = result["error"]
+        return record
+
+    def _answer(self, item: Dict[str, str], documents, retrieval_time: float, output) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        result = self.rag_pipeline.answer_with_documents(item["question"], documents)
+        return self._write(self._record(item, result, retrieval_time, time.perf_counter() - start_time), output)
+
+    def _write(self, record: Dict[str, Any], output) -> Dict[str, Any]:
+        with self._write_lock:
+            output.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            output.flush()
+        return record
+
+    def run(self, questions: List[Dict[str, str]], output_path: str) -> Dict[str, Any]:
+        compact_output(output_path)
+        completed = load_completed(output_path)
+        pending = [item for item in questions if item["id"] not in completed]
+        print(f"📋 {len(questions)} questions, {len(questions) - len(pending)} already answered, "
+              f"{len(pending)} to go")
+
+        start_time = time.perf_counter()
+        retrieval_time = 0.0
+        totals = {"answered": 0, "failed": 0, "generation_time": 0.0}
+        in_flight = set()
+
+        def collect(done):
+            for future in done:
+                record = future.result()
+                totals["failed" if "error" in record else "answered"] += 1
+                totals["generation_time"] += record["timings"]["generation"]
+
+        def submit(fn, *args):
+            nonlocal in_flight
+            # Bounded lookahead: wait for a slot instead of queueing the whole file
+            while len(in_flight) >= self.max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(fn, *args))
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            with open(output_path, "a", encoding="utf-8") as output:
+                try:
+                    for i in range(0, len(pending), self.batch_size):
+                        batch = pending[i:i + self.batch_size]
+                        try:
+                            search = self.rag_pipeline.search_documents_many(
+                                [item["question"] for item in batch], k=self.k
+                            )
+                        except Exception as e:
+                            print(f"❌ Retrieval failed for questions {i + 1}-{i + len(batch)}: {str(e)}")
+                            search = {"results": [[] for _ in batch], "total_time": 0.0, "error": str(e)}
+                        retrieval_time += search["total_time"]
+                        # Batched retrieval cost, amortized over the questions in the batch
+                        per_question = search["total_time"] / len(batch)
+                        for item, documents in zip(batch, search["results"]):
+                            if "error" in search:
+                                result = {"answer": "", "error": f"Failed to retrieve documents: {search['error']}"}
+                                submit(self._write, self._record(item, result, 0.0, 0.0), output)
+                            else:
+                                submit(self._answer, item, documents, per_question, output)
+                    collect(wait(in_flight).done)
+                except KeyboardInterrupt:
+                    # Drop the queued questions; the ones already generating finish and are written
+                    print("\n⏹️  Interrupted, finishing the answers in progress...")
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise
+        finally:
+            executor.shutdown(wait=True)
+            compact_output(output_path)
+
+        answered = totals["answered"] + totals["failed"]
+        wall_time = time.perf_counter() - start_time
+        return {
+            "total": len(questions),
+            "skipped": len(questions) - len(pending),
+            "answered": totals["answered"],
+            "failed": totals["failed"],
+            "retrieval_time": retrieval_time,
+            "generation_time": totals["generation_time"],
+            "wall_time": wall_time,
+            "questions_per_second": answered / wall_time if wall_time > 0 else 0.0
+        }
\ No newline at end of file
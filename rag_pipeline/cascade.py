@@ -0,0 +1,125 @@
+from rag_pipeline.extractive import query_terms
+from utils.metrics import percentile
+from langchain_core.documents import Document
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+import re
+import threading
+
+# Answers that admit the model could not find (or was unsure about) the answer
+HEDGES = re.compile(
+    r"\b(i don'?t know|i do not know|not sure|i'?m sorry|cannot (?:be )?determine|can'?t (?:be )?determine|"
+    r"unable to (?:find|determine|answer)|no (?:relevant )?information|not (?:mentioned|specified|provided|stated)|"
+    r"does(?:n'?t| not) (?:say|mention|specify|provide|contain)|unclear)\b",
+    re.IGNORECASE
+)
+# Numbers and identifiers (AX-4411, 2023, 30%) must be copied from the sources, not invented
+FACT_TOKENS = re.compile(r"\b[\w-]*\d[\w.,%-]*\b")
+
+
+class ConfidenceCheck:
+    """Decide whether a small model's answer can be returned as is.
+
+    The answer fails when it is empty, hedges, cites numbers or identifiers
+    that do not occur in the context, or when too few of its content words
+    appear in the context (``min_support``).
+    """
+
+    def __init__(self, min_support: float = 0.5, min_words: int = 2):
+        self.min_support = min_support
+        self.min_words = min_words
+
+    def check(self, answer: str, documents: List[Document]) -> Tuple[bool, str]:
+        """Returns (passed, reason)."""
+        words = query_terms(answer or "")
+        if len(words) < self.min_words:
+            return False, "empty answer"
+        if HEDGES.search(answer):
+            return False, "hedged answer"
+        context = "\n".join(doc.page_content for doc in documents)
+        context_lower = context.lower()
+        missing = [t for t in FACT_TOKENS.findall(answer) if t.rstrip(".,").lower() not in context_lower]
+        if missing:
+            return False, f"cites {missing[0]!r}, which is not in the sources"
+        context_terms = set(query_terms(context))
+        support = sum(1 for w in words if w in context_terms) / len(words)
+        if support < self.min_support:
+            return False, f"only {support:.0%} of the answer is supported by the sources"
+        return True, "passed"
+
+
+class CascadeStats:
+    """Per-collection escalation rate and latency of the generation cascade.
+
+    Savings are estimated as the mean large-model latency seen for that
+    collection times the requests answered without escalation, minus the
+    small model's time on every request, escalated ones included: those paid
+    for both models. Streamed answers skip the cascade and are not counted.
+    """
+
+    def __init__(self, history_size: int = 1000):
+        self._lock = threading.Lock()
+        self._history_size = history_size
+        self._collections = {}
+
+    def _entry(self, collection_name: str) -> Dict[str, Any]:
+        if collection_name not in self._collections:
+            self._collections[collection_name] = {
+                "requests": 0,
+                "escalations": 0,
+                "reasons": {},
+                "small_times": deque(maxlen=self._history_size),
+                "large_times": deque(maxlen=self._history_size),
+                "answer_times": deque(maxlen=self._history_size),
+                "accepted_small_time": 0.0,
+                "escalated_small_time": 0.0,
+                "accepted": 0
+            }
+        return self._collections[collection_name]
+
+    def record(self, collection_name: str, small_time: float, escalated: bool,
+               large_time: Optional[float] = None, reason: Optional[str] = None):
+        with self._lock:
+            entry = self._entry(collection_name)
+            entry["requests"] += 1
+            entry["small_times"].append(small_time)
+            if escalated:
+                entry["escalations"] += 1
+                entry["escalated_small_time"] += small_time
+                # Group reasons by their kind ("cites 'X'..." -> "cites")
+                kind = (reason or "unknown").split(" ")[0]
+                entry["reasons"][kind] = entry["reasons"].get(kind, 0) + 1
+                if large_time is not None:
+                    entry["large_times"].append(large_time)
+                    entry["answer_times"].append(small_time + large_time)
+            else:
+                entry["accepted"] += 1
+                entry["accepted_small_time"] += small_time
+                entry["answer_times"].append(small_time)
+
+    def stats(self, collection_name: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            names = [collection_name] if collection_name else list(self._collections)
+            report = {}
+            for name in names:
+                entry = self._collections.get(name)
+                if entry is None:
+                    continue
+                large_times = list(entry["large_times"])
+                mean_large = sum(large_times) / len(large_times) if large_times else None
+                report[name] = {
+                    "requests": entry["requests"],
+                    "escalations": entry["escalations"],
+                    "escalation_rate": entry["escalations"] / entry["requests"] if entry["requests"] else 0.0,
+                    "escalation_reasons": dict(entry["reasons"]),
+                    "small_p50": percentile(entry["small_times"], 50),
+                    "large_p50": percentile(large_times, 50),
+                    "answer_p50": percentile(entry["answer_times"], 50),
+                    # Unknown until at least one request has gone to the large model
+                    "latency_saved": (entry["accepted"] * mean_large - entry["accepted_small_time"]
+                                      - entry["escalated_small_time"] if mean_large is not None else None)
+                }
+            return report
+
+
+cascade_stats = CascadeStats()
@@ -0,0 +1,155 @@
+from langchain_core.documents import Document
+from typing import Callable, Dict, List, Optional, Tuple, Any
+import math
+import re
+
+# Captured so the original whitespace between kept sentences can be restored
+SENTENCE_BOUNDARY = re.compile(r'((?<=[.!?])\s+|\n{2,})')
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """Cheap token estimate; Ollama does not expose the model tokenizer locally."""
+    return int(math.ceil(len(text) / chars_per_token)) if text else 0
+
+
+def _normalize(sentence: str) -> str:
+    return ' '.join(sentence.lower().split())
+
+
+def _overlap_length(left: str, right: str, max_overlap: int, min_overlap: int) -> int:
+    """Length of the longest suffix of ``left`` that is also a prefix of ``right``."""
+    limit = min(len(left), len(right), max_overlap)
+    for size in range(limit, min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class ContextPacker:
+    """Fill a token budget with retrieved documents in rank order.
+
+    A chunk that continues a higher-ranked chunk of the same source (the
+    splitter's overlap region) is merged into that chunk's region instead of
+    repeating the shared text, sentences already in the context are dropped,
+    and the last document that does not fit is truncated at a sentence boundary.
+    """
+
+    def __init__(self, token_budget: int = 2000, length_function: Optional[Callable[[str], int]] = None,
+                 max_overlap: int = 400, min_overlap: int = 20, min_dedupe_length: int = 20):
+        self.token_budget = token_budget
+        self.length_function = length_function or estimate_tokens
+        self.max_overlap = max_overlap
+        self.min_overlap = min_overlap
+        self.min_dedupe_length = min_dedupe_length
+
+    def _merge_overlap(self, text: str, regions: List[Dict[str, Any]]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Strip text shared with already packed regions of the same source.
+
+        Returns the remaining text (None if the chunk is fully contained) and
+        the region it continues, if any.
+        """
+        continues = None
+        for region in regions:
+            if text in region['original']:
+                return None, None
+            if continues is None:
+                head = _overlap_length(region['original'], text, self.max_overlap, self.min_overlap)
+                if head:
+                    text = text[head:]
+                    continues = region
+                    continue
+            tail = _overlap_length(text, region['original'], self.max_overlap, self.min_overlap)
+            if tail:
+                text = text[:-tail]
+        return text, continues
+
+    def _cut_at_word(self, sentence: str, room: int) -> str:
+        words = []
+        for word in sentence.split():
+            cost = self.length_function(word + ' ')
+            if cost > room:
+                break
+            words.append(word)
+            room -= cost
+        return ' '.join(words)
+
+    def pack(self, documents: List[Document]) -> Tuple[List[Document], Dict[str, Any]]:
+        regions = []
+        seen_sentences = set()
+        used_tokens = 0
+        input_tokens = 0
+        dropped_sentences = 0
+        dropped_documents = 0
+        truncated = False
+
+        for doc in documents:
+            input_tokens += self.length_function(doc.page_content)
+            if used_tokens >= self.token_budget:
+                dropped_documents += 1
+                continue
+
+            source = doc.metadata.get('source')
+            text, region = self._merge_overlap(
+                doc.page_content, [r for r in regions if r['source'] == source]
+            )
+            if not text:
+                dropped_documents += 1
+                continue
+
+            pieces = SENTENCE_BOUNDARY.split(text)
+            kept = []
+            for i in range(0, len(pieces), 2):
+                sentence = pieces[i]
+                separator = pieces[i + 1] if i + 1 < len(pieces) else ''
+                if not sentence.strip():
+                    continue
+                key = _normalize(sentence)
+                if len(key) >= self.min_dedupe_length and key in seen_sentences:
+                    dropped_sentences += 1
+                    continue
+                cost = self.length_function(sentence + separator)
+                if used_tokens + cost > self.token_budget:
+                    truncated = True
+                    if not regions and not kept:
+                        # A single sentence larger than the whole budget: cut it at a word boundary
+                        cut = self._cut_at_word(sentence, self.token_budget - used_tokens)
+                        if cut:
+                            kept.append(cut)
+                    used_tokens = self.token_budget
+                    break
+                seen_sentences.add(key)
+                kept.append(sentence + separator)
+                used_tokens += cost
+
+            if not kept:
+                dropped_documents += 1
+                continue
+            content = ''.join(kept).rstrip()
+            if region is not None:
+                # Continuation of an earlier chunk: extend that region in place
+                region['content'] += content
+                region['original'] += text
+                region['metadata']['packed'] = True
+            else:
+                metadata = dict(doc.metadata)
+                if content != doc.page_content.strip():
+                    metadata['packed'] = True
+                regions.append({
+                    "source": source,
+                    "original": doc.page_content,
+                    "content": content.lstrip(),
+                    "metadata": metadata
+                })
+
+        packed = [Document(page_content=r['content'], metadata=r['metadata']) for r in regions]
+        stats = {
+            "token_budget": self.token_budget,
+            "input_tokens": input_tokens,
+            "packed_tokens": sum(self.length_function(d.page_content) for d in packed),
+            "documents_in": len(documents),
+            "documents_packed": len(packed),
+            "documents_dropped": dropped_documents,
+            "sentences_dropped": dropped_sentences,
+            "truncated": truncated
+        }
+        return packed, stats
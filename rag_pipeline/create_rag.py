@@ -1,80 +1,220 @@
 from database.vector_db import VectorDB
-from database.document_processor import DocumentProcessor
 from database.retriever import Retriever
-from langchain.chains import RetrievalQA
-from langchain_ollama import ChatOllama
-from langchain.schema import Document
-from typing import List, Dict, Any, Optional
+from rag_pipeline.context_packer import ContextPacker
+from rag_pipeline.extractive import ExtractiveAnswerer, QueryRouter, extractive_result
+from rag_pipeline.cascade import ConfidenceCheck, cascade_stats
+from utils.ollama import get_ollama_base_url, get_keep_alive
+from utils.scheduler import BACKGROUND, get_scheduler, priority_context
+from utils.metrics import metrics_registry, timed
+from utils.profiling import profiled
+from utils.memory import memory_stage
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessageChunk
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Iterator, Callable
+import threading
+import time
+
+if TYPE_CHECKING:
+    # Ingestion (loaders, OCR), langchain.chains and the Ollama chat client are
+    # slow to import and many callers never need them; they are imported on first use
+    from database.document_processor import DocumentProcessor
+    from langchain.chains import RetrievalQA
+    from langchain_ollama import ChatOllama
+
+
+class AnswerStream:
+    """Iterable of answer tokens for one question.
+
+    Sources are known up front (``source_documents``); once the tokens are
+    exhausted ``result`` holds the same payload ``ask_detailed`` returns plus
+    ``time_to_first_token``.
+    """
+    
+    def __init__(self, question: str, chunks: Iterator[Any], source_documents: List[Document],
+                 context_stats: Dict[str, Any], stats_fn: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 start_time: float, error: Optional[str] = None,
+                 extras: Optional[Dict[str, Any]] = None):
+        self.question = question
+        self.source_documents = source_documents
+        self.context_stats = context_stats
+        self.result = None
+        self._chunks = chunks
+        self._stats_fn = stats_fn
+        self._start_time = start_time
+        self._error = error
+        self._extras = extras or {}
+    
+    def __iter__(self) -> Iterator[str]:
+        parts = []
+        response_metadata = {}
+        time_to_first_token = None
+        error = self._error
+        try:
+            if error:
+                yield f"Error: {error}"
+            for chunk in self._chunks:
+                if chunk.content:
+                    if time_to_first_token is None:
+                        time_to_first_token = time.perf_counter() - self._start_time
+                    parts.append(chunk.content)
+                    yield chunk.content
+                # Ollama sends its timing counters on the final chunk
+                if getattr(chunk, "response_metadata", None):
+                    response_metadata.update(chunk.response_metadata)
+        except Exception as e:
+            error = f"Failed to generate result: {str(e)}"
+            yield f"Error: {str(e)}"
+        finally:
+            context_stats = dict(self.context_stats)
+            context_stats.update(self._stats_fn(response_metadata))
+            context_stats["time_to_first_token"] = time_to_first_token
+            context_stats["total_time"] = time.perf_counter() - self._start_time
+            answer = "".join(parts)
+            self.result = {
+                "question": self.question,
+                "answer": answer or ('' if error else 'No answer generated'),
+                "source_documents": self.source_documents,
+                "num_sources": len(self.source_documents),
+                "context": context_stats
+            }
+            self.result.update(self._extras)
+            if error:
+                self.result["error"] = error
+
+
+ANSWER_MODES = ("generate", "extractive", "auto")
+
 
 class RAGPipeline:
     def __init__(self, rag_dir: str, persist_dir: str, embeddings_model: str, 
-                 llm_model: str):
+                 llm_model: str, parent_retrieval: bool = False,
+                 context_token_budget: int = 2000, query_only: bool = False,
+                 answer_mode: str = "generate", small_llm_model: Optional[str] = None):
         self.rag_dir = rag_dir
         self.persist_dir = persist_dir
         self.embeddings_model = embeddings_model
         self.llm_model_name = llm_model
+        # Cascade: the small model answers first and the request escalates to
+        # llm_model only when its answer fails the confidence check
+        self.small_llm_model_name = small_llm_model
+        self.confidence_check = ConfidenceCheck()
+        # Only used when a new collection is created; existing ones keep their mode
+        self.parent_retrieval = parent_retrieval
+        self.context_packer = ContextPacker(token_budget=context_token_budget)
         
-        # Initialize LLM
-        self.llm_model = ChatOllama(
-            model=llm_model,
-            base_url="http://localhost:11434"
-        )
+        # "extractive" answers from highlighted passages without the LLM;
+        # "auto" lets the router pick per question
+        if answer_mode not in ANSWER_MODES:
+            raise ValueError(f"answer_mode must be one of {ANSWER_MODES}, got '{answer_mode}'")
+        self.answer_mode = answer_mode
+        self.extractor = ExtractiveAnswerer()
+        self.router = QueryRouter()
+        
+        # Query-only pipelines open an existing collection and never ingest
+        self.query_only = query_only
         
-        # Initialize components
-        self.document_processor = None
+        # Initialize components; the LLM, document processor and QA chain are
+        # created on first use so opening a collection stays cheap
+        self._llm_model = None
+        self._small_llm_model = None
+        self._document_processor = None
+        self._qa_chain = None
+        self._lazy_lock = threading.Lock()
         self.vectordb = None
         self.retriever = None
-        self.qa_chain = None
         
         # Setup pipeline
         self._setup_pipeline()
     
+    @property
+    def llm_model(self) -> "ChatOllama":
+        if self._llm_model is None:
+            with self._lazy_lock:
+                if self._llm_model is None:
+                    from langchain_ollama import ChatOllama
+                    self._llm_model = ChatOllama(
+                        model=self.llm_model_name,
+                        base_url=get_ollama_base_url(),
+                        keep_alive=get_keep_alive()
+                    )
+        return self._llm_model
+    
+    @property
+    def small_llm_model(self) -> Optional["ChatOllama"]:
+        if self._small_llm_model is None and self.small_llm_model_name:
+            with self._lazy_lock:
+                if self._small_llm_model is None:
+                    from langchain_ollama import ChatOllama
+                    self._small_llm_model = ChatOllama(
+                        model=self.small_llm_model_name,
+                        base_url=get_ollama_base_url(),
+                        keep_alive=get_keep_alive()
+                    )
+        return self._small_llm_model
+    
+    @property
+    def document_processor(self) -> "DocumentProcessor":
+        if self._document_processor is None:
+            with self._lazy_lock:
+                if self._document_processor is None:
+                    from database.document_processor import DocumentProcessor
+                    self._document_processor = DocumentProcessor(self.rag_dir)
+        return self._document_processor
+    
+    @property
+    def qa_chain(self) -> "RetrievalQA":
+        # Kept for callers that use the LangChain chain directly; ask/ask_detailed do not
+        if self._qa_chain is None:
+            llm_model = self.llm_model
+            with self._lazy_lock:
+                if self._qa_chain is None:
+                    from langchain.chains import RetrievalQA
+                    self._qa_chain = RetrievalQA.from_chain_type(
+                        llm=llm_model,
+                        chain_type="stuff",
+                        retriever=self.retriever.get_retriever(),
+                        return_source_documents=True
+                    )
+        return self._qa_chain
+    
     def _setup_pipeline(self):
         """Setup the complete RAG pipeline."""
         print("🚀 Initializing RAG Pipeline...")
         
-        # Step 1: Initialize document processor
-        print("📄 Step 1: Initializing document processor...")
-        self.document_processor = DocumentProcessor(self.rag_dir)
-        
-        # Step 2: Initialize vector database
-        print("🗃️  Step 2: Initializing vector database...")
+        # Step 1: Initialize vector database
+        print("🗃️  Step 1: Initializing vector database...")
         self.vectordb = VectorDB(
             rag_dir=self.rag_dir,
             persist_directory=self.persist_dir,
             embeddings_model=self.embeddings_model,
+            retrieval_mode="parent" if self.parent_retrieval else "chunk",
+            create_if_missing=not self.query_only,
         )
+        self.parent_store = self.vectordb.get_parent_store()
         
-        # Step 3: Check if database needs population
-        print("📊 Step 3: Checking database status...")
-        self._populate_database_if_needed()
-        
-        # Step 4: Initialize retriever
-        print("🔍 Step 4: Initializing retriever...")
-        self.retriever = Retriever(self.vectordb)
+        # Step 2: Check if database needs population
+        if self.query_only:
+            print("📊 Step 2: Query-only mode, skipping ingestion check")
+        else:
+            print("📊 Step 2: Checking database status...")
+            self._populate_database_if_needed()
         
-        # Step 5: Initialize QA chain
-        print("🤖 Step 5: Initializing QA chain...")
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm_model,
-            chain_type="stuff",
-            retriever=self.retriever.get_retriever(),
-            return_source_documents=True
-        )
+        # Step 3: Initialize retriever
+        print("🔍 Step 3: Initializing retriever...")
+        self.retriever = Retriever(self.vectordb, parent_store=self.parent_store)
         
         print("✅ RAG Pipeline initialization complete!")
     
     def _populate_database_if_needed(self):
         try:
-            db_info = self.vectordb.get_db_info()
-            current_count = db_info.get('current_collection', {}).get('document_count', 0)
+            # Count only this collection instead of listing every collection in the DB
+            current_count = self.vectordb._collection.count()
             
             if current_count == 0:
                 print("📥 Database is empty. Processing and adding documents...")
-                chunks = self.document_processor.chunk_docs()
-                if chunks:
-                    self.vectordb.add_documents(chunks)
-                    print(f"✅ Added {len(chunks)} chunks to database")
+                added = self._ingest_documents()
+                if added:
+                    print(f"✅ Added {added} chunks to database")
                 else:
                     print("⚠️  No documents found to add")
             else:
@@ -83,21 +223,223 @@ class RAGPipeline:
         except Exception as e:
             print(f"❌ Error populating database: {str(e)}")
     
-    def ask(self, question: str) -> str:
+    def _ingest_documents(self) -> int:
+        """Chunk the source folder and add it to the collection; returns the number of embedded chunks."""
+        # Ingestion embedding yields Ollama to interactive queries
+        with priority_context(BACKGROUND, flow=self.vectordb.collection_name):
+            return self._ingest_documents_unscheduled()
+    
+    def _ingest_documents_unscheduled(self) -> int:
+        if self.parent_store is not None:
+            children, parents = self.document_processor.chunk_docs_with_parents()
+            if children:
+                self.parent_store.add_documents(parents)
+                self._upsert(children)
+                print(f"🧩 Stored {len(parents)} parent windows for {len(children)} child chunks")
+            added = len(children)
+            # Large text files arrive in batches and are stored as they come
+            for children, parents in self.document_processor.stream_chunks_with_parents():
+                self.parent_store.add_documents(parents)
+                self._upsert(children)
+                added += len(children)
+            return added
+        chunks = self.document_processor.chunk_docs()
+        if chunks:
+            self._upsert(chunks)
+        added = len(chunks)
+        for batch in self.document_processor.stream_chunks():
+            self._upsert(batch)
+            added += len(batch)
+        return added
+    
+    def _upsert(self, documents: List[Document]):
+        # Includes embedding the chunks, which is also timed on its own as "embed"
+        with profiled("add_documents"), timed("upsert", collection=self.vectordb.collection_name), \
+                memory_stage("upsert"):
+            self.vectordb.add_documents(documents)
+        metrics_registry.inc("rag_upserted_chunks_total", len(documents), collection=self.vectordb.collection_name)
+    
+    def _retrieve(self, question: str, k: Optional[int] = None) -> List[Document]:
+        return self.retriever.search(question, k=k)
+    
+    def _build_messages(self, question: str, documents: List[Document]):
+        """Pack retrieved documents into the token budget and format the "stuff" prompt."""
+        with timed("pack", collection=self.vectordb.collection_name):
+            packed_docs, context_stats = self.context_packer.pack(documents)
+        # Same prompt and separator RetrievalQA's stuff chain uses
+        from langchain.chains.question_answering.stuff_prompt import CHAT_PROMPT
+        context = "\n\n".join(doc.page_content for doc in packed_docs)
+        return CHAT_PROMPT.format_messages(context=context, question=question), packed_docs, context_stats
+    
+    @staticmethod
+    def _generation_stats(response_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Pull Ollama's prompt-eval (prefill) and eval counters out of a response."""
+        return {
+            "prompt_tokens": response_metadata.get("prompt_eval_count"),
+            "prefill_time": (response_metadata.get("prompt_eval_duration") or 0) / 1e9,
+            "completion_tokens": response_metadata.get("eval_count"),
+            "generation_time": (response_metadata.get("eval_duration") or 0) / 1e9
+        }
+    
+    def _invoke(self, llm: "ChatOllama", messages):
+        with get_scheduler().slot(flow=self.vectordb.collection_name):
+            with timed("generate", collection=self.vectordb.collection_name, model=llm.model):
+                return llm.invoke(messages)
+    
+    def _accept_small_answer(self, response, small_time: float, packed_docs: List[Document],
+                             context_stats: Dict[str, Any]) -> bool:
+        passed, reason = self.confidence_check.check(response.content, packed_docs)
+        context_stats["cascade"] = {
+            "small_model": self.small_llm_model_name,
+            "escalated": not passed,
+            "reason": reason,
+            "small_time": small_time
+        }
+        if passed:
+            cascade_stats.record(self.vectordb.collection_name, small_time, escalated=False)
+        return passed
+    
+    def _record_escalation(self, context_stats: Dict[str, Any], large_time: float):
+        cascade = context_stats["cascade"]
+        cascade["large_time"] = large_time
+        cascade_stats.record(self.vectordb.collection_name, cascade["small_time"], escalated=True,
+                             large_time=large_time, reason=cascade["reason"])
+    
+    def _generate(self, question: str, documents: List[Document]) -> Tuple[str, List[Document], Dict[str, Any]]:
+        messages, packed_docs, context_stats = self._build_messages(question, documents)
+        start_time = time.perf_counter()
+        response = None
+        if self.small_llm_model_name:
+            small_response = self._invoke(self.small_llm_model, messages)
+            if self._accept_small_answer(small_response, time.perf_counter() - start_time, packed_docs, context_stats):
+                response = small_response
+        if response is None:
+            large_start = time.perf_counter()
+            response = self._invoke(self.llm_model, messages)
+            if self.small_llm_model_name:
+                self._record_escalation(context_stats, time.perf_counter() - large_start)
+        context_stats.update(self._generation_stats(getattr(response, "response_metadata", {}) or {}))
+        context_stats["total_time"] = time.perf_counter() - start_time
+        return response.content, packed_docs, context_stats
+    
+    def ask(self, question: str, k: Optional[int] = None) -> str:
+        try:
+            documents = self._retrieve(question, k=k)
+            extractive, _ = self._route(question, documents)
+            if extractive is not None:
+                return extractive["answer"]
+            answer, _, _ = self._generate(question, documents)
+            return answer or 'No answer generated'
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    @profiled("ask_detailed")
+    def ask_detailed(self, question: str, k: Optional[int] = None) -> Dict[str, Any]:
+        """Retrieve and answer with per-call parameters; safe to share across threads."""
+        try:
+            documents = self._retrieve(question, k=k)
+        except Exception as e:
+            return {
+                "question": question,
+                "error": f"Failed to generate result: {str(e)}",
+                "answer": "",
+                "source_documents": [],
+                "num_sources": 0
+            }
+        return self.answer_with_documents(question, documents)
+    
+    def _route(self, question: str, documents: List[Document]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Extractive result if the answer mode (and router) allow one, plus the routing reason."""
+        if self.answer_mode == "generate":
+            return None, None
+        start_time = time.perf_counter()
+        extraction = self.extractor.extract(question, documents)
+        reason = None
+        if self.answer_mode == "auto":
+            route, reason = self.router.route(question, extraction)
+            if route == "generate":
+                return None, reason
+        result = extractive_result(question, extraction, reason)
+        result["context"] = {"total_time": time.perf_counter() - start_time, "time_to_first_token": None}
+        return result, reason
+    
+    def answer_with_documents(self, question: str, documents: List[Document]) -> Dict[str, Any]:
+        """ask_detailed for documents that were already retrieved, e.g. by search_documents_many."""
+        try:
+            extractive, reason = self._route(question, documents)
+            if extractive is not None:
+                return extractive
+            answer, packed_docs, context_stats = self._generate(question, documents)
+            return {
+                "question": question,
+                "answer": answer or 'No answer generated',
+                "source_documents": packed_docs,
+                "num_sources": len(packed_docs),
+                "context": context_stats,
+                "answer_mode": "generate",
+                "route_reason": reason
+            }
+        except Exception as e:
+            return {
+                "question": question,
+                "error": f"Failed to generate result: {str(e)}",
+                "answer": "",
+                "source_documents": [],
+                "num_sources": 0
+            }
+    
+    async def _ainvoke(self, llm: "ChatOllama", messages):
+        async with get_scheduler().aslot(flow=self.vectordb.collection_name):
+            with timed("generate", collection=self.vectordb.collection_name, model=llm.model):
+                return await llm.ainvoke(messages)
+    
+    async def _agenerate(self, question: str, documents: List[Document]) -> Tuple[str, List[Document], Dict[str, Any]]:
+        messages, packed_docs, context_stats = self._build_messages(question, documents)
+        start_time = time.perf_counter()
+        response = None
+        if self.small_llm_model_name:
+            small_response = await self._ainvoke(self.small_llm_model, messages)
+            if self._accept_small_answer(small_response, time.perf_counter() - start_time, packed_docs, context_stats):
+                response = small_response
+        if response is None:
+            large_start = time.perf_counter()
+            response = await self._ainvoke(self.llm_model, messages)
+            if self.small_llm_model_name:
+                self._record_escalation(context_stats, time.perf_counter() - large_start)
+        context_stats.update(self._generation_stats(getattr(response, "response_metadata", {}) or {}))
+        context_stats["total_time"] = time.perf_counter() - start_time
+        return response.content, packed_docs, context_stats
+    
+    async def asearch(self, query: str, k: int = 5) -> List[Document]:
+        return await self.retriever.asearch(query, k=k)
+    
+    async def aask(self, question: str, k: Optional[int] = None) -> str:
         try:
-            result = self.qa_chain({"query": question})
-            return result.get('result', 'No answer generated')
+            documents = await self.retriever.asearch(question, k=k)
+            extractive, _ = self._route(question, documents)
+            if extractive is not None:
+                return extractive["answer"]
+            answer, _, _ = await self._agenerate(question, documents)
+            return answer or 'No answer generated'
         except Exception as e:
             return f"Error: {str(e)}"
     
-    def ask_detailed(self, question: str) -> Dict[str, Any]:
+    async def aask_detailed(self, question: str, k: Optional[int] = None) -> Dict[str, Any]:
+        """Async ask_detailed: many questions can be in flight on one event loop."""
         try:
-            result = self.qa_chain({"query": question})
+            documents = await self.retriever.asearch(question, k=k)
+            extractive, reason = self._route(question, documents)
+            if extractive is not None:
+                return extractive
+            answer, packed_docs, context_stats = await self._agenerate(question, documents)
             return {
                 "question": question,
-                "answer": result.get('result', 'No answer generated'),
-                "source_documents": result.get('source_documents', []),
-                "num_sources": len(result.get('source_documents', []))
+                "answer": answer or 'No answer generated',
+                "source_documents": packed_docs,
+                "num_sources": len(packed_docs),
+                "context": context_stats,
+                "answer_mode": "generate",
+                "route_reason": reason
             }
         except Exception as e:
             return {
@@ -108,12 +450,59 @@ class RAGPipeline:
                 "num_sources": 0
             }
     
+    def _scheduled_stream(self, messages) -> Iterator[Any]:
+        # The slot is taken when iteration starts and held until the last token
+        with get_scheduler().slot(flow=self.vectordb.collection_name):
+            with timed("generate", collection=self.vectordb.collection_name, model=self.llm_model_name):
+                yield from self.llm_model.stream(messages)
+    
+    def ask_stream(self, question: str, k: Optional[int] = None) -> AnswerStream:
+        """Retrieve now and stream the answer tokens as Ollama produces them.
+
+        Always streams from llm_model, without the small-model cascade: the
+        confidence check needs the complete small answer, so the first token
+        would otherwise wait for a whole small-model generation.
+        """
+        start_time = time.perf_counter()
+        try:
+            documents = self._retrieve(question, k=k)
+            extractive, reason = self._route(question, documents)
+            if extractive is None:
+                messages, packed_docs, context_stats = self._build_messages(question, documents)
+        except Exception as e:
+            return AnswerStream(question, iter(()), [], {}, self._generation_stats, start_time,
+                                error=f"Failed to retrieve documents: {str(e)}")
+        if extractive is not None:
+            # The whole extractive answer arrives as a single "token"
+            return AnswerStream(
+                question=question,
+                chunks=iter([AIMessageChunk(content=extractive["answer"])]),
+                source_documents=extractive["source_documents"],
+                context_stats={},
+                stats_fn=lambda metadata: {},
+                start_time=start_time,
+                extras={key: extractive[key] for key in ("answer_mode", "route_reason", "highlights")}
+            )
+        return AnswerStream(
+            question=question,
+            chunks=self._scheduled_stream(messages),
+            source_documents=packed_docs,
+            context_stats=context_stats,
+            stats_fn=self._generation_stats,
+            start_time=start_time,
+            extras={"answer_mode": "generate", "route_reason": reason}
+        )
+    
     def search_documents(self, query: str, k: int = 5) -> List[Document]:
         return self.retriever.search(query, k=k)
     
+    def search_documents_many(self, queries: List[str], k: int = 5) -> Dict[str, Any]:
+        return self.retriever.search_many(queries, k=k)
+    
     def update_retrieval_params(self, k: int):
         self.retriever.update_search_params(k=k)
-        self.qa_chain.retriever = self.retriever.get_retriever()
+        if self._qa_chain is not None:
+            self._qa_chain.retriever = self.retriever.get_retriever()
         print(f"✅ Updated retriever to return top {k} documents")
     
     def get_pipeline_info(self) -> Dict[str, Any]:
@@ -125,7 +514,10 @@ class RAGPipeline:
                     "persist_directory": self.persist_dir,
                     "embeddings_model": self.embeddings_model,
                     "llm_model": self.llm_model_name,
-                    "retrieval_k": self.retriever.search_kwargs.get('k', 5)
+                    "small_llm_model": self.small_llm_model_name,
+                    "retrieval_k": self.retriever.search_kwargs.get('k', 5),
+                    "retrieval_mode": self.vectordb.retrieval_mode,
+                    "answer_mode": self.answer_mode
                 },
                 "database_info": db_info,
                 "collection_metadata": self.vectordb.get_collection_metadata(),
@@ -136,7 +528,8 @@ class RAGPipeline:
     
     def add_documents(self, documents: List[Document]) -> bool:
         try:
-            self.vectordb.add_documents(documents)
+            with priority_context(BACKGROUND, flow=self.vectordb.collection_name):
+                self._upsert(documents)
             print(f"✅ Added {len(documents)} documents to database")
             return True
         except Exception as e:
@@ -146,12 +539,11 @@ class RAGPipeline:
     def refresh_documents(self):
         try:
             print("🔄 Refreshing documents...")
-            chunks = self.document_processor.chunk_docs()
-            if chunks:
-                # Note: This adds new chunks. In production, you might want to 
-                # clear existing ones first or implement update logic
-                self.vectordb.add_documents(chunks)
-                print(f"✅ Refreshed with {len(chunks)} chunks")
+            # Note: This adds new chunks. In production, you might want to 
+            # clear existing ones first or implement update logic
+            added = self._ingest_documents()
+            if added:
+                print(f"✅ Refreshed with {added} chunks")
             else:
                 print("⚠️  No documents found during refresh")
         except Exception as e:
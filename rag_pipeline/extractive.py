@@ -0,0 +1,192 @@
+from rag_pipeline.context_packer import SENTENCE_BOUNDARY
+from langchain_core.documents import Document
+from typing import Any, Dict, List, Optional, Tuple
+import math
+import os
+import re
+
+WORD = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a an and are as at be by can could do does did for from has have how i in is it its me
+of on or our please show tell that the their there these this those to was were what
+when where which who whom will with would you your about give find list quote
+""".split())
+
+# Questions that need the LLM to reason, compare or summarize
+GENERATIVE_CUES = re.compile(
+    r"^\s*(why|explain|compare|summari[sz]e|describe|evaluate|analy[sz]e|should|"
+    r"how (?:does|do|did|can|could|should|would|is|are|will))\b"
+    r"|\b(difference|differences|pros and cons|implications|in your opinion|step by step|overall|versus|vs\.?)\b",
+    re.IGNORECASE
+)
+# Questions whose answer is usually a span of the retrieved text
+LOOKUP_CUES = re.compile(
+    r"^\s*(what is the|what's the|what are the|show|find|quote|list|which|where|when|who|give me)\b"
+    r"|\b(number|clause|section|article|date|deadline|amount|name|id|policy|address|email|phone|period|limit)\b",
+    re.IGNORECASE
+)
+
+
+def _stem(word: str) -> str:
+    # Plural folding is enough for matching question terms against sentences
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def query_terms(text: str) -> List[str]:
+    """Lower-cased, stemmed content words, in order of appearance."""
+    return [_stem(w) for w in WORD.findall(text.lower()) if w not in STOPWORDS]
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """(start, end) character spans of the sentences in ``text``."""
+    spans = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        if text[start:match.start()].strip():
+            spans.append((start, match.start()))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text)))
+    return spans
+
+
+class ExtractiveAnswerer:
+    """Answer from the retrieved chunks themselves by scoring their sentences.
+
+    Every sentence of the retrieved documents is scored by how much of the
+    question it covers, weighting rare terms (within the retrieved set) higher
+    and rewarding question bigrams that appear in order. The best sentences
+    are returned with ``context_sentences`` neighbours on each side, with the
+    answering sentence highlighted. No model call is made.
+    """
+
+    def __init__(self, max_passages: int = 3, context_sentences: int = 1,
+                 highlight: str = "**{}**", min_score: float = 0.2):
+        self.max_passages = max_passages
+        self.context_sentences = context_sentences
+        self.highlight = highlight
+        self.min_score = min_score
+
+    def _score_sentences(self, question: str, documents: List[Document]) -> List[Dict[str, Any]]:
+        terms = query_terms(question)
+        unique_terms = set(terms)
+        bigrams = set(zip(terms, terms[1:]))
+        sentences = []
+        for rank, doc in enumerate(documents):
+            for index, (start, end) in enumerate(split_sentences(doc.page_content)):
+                words = query_terms(doc.page_content[start:end])
+                sentences.append({
+                    "rank": rank, "index": index, "start": start, "end": end,
+                    "terms": set(words), "bigrams": set(zip(words, words[1:]))
+                })
+        if not unique_terms or not sentences:
+            return []
+
+        document_frequency = {t: sum(1 for s in sentences if t in s["terms"]) for t in unique_terms}
+        weights = {t: math.log(1 + len(sentences) / (1 + df)) for t, df in document_frequency.items()}
+        total_weight = sum(weights.values()) or 1.0
+        for sentence in sentences:
+            matched = unique_terms & sentence["terms"]
+            sentence["coverage"] = len(matched) / len(unique_terms)
+            score = sum(weights[t] for t in matched) / total_weight
+            if bigrams:
+                score += 0.2 * len(bigrams & sentence["bigrams"]) / len(bigrams)
+            # Small prior for the retriever's own ranking, to break ties
+            score += 0.05 / (1 + sentence["rank"])
+            sentence["score"] = score
+        return sentences
+
+    def extract(self, question: str, documents: List[Document]) -> Dict[str, Any]:
+        """Score and select passages; returns answer text, passages and confidence signals."""
+        sentences = self._score_sentences(question, documents)
+        ranked = sorted(sentences, key=lambda s: s["score"], reverse=True)
+        by_position = {(s["rank"], s["index"]): s for s in sentences}
+
+        passages = []
+        used = set()
+        for sentence in ranked:
+            if len(passages) >= self.max_passages or sentence["score"] < self.min_score:
+                break
+            if (sentence["rank"], sentence["index"]) in used:
+                continue
+            doc = documents[sentence["rank"]]
+            window = [
+                by_position[(sentence["rank"], i)]
+                for i in range(sentence["index"] - self.context_sentences, sentence["index"] + self.context_sentences + 1)
+                if (sentence["rank"], i) in by_position
+            ]
+            used.update((s["rank"], s["index"]) for s in window)
+            start, end = window[0]["start"], window[-1]["end"]
+            text = doc.page_content[start:end]
+            span = (sentence["start"] - start, sentence["end"] - start)
+            passages.append({
+                "text": text,
+                "highlighted": text[:span[0]] + self.highlight.format(text[span[0]:span[1]]) + text[span[1]:],
+                # Offsets of the answering sentence within the source chunk
+                "span": (sentence["start"], sentence["end"]),
+                "score": sentence["score"],
+                "coverage": sentence["coverage"],
+                "document": doc
+            })
+
+        return {
+            "answer": "\n\n".join(self._format_passage(p) for p in passages),
+            "passages": passages,
+            "confidence": passages[0]["score"] if passages else 0.0,
+            "coverage": passages[0]["coverage"] if passages else 0.0
+        }
+
+    @staticmethod
+    def _format_passage(passage: Dict[str, Any]) -> str:
+        metadata = passage["document"].metadata
+        source = os.path.basename(str(metadata.get("source", "unknown")))
+        if metadata.get("page") is not None:
+            source += f", page {metadata['page'] + 1 if isinstance(metadata['page'], int) else metadata['page']}"
+        return f"{passage['highlighted'].strip()}\n(Source: {source})"
+
+
+class QueryRouter:
+    """Decide per question whether the extractive answer is good enough.
+
+    Questions asking for reasoning (why, explain, compare, ...) always go to
+    the LLM. Otherwise the extractive answer is used when its best sentence
+    covers enough of the question: ``min_coverage`` for lookup-style
+    questions, ``strict_coverage`` for everything else.
+    """
+
+    def __init__(self, min_coverage: float = 0.6, strict_coverage: float = 0.9, min_confidence: float = 0.5):
+        self.min_coverage = min_coverage
+        self.strict_coverage = strict_coverage
+        self.min_confidence = min_confidence
+
+    def route(self, question: str, extraction: Dict[str, Any]) -> Tuple[str, str]:
+        """Returns ("extractive" | "generate", reason)."""
+        if GENERATIVE_CUES.search(question):
+            return "generate", "question needs reasoning"
+        if not extraction["passages"]:
+            return "generate", "no matching passage"
+        if extraction["confidence"] < self.min_confidence:
+            return "generate", f"low span score ({extraction['confidence']:.2f})"
+        required = self.min_coverage if LOOKUP_CUES.search(question) else self.strict_coverage
+        if extraction["coverage"] < required:
+            return "generate", f"passage covers {extraction['coverage']:.0%} of the question"
+        return "extractive", f"passage covers {extraction['coverage']:.0%} of the question"
+
+
+def extractive_result(question: str, extraction: Dict[str, Any], reason: Optional[str] = None) -> Dict[str, Any]:
+    """ask_detailed-shaped result for an extractive answer."""
+    documents = [p["document"] for p in extraction["passages"]]
+    return {
+        "question": question,
+        "answer": extraction["answer"] or "No matching passage found",
+        "source_documents": documents,
+        "num_sources": len(documents),
+        "answer_mode": "extractive",
+        "route_reason": reason,
+        "highlights": [
+            {"text": p["text"], "highlighted": p["highlighted"], "span": p["span"],
+             "score": p["score"], "source": p["document"].metadata.get("source"),
+             "page": p["document"].metadata.get("page")}
+            for p in extraction["passages"]
+        ]
+    }
@@ -0,0 +1,118 @@
+from rag_pipeline.create_rag import RAGPipeline
+from database.vector_db import collection_name_for
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+import inspect
+import os
+import threading
+
+
+class PipelineRegistry:
+    """Process-wide LRU cache of RAGPipeline objects.
+
+    Keyed by collection, persist directory, models and the remaining pipeline
+    options, so Streamlit reruns and server requests reuse one pipeline
+    (client, vector store, LLM wrapper) instead of rebuilding it, and a caller
+    never gets a pipeline built with different options. Call invalidate() when
+    a collection is rebuilt or deleted.
+    """
+
+    def __init__(self, max_size: int = 4):
+        self.max_size = max_size
+        self._pipelines = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize_options(pipeline_kwargs: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+        """Every RAGPipeline option with its default filled in, sorted by name.
+
+        Leaving an option out and passing its default give the same key.
+        """
+        parameters = inspect.signature(RAGPipeline.__init__).parameters
+        unknown = set(pipeline_kwargs) - set(parameters)
+        if unknown:
+            raise TypeError(f"Unknown RAGPipeline options: {', '.join(sorted(unknown))}")
+        options = {
+            name: parameter.default for name, parameter in parameters.items()
+            if name not in ("self", "rag_dir", "persist_dir", "embeddings_model", "llm_model")
+        }
+        options.update(pipeline_kwargs)
+        return tuple(sorted(options.items()))
+
+    @classmethod
+    def make_key(cls, rag_dir: str, persist_dir: str, embeddings_model: str, llm_model: str,
+                 **pipeline_kwargs) -> Tuple[Any, ...]:
+        return (collection_name_for(rag_dir), os.path.abspath(persist_dir), embeddings_model, llm_model,
+                cls.normalize_options(pipeline_kwargs))
+
+    def get(self, rag_dir: str, persist_dir: str, embeddings_model: str, llm_model: str,
+            **pipeline_kwargs) -> RAGPipeline:
+        """Return the cached pipeline for this collection, models and options, building it if needed."""
+        key = self.make_key(rag_dir, persist_dir, embeddings_model, llm_model, **pipeline_kwargs)
+        with self._lock:
+            pipeline = self._pipelines.get(key)
+            if pipeline is not None:
+                self._pipelines.move_to_end(key)
+                self.hits += 1
+                return pipeline
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # Build outside the registry lock so other collections stay available,
+        # but only once per key when several callers miss at the same time
+        with build_lock:
+            with self._lock:
+                pipeline = self._pipelines.get(key)
+                if pipeline is not None:
+                    self._pipelines.move_to_end(key)
+                    self.hits += 1
+                    return pipeline
+                self.misses += 1
+            try:
+                pipeline = RAGPipeline(
+                    rag_dir=rag_dir,
+                    persist_dir=persist_dir,
+                    embeddings_model=embeddings_model,
+                    llm_model=llm_model,
+                    **pipeline_kwargs
+                )
+                with self._lock:
+                    self._pipelines[key] = pipeline
+                    self._pipelines.move_to_end(key)
+                    while len(self._pipelines) > self.max_size:
+                        self._pipelines.popitem(last=False)
+                        self.evictions += 1
+                return pipeline
+            finally:
+                # Also after a failed build, so the lock does not outlive the attempt
+                with self._lock:
+                    self._build_locks.pop(key, None)
+
+    def invalidate(self, collection_name: str) -> int:
+        """Drop every cached pipeline for a collection; returns how many were removed."""
+        with self._lock:
+            stale = [key for key in self._pipelines if key[0] == collection_name]
+            for key in stale:
+                del self._pipelines[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._pipelines.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._pipelines),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "collections": [key[0] for key in self._pipelines]
+            }
+
+
+pipeline_registry = PipelineRegistry(max_size=int(os.getenv("PIPELINE_CACHE_SIZE", "4")))
@@ -0,0 +1,112 @@
+"""Concurrency stress test for the stateless retrieval path.
+
+Many threads share one RAGPipeline and search with different k values while
+another thread keeps changing the default k. Every call must get back exactly
+the number of documents it asked for, never another caller's setting.
+
+Usage (from the repository root, with Ollama running):
+    python -m testing.concurrency_stress [threads] [calls_per_thread]
+
+Without Ollama, --fake-ollama runs against testing.fake_ollama and a small
+throwaway corpus:
+    python -m testing.concurrency_stress 16 25 --fake-ollama
+"""
+from rag_pipeline.create_rag import RAGPipeline
+from testing.fake_ollama import use_fake_ollama
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from dotenv import load_dotenv
+import random
+import sys
+import tempfile
+import threading
+import time
+import os
+
+load_dotenv()
+
+QUERIES = [
+    "What is this document about?",
+    "Summarise the main findings",
+    "Which dates are mentioned?",
+    "Who are the people involved?",
+]
+
+
+def run_worker(rag_pipeline, worker_id, calls, max_k):
+    rng = random.Random(worker_id)
+    mismatches = []
+    for _ in range(calls):
+        k = rng.randint(1, max_k)
+        docs = rag_pipeline.search_documents(rng.choice(QUERIES), k=k)
+        if len(docs) != k:
+            mismatches.append((worker_id, k, len(docs)))
+    return mismatches
+
+
+if __name__ == "__main__":
+    fake_ollama = "--fake-ollama" in sys.argv
+    positional = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    num_threads = int(positional[0]) if len(positional) > 0 else 16
+    calls_per_thread = int(positional[1]) if len(positional) > 1 else 25
+
+    # Closed even if setup or a worker fails, so the fake server and temp dir never leak
+    with ExitStack() as resources:
+        rag_dir = os.getenv("RAG_DIR")
+        persist_dir = os.getenv("PERSISTENT_DIR")
+        embeddings_model = os.getenv("EMBEDDINGS_MODEL")
+        llm_model = os.getenv("LLM_MODEL")
+        if fake_ollama:
+            from benchmarks.async_throughput import build_corpus
+            server = resources.enter_context(use_fake_ollama())
+            workdir = resources.enter_context(tempfile.TemporaryDirectory())
+            rag_dir = os.path.join(workdir, "stress", "corpus")
+            persist_dir = os.path.join(workdir, "chroma")
+            os.makedirs(rag_dir)
+            build_corpus(rag_dir, copies=8)
+            embeddings_model, llm_model = server.config.models[:2]
+
+        rag_pipeline = RAGPipeline(
+            rag_dir=rag_dir,
+            persist_dir=persist_dir,
+            embeddings_model=embeddings_model,
+            llm_model=llm_model
+        )
+        chunk_count = rag_pipeline.vectordb._collection.count()
+        max_k = max(1, min(10, chunk_count))
+        print(f"Collection has {chunk_count} chunks, testing k in [1, {max_k}]")
+
+        stop = threading.Event()
+
+        def churn_default_k():
+            # Concurrent writers of the shared default must not leak into per-call k
+            while not stop.is_set():
+                rag_pipeline.retriever.update_search_params(k=random.randint(1, max_k))
+                time.sleep(0.001)
+
+        churner = threading.Thread(target=churn_default_k, daemon=True)
+        churner.start()
+
+        start_time = time.time()
+        mismatches = []
+        try:
+            with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                futures = [
+                    executor.submit(run_worker, rag_pipeline, worker_id, calls_per_thread, max_k)
+                    for worker_id in range(num_threads)
+                ]
+                for future in as_completed(futures):
+                    mismatches.extend(future.result())
+        finally:
+            stop.set()
+            churner.join()
+
+        total_calls = num_threads * calls_per_thread
+        elapsed = time.time() - start_time
+        print(f"{total_calls} searches on {num_threads} threads in {elapsed:.2f}s "
+              f"({total_calls / elapsed:.1f} searches/s)")
+    if mismatches:
+        for worker_id, wanted, got in mismatches[:10]:
+            print(f"❌ worker {worker_id}: asked for k={wanted}, got {got}")
+        sys.exit(f"FAILED: {len(mismatches)} of {total_calls} searches returned the wrong number of documents")
+    print("✅ All searches returned the requested number of documents")
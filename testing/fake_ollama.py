@@ -0,0 +1,333 @@
+"""Local stand-in for the Ollama HTTP API, for benchmarks and tests without a GPU.
+
+Implements /api/embed, /api/embeddings, /api/chat, /api/generate, /api/tags,
+/api/ps and /api/version. Embeddings are derived from word hashes, so they are
+deterministic and texts that share words land close together. Completions
+either echo the question back ("echo") or return a canned answer ("canned"),
+one word per token, at a configurable token rate. Like OLLAMA_NUM_PARALLEL,
+``parallel`` caps the model requests served at once; the rest wait in line.
+A seeded fraction of requests can be made to fail for error-handling tests.
+
+Usage (from the repository root):
+    python -m testing.fake_ollama --port 11435 --embed-latency 0.02 --chat-latency 0.2
+    OLLAMA_BASE_URL=http://localhost:11435 python main.py
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+WORD = re.compile(r"\w+")
+
+
+def hash_embedding(text: str, dim: int = 768) -> List[float]:
+    """Deterministic bag-of-words embedding: each word hashes to a signed dimension."""
+    vector = [0.0] * dim
+    for word in WORD.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector))
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return [v / norm for v in vector]
+
+
+class FakeOllamaConfig:
+    def __init__(self, embed_latency: float = 0.0, chat_latency: float = 0.0,
+                 tokens_per_second: float = 0.0, dim: int = 768,
+                 models: Optional[List[str]] = None, completion_mode: str = "echo",
+                 canned_responses: Optional[Dict[str, str]] = None, error_rate: float = 0.0,
+                 error_status: int = 500, error_paths: Optional[List[str]] = None, seed: int = 0,
+                 parallel: int = 0):
+        self.embed_latency = embed_latency
+        # Time before the first token (model load + prefill)
+        self.chat_latency = chat_latency
+        # 0 means emit every token immediately
+        self.tokens_per_second = tokens_per_second
+        self.dim = dim
+        self.models = models or ["nomic-embed-text:latest", "llama3.1:8b-instruct-q4_0"]
+        if completion_mode not in ("echo", "canned"):
+            raise ValueError(f"completion_mode must be 'echo' or 'canned', got '{completion_mode}'")
+        self.completion_mode = completion_mode
+        # Canned mode: the first key found in the question picks the answer; "" is the fallback
+        self.canned_responses = canned_responses or {"": "This is a canned answer from the fake Ollama server."}
+        # Fraction of requests (to error_paths, or to every POST endpoint) answered with error_status
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.error_paths = error_paths
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        # 0 serves every request at once
+        self.parallel = parallel
+        self._slots = threading.Semaphore(parallel) if parallel > 0 else None
+
+    def should_fail(self, path: str) -> bool:
+        if self.error_rate <= 0 or (self.error_paths is not None and path not in self.error_paths):
+            return False
+        with self._random_lock:
+            return self._random.random() < self.error_rate
+
+    @contextmanager
+    def slot(self):
+        if self._slots is None:
+            yield
+            return
+        with self._slots:
+            yield
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    config = FakeOllamaConfig()
+    # Models "loaded" by a request, with their expiry time, for /api/ps
+    loaded = {}
+    loaded_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [
+                {"name": m, "model": m, "modified_at": _now(), "size": 0, "digest": "", "details": {}}
+                for m in self.config.models
+            ]})
+        elif self.path == "/api/ps":
+            now = time.time()
+            with self.loaded_lock:
+                running = [(name, expires) for name, expires in self.loaded.items() if expires > now]
+            self._send_json({"models": [{
+                "name": name, "model": name, "size": 0, "digest": "", "details": {},
+                "expires_at": datetime.datetime.fromtimestamp(expires, datetime.timezone.utc).isoformat(),
+                "size_vram": 0
+            } for name, expires in running]})
+        elif self.path in ("/", "/api/version"):
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def do_POST(self):
+        request = self._read_json()
+        routes = {
+            "/api/embed": self._embed,
+            "/api/embeddings": self._embeddings,
+            "/api/chat": self._chat,
+            "/api/generate": self._generate,
+        }
+        if self.path not in routes:
+            self._send_json({"error": f"unknown path {self.path}"}, status=404)
+            return
+        if self.config.should_fail(self.path):
+            self._send_json({"error": f"injected failure for {self.path}"}, status=self.config.error_status)
+            return
+        self._mark_loaded(request)
+        with self.config.slot():
+            routes[self.path](request)
+
+    def _mark_loaded(self, request: Dict[str, Any]):
+        keep_alive = request.get("keep_alive", "5m")
+        if isinstance(keep_alive, str):
+            match = re.fullmatch(r"(-?\d+(?:\.\d+)?)([smh]?)", keep_alive.strip())
+            seconds = float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)] if match else 300
+        else:
+            seconds = float(keep_alive)
+        # Negative keep_alive keeps the model loaded indefinitely, 0 unloads it
+        expires = time.time() + (seconds if seconds >= 0 else 10 * 365 * 86400)
+        with self.loaded_lock:
+            if seconds == 0:
+                self.loaded.pop(request.get("model"), None)
+            else:
+                self.loaded[request.get("model")] = expires
+
+    def _embed(self, request: Dict[str, Any]):
+        inputs = request.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        time.sleep(self.config.embed_latency)
+        self._send_json({
+            "model": request.get("model"),
+            "embeddings": [hash_embedding(text, self.config.dim) for text in inputs],
+            "total_duration": int(self.config.embed_latency * 1e9),
+            "prompt_eval_count": sum(len(WORD.findall(text)) for text in inputs)
+        })
+
+    def _embeddings(self, request: Dict[str, Any]):
+        # Legacy single-prompt endpoint
+        time.sleep(self.config.embed_latency)
+        self._send_json({"embedding": hash_embedding(request.get("prompt", ""), self.config.dim)})
+
+    def _completion_tokens(self, question: str) -> List[str]:
+        if self.config.completion_mode == "canned":
+            responses = self.config.canned_responses
+            key = next((k for k in responses if k and k.lower() in question.lower()), "")
+            text = responses.get(key, "")
+        else:
+            text = "Answer: " + question
+        words = text.split()
+        return [w + " " for w in words[:-1]] + words[-1:]
+
+    def _complete(self, request: Dict[str, Any], tokens: List[str], prompt_tokens: int, wrap):
+        """Send ``tokens`` as one JSON response or an NDJSON stream; ``wrap`` builds the per-token payload."""
+        delay = 1.0 / self.config.tokens_per_second if self.config.tokens_per_second else 0.0
+        start = time.perf_counter()
+        time.sleep(self.config.chat_latency)
+        final = {
+            "model": request.get("model"),
+            "created_at": _now(),
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.config.chat_latency * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(delay * len(tokens) * 1e9),
+        }
+
+        if not request.get("stream", True):
+            time.sleep(delay * len(tokens))
+            final.update(wrap("".join(tokens)))
+            final["total_duration"] = int((time.perf_counter() - start) * 1e9)
+            self._send_json(final)
+            return
+
+        # Newline-delimited JSON, one token per line, connection closed at the end
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for token in tokens:
+            line = {"model": request.get("model"), "created_at": _now(), "done": False, **wrap(token)}
+            self.wfile.write((json.dumps(line) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(delay)
+        final.update(wrap(""))
+        final["total_duration"] = int((time.perf_counter() - start) * 1e9)
+        self.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def _chat(self, request: Dict[str, Any]):
+        messages = request.get("messages", [])
+        question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        prompt_tokens = sum(len(WORD.findall(m.get("content", ""))) for m in messages)
+        self._complete(request, self._completion_tokens(question), prompt_tokens,
+                       lambda text: {"message": {"role": "assistant", "content": text}})
+
+    def _generate(self, request: Dict[str, Any]):
+        prompt = request.get("prompt", "")
+        if not prompt:
+            # An empty prompt only loads the model
+            self._send_json({"model": request.get("model"), "created_at": _now(), "response": "",
+                             "done": True, "done_reason": "load"})
+            return
+        self._complete(request, self._completion_tokens(prompt), len(WORD.findall(prompt)),
+                       lambda text: {"response": text})
+
+
+class FakeOllamaServer:
+    """Runs the fake API on a background thread; port 0 picks a free port."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: Optional[FakeOllamaConfig] = None):
+        self.config = config or FakeOllamaConfig()
+        handler = type("ConfiguredFakeOllamaHandler", (FakeOllamaHandler,),
+                       {"config": self.config, "loaded": {}, "loaded_lock": threading.Lock()})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+@contextmanager
+def use_fake_ollama(config: Optional[FakeOllamaConfig] = None):
+    """Start a fake server and point OLLAMA_BASE_URL at it for the duration of the block."""
+    previous = os.environ.get("OLLAMA_BASE_URL")
+    with FakeOllamaServer(config=config) as server:
+        os.environ["OLLAMA_BASE_URL"] = server.base_url
+        try:
+            yield server
+        finally:
+            if previous is None:
+                os.environ.pop("OLLAMA_BASE_URL", None)
+            else:
+                os.environ["OLLAMA_BASE_URL"] = previous
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--chat-latency", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--completion-mode", choices=["echo", "canned"], default="echo")
+    parser.add_argument("--canned", action="append", default=[], metavar="KEYWORD=ANSWER",
+                        help="Canned answer for questions containing KEYWORD (empty KEYWORD is the fallback)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--error-path", action="append", dest="error_paths",
+                        help="Only inject errors on this endpoint (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--parallel", type=int, default=0,
+                        help="Requests served at once, like OLLAMA_NUM_PARALLEL (0: no limit)")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, FakeOllamaConfig(
+        embed_latency=args.embed_latency,
+        chat_latency=args.chat_latency,
+        tokens_per_second=args.tokens_per_second,
+        dim=args.dim,
+        completion_mode=args.completion_mode,
+        canned_responses=dict(item.split("=", 1) for item in args.canned) or None,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        error_paths=args.error_paths,
+        seed=args.seed,
+        parallel=args.parallel
+    ))
+    print(f"Fake Ollama listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
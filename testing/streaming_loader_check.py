@@ -0,0 +1,66 @@
+"""Check StreamingTextLoader on files with awkward window boundaries.
+
+Writes a few text files whose windows include edge cases (a window of nothing
+but whitespace, paragraphs straddling window boundaries, a file shorter than
+one window) and checks that streaming them does not fail, that every chunk
+fits chunk_size and sits at its start_index, and that every word of the file
+ends up in a chunk.
+
+Usage (from the repository root):
+    python -m testing.streaming_loader_check
+"""
+from database.streaming_text_loader import StreamingTextLoader
+import os
+import sys
+import tempfile
+
+CHUNK_SIZE = 200
+CHUNK_OVERLAP = 40
+WINDOW_SIZE = 4 * CHUNK_SIZE
+
+
+def prose(words: int, seed: int = 0) -> str:
+    vocabulary = ["contract", "notice", "period", "payment", "clause", "party", "term", "renewal"]
+    return " ".join(f"{vocabulary[(i * 7 + seed) % len(vocabulary)]}{i}" for i in range(words))
+
+
+CASES = {
+    "blank window": prose(150) + " " * (3 * WINDOW_SIZE) + prose(150, seed=3),
+    "blank first window": "\n" * (2 * WINDOW_SIZE) + prose(300),
+    "only whitespace": " \n" * (2 * WINDOW_SIZE),
+    "paragraphs": "\n\n".join(prose(40, seed=i) for i in range(30)),
+    "shorter than a window": prose(20),
+}
+
+
+def check(name: str, text: str, workdir: str) -> bool:
+    path = os.path.join(workdir, f"{name.replace(' ', '_')}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    loader = StreamingTextLoader(path, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, window_size=WINDOW_SIZE)
+    try:
+        streamed = [(doc.metadata["start_index"], doc.page_content) for doc in loader.lazy_load()]
+    except Exception as e:
+        print(f"❌ {name}: {type(e).__name__}: {e}")
+        return False
+    if any(len(chunk) > CHUNK_SIZE for _, chunk in streamed):
+        print(f"❌ {name}: a chunk is longer than {CHUNK_SIZE} characters")
+        return False
+    if any(text[start:start + len(chunk)] != chunk for start, chunk in streamed):
+        print(f"❌ {name}: a start_index does not point at its chunk")
+        return False
+    covered = set()
+    for _, chunk in streamed:
+        covered.update(chunk.split())
+    missing = set(text.split()) - covered
+    if missing:
+        print(f"❌ {name}: {len(missing)} words are in no chunk, e.g. {sorted(missing)[0]!r}")
+        return False
+    print(f"✅ {name}: {len(streamed)} chunks")
+    return True
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [check(name, text, workdir) for name, text in CASES.items()]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,194 @@
+"""Memory accounting for ingestion.
+
+``memory_stage(name)`` records the RSS growth of a stage in the parent (and,
+with RAG_TRACEMALLOC=1, the peak of Python allocations via tracemalloc).
+``MemoryMonitor`` samples the RSS of the parent and its pool workers and
+tells the ingestion loop how many files it may have in flight so the total
+stays under INGEST_MEMORY_BUDGET_MB.
+"""
+from utils.metrics import metrics_registry
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional
+import os
+import threading
+import tracemalloc
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Resident set size of a process (default: this one); None if it cannot be read."""
+    pid = pid or os.getpid()
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_bytes() -> Dict[str, Optional[int]]:
+    """Peak RSS of this process and of its largest waited-for child, from getrusage."""
+    try:
+        import resource
+    except ImportError:
+        return {"self": None, "children": None}
+    # ru_maxrss is kilobytes on Linux
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    }
+
+
+def memory_budget_bytes() -> int:
+    """INGEST_MEMORY_BUDGET_MB in bytes; 0 means no budget."""
+    return int(float(os.getenv("INGEST_MEMORY_BUDGET_MB", "0")) * MB)
+
+
+@contextmanager
+def memory_stage(stage: str, **labels):
+    """Record how much the parent's memory grew during a stage."""
+    trace = os.getenv("RAG_TRACEMALLOC", "").lower() in ("1", "true", "on")
+    started_tracing = False
+    if trace and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracing = True
+    if trace:
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    rss_before = rss_bytes() or 0
+    try:
+        yield
+    finally:
+        rss_after = rss_bytes() or 0
+        metrics_registry.observe("rag_stage_rss_growth_bytes", max(0, rss_after - rss_before), stage=stage, **labels)
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            metrics_registry.observe("rag_stage_traced_peak_bytes", max(0, peak - traced_before), stage=stage, **labels)
+            if started_tracing:
+                tracemalloc.stop()
+
+
+class MemoryMonitor:
+    """Samples the RSS of this process and its workers and sizes the submission window.
+
+    Above ``high_watermark`` of the budget the window shrinks by half (never
+    below one file), at most once per RSS sample so a single high reading is
+    not acted on repeatedly; below ``low_watermark`` it grows back one file at
+    a time.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, interval: float = 0.25,
+                 high_watermark: float = 0.85, low_watermark: float = 0.6):
+        self.budget_bytes = memory_budget_bytes() if budget_bytes is None else budget_bytes
+        self.interval = interval
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.current_total = 0
+        self.peak_total = 0
+        self.peak_parent = 0
+        self.peak_workers = {}
+        self.throttle_events = 0
+        self.min_window = None
+        # Number of samples taken, and the sample the window was last shrunk on
+        self.samples = 0
+        self._throttled_sample = None
+        self._pids = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def watch(self, pids: Iterable[int]):
+        with self._lock:
+            self._pids.update(pids)
+
+    def sample(self) -> int:
+        parent = rss_bytes() or 0
+        total = parent
+        with self._lock:
+            pids = list(self._pids)
+        for pid in pids:
+            rss = rss_bytes(pid)
+            if rss is None:
+                # Worker exited
+                with self._lock:
+                    self._pids.discard(pid)
+                continue
+            total += rss
+            self.peak_workers[pid] = max(self.peak_workers.get(pid, 0), rss)
+        self.current_total = total
+        self.samples += 1
+        self.peak_parent = max(self.peak_parent, parent)
+        self.peak_total = max(self.peak_total, total)
+        return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self) -> "MemoryMonitor":
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="memory-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        metrics_registry.observe("rag_ingest_peak_rss_bytes", self.peak_total)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def window(self, current: int, maximum: int) -> int:
+        """How many files may be in flight now, given the last RSS sample."""
+        if not self.budget_bytes:
+            return maximum
+        used = self.current_total
+        if used >= self.budget_bytes * self.high_watermark:
+            if current <= 1 or self._throttled_sample == self.samples:
+                # Already shrunk for this sample; wait for a new one to see the effect
+                new = current
+            else:
+                new = max(1, current // 2)
+                self._throttled_sample = self.samples
+                self.throttle_events += 1
+                metrics_registry.inc("rag_ingest_throttle_total")
+                print(f"🧠 Memory at {used / MB:.0f} of {self.budget_bytes / MB:.0f} MB, "
+                      f"reducing concurrent files from {current} to {new}")
+        elif used <= self.budget_bytes * self.low_watermark and current < maximum:
+            new = current + 1
+        else:
+            new = current
+        self.min_window = new if self.min_window is None else min(self.min_window, new)
+        return new
+
+    def report(self) -> Dict[str, Any]:
+        peaks = peak_rss_bytes()
+        return {
+            "budget_mb": self.budget_bytes / MB if self.budget_bytes else None,
+            "peak_total_mb": self.peak_total / MB,
+            "peak_parent_mb": self.peak_parent / MB,
+            "peak_worker_mb": max(self.peak_workers.values(), default=0) / MB,
+            "workers_seen": len(self.peak_workers),
+            "throttle_events": self.throttle_events,
+            "min_window": self.min_window,
+            "getrusage_peak_parent_mb": peaks["self"] / MB if peaks["self"] else None,
+            "getrusage_peak_child_mb": peaks["children"] / MB if peaks["children"] else None
+        }
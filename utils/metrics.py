@@ -0,0 +1,490 @@
+"""In-process metrics: stage timings and counters for ingestion and queries.
+
+Stages are timed with ``timed(stage, **labels)``, which feeds the
+``rag_stage_duration_seconds`` histogram. The registry can be exported as
+Prometheus text (the API's /metrics endpoint) or appended periodically to a
+rotating JSON-lines file (METRICS_FILE).
+
+Worker processes record into their own copy of the registry; return
+``metrics_registry.drain()`` with the task result and ``merge()`` it in the
+parent.
+"""
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+STAGES = ("scan", "render", "ocr", "load", "chunk", "embed", "upsert", "retrieve", "rerank", "pack", "generate")
+STAGE_HISTOGRAM = "rag_stage_duration_seconds"
+STAGE_ERRORS = "rag_stage_errors_total"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def percentile(values: Iterable[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, q in [0, 100]; None for no samples."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by name and labels.
+
+    Histograms keep cumulative bucket counts for export plus the last
+    ``sample_size`` observations for percentiles.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, sample_size: int = 1000):
+        self.buckets = buckets
+        self.sample_size = sample_size
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._counters = {}
+        self._histograms = {}
+
+    def _check_pid(self):
+        # A forked worker inherits the parent's numbers; start it from zero so
+        # drain() only returns what the worker itself recorded
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _histogram(self, name: str, key) -> Dict[str, Any]:
+        histogram = self._histograms.setdefault(name, {}).get(key)
+        if histogram is None:
+            histogram = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0,
+                         "samples": deque(maxlen=self.sample_size)}
+            self._histograms[name][key] = histogram
+        return histogram
+
+    def inc(self, name: str, value: float = 1, **labels):
+        self._check_pid()
+        key = _label_key(labels)
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        self._check_pid()
+        key = _label_key(labels)
+        with self._lock:
+            histogram = self._histogram(name, key)
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            histogram["samples"].append(value)
+
+    @contextmanager
+    def timed(self, stage: str, **labels):
+        """Time the enclosed block as one ``stage`` observation; failures are counted separately."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(STAGE_ERRORS, stage=stage, **labels)
+            raise
+        finally:
+            self.observe(STAGE_HISTOGRAM, time.perf_counter() - start_time, stage=stage, **labels)
+
+    def snapshot(self, include_samples: bool = True) -> Dict[str, Any]:
+        """Plain-data copy of the registry (picklable and JSON-serializable)."""
+        self._check_pid()
+        with self._lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: [{
+                        "labels": dict(key),
+                        "buckets": list(h["buckets"]),
+                        "sum": h["sum"],
+                        "count": h["count"],
+                        **({"samples": list(h["samples"])} if include_samples else {
+                            "p50": percentile(h["samples"], 50),
+                            "p95": percentile(h["samples"], 95),
+                            "p99": percentile(h["samples"], 99)
+                        })
+                    } for key, h in series.items()]
+                    for name, series in self._histograms.items()
+                }
+            }
+
+    def drain(self) -> Dict[str, Any]:
+        """Snapshot and clear; used by worker processes to hand their deltas to the parent."""
+        snapshot = self.snapshot()
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+        return snapshot
+
+    def merge(self, snapshot: Optional[Dict[str, Any]]):
+        """Add a snapshot (e.g. a worker's drain()) into this registry."""
+        if not snapshot:
+            return
+        self._check_pid()
+        with self._lock:
+            for name, series in snapshot.get("counters", {}).items():
+                counters = self._counters.setdefault(name, {})
+                for entry in series:
+                    key = _label_key(entry["labels"])
+                    counters[key] = counters.get(key, 0) + entry["value"]
+            for name, series in snapshot.get("histograms", {}).items():
+                for entry in series:
+                    histogram = self._histogram(name, _label_key(entry["labels"]))
+                    histogram["buckets"] = [a + b for a, b in zip(histogram["buckets"], entry["buckets"])]
+                    histogram["sum"] += entry["sum"]
+                    histogram["count"] += entry["count"]
+                    histogram["samples"].extend(entry.get("samples", []))
+
+    def clear(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def stage_summary(self, **label_filter) -> Dict[str, Dict[str, Any]]:
+        """Count, total and p50/p95/p99 per stage, across all other labels."""
+        self._check_pid()
+        wanted = {k: str(v) for k, v in label_filter.items()}
+        stages = {}
+        with self._lock:
+            for key, histogram in self._histograms.get(STAGE_HISTOGRAM, {}).items():
+                labels = dict(key)
+                if any(labels.get(k) != v for k, v in wanted.items()):
+                    continue
+                stage = stages.setdefault(labels.get("stage"), {"count": 0, "total": 0.0, "samples": []})
+                stage["count"] += histogram["count"]
+                stage["total"] += histogram["sum"]
+                stage["samples"].extend(histogram["samples"])
+        return {
+            name: {
+                "count": stage["count"],
+                "total": stage["total"],
+                "mean": stage["total"] / stage["count"] if stage["count"] else None,
+                "p50": percentile(stage["samples"], 50),
+                "p95": percentile(stage["samples"], 95),
+                "p99": percentile(stage["samples"], 99)
+            }
+            for name, stage in stages.items()
+        }
+
+    def export_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        self._check_pid()
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in self._counters[name].items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted(self._histograms):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in self._histograms[name].items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (math.inf,), histogram["buckets"]):
+                        cumulative += count
+                        le = "+Inf" if bound == math.inf else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram['sum']}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+timed = metrics_registry.timed
+
+
+class MetricsFileWriter:
+    """Append a registry snapshot to a JSON-lines file every ``interval`` seconds.
+
+    The file is rotated like logging's RotatingFileHandler: when it grows past
+    ``max_bytes`` it becomes ``<path>.1`` (older files shift up to
+    ``backup_count``) and a new file is started. The API, CLI and Streamlit
+    can share one file, so the size check, rotation and append happen under
+    an exclusive lock on ``<path>.lock`` (where fcntl is available); without
+    it two processes could rotate at once and drop a file of history.
+    """
+
+    def __init__(self, path: str, interval: float = 60.0, max_bytes: int = 5 * 1024 * 1024,
+                 backup_count: int = 3, registry: MetricsRegistry = metrics_registry):
+        self.path = path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write(self):
+        record = {"timestamp": time.time(), "pid": os.getpid(),
+                  "metrics": self.registry.snapshot(include_samples=False)}
+        line = json.dumps(record) + "\n"
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._locked():
+            # Checked under the lock: another process may have just rotated
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except Exception as e:
+                print(f"⚠️  Failed to write metrics to {self.path}: {str(e)}")
+
+    def start(self) -> "MetricsFileWriter":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="metrics-file-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.write()
+
+
+def read_metrics_file(path: str, include_rotated: bool = True) -> List[Dict[str, Any]]:
+    """Snapshots written by MetricsFileWriter, oldest first."""
+    paths = [path]
+    if include_rotated:
+        i = 1
+        while os.path.exists(f"{path}.{i}"):
+            paths.insert(0, f"{path}.{i}")
+            i += 1
+    records = []
+    for file_path in paths:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return records
+
+
+def bucket_percentile(buckets: List[int], q: float, bounds: Tuple[float, ...] = DEFAULT_BUCKETS) -> Optional[float]:
+    """Percentile estimated from histogram bucket counts (linear within a bucket, like histogram_quantile)."""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = q / 100.0 * total
+    cumulative = 0
+    for i, count in enumerate(buckets):
+        if count and cumulative + count >= rank:
+            if i >= len(bounds):
+                # +Inf bucket: the largest finite bound is all we know
+                return bounds[-1]
+            lower = bounds[i - 1] if i > 0 else 0.0
+            return lower + (bounds[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return bounds[-1]
+
+
+def _by_pid(records: List[Dict[str, Any]]) -> Dict[Any, List[Dict[str, Any]]]:
+    processes = {}
+    for record in sorted(records, key=lambda r: r.get("timestamp", 0)):
+        processes.setdefault(record.get("pid"), []).append(record)
+    return processes
+
+
+def _series_delta(newer: Dict[str, Any], older: Optional[Dict[str, Any]], kind: str) -> Dict[str, Any]:
+    """newer - older for one counter or histogram series; a series that went down belongs to a new process."""
+    if older is None:
+        return newer
+    if kind == "counters":
+        if newer["value"] < older["value"]:
+            return newer
+        return {"labels": newer["labels"], "value": newer["value"] - older["value"]}
+    if newer["count"] < older["count"]:
+        return newer
+    return {
+        "labels": newer["labels"],
+        "buckets": [a - b for a, b in zip(newer["buckets"], older["buckets"])],
+        "sum": newer["sum"] - older["sum"],
+        "count": newer["count"] - older["count"]
+    }
+
+
+def snapshot_delta(newer: Dict[str, Any], older: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """What one process recorded between two of its cumulative snapshots."""
+    delta = {}
+    for kind in ("counters", "histograms"):
+        delta[kind] = {}
+        for name, series in newer.get(kind, {}).items():
+            previous = {
+                _label_key(entry["labels"]): entry
+                for entry in ((older or {}).get(kind, {}).get(name, []))
+            }
+            delta[kind][name] = [
+                _series_delta(entry, previous.get(_label_key(entry["labels"])), kind) for entry in series
+            ]
+    return delta
+
+
+def window_snapshot(records: List[Dict[str, Any]], window_seconds: Optional[float] = None,
+                    now: Optional[float] = None) -> Dict[str, Any]:
+    """Combined activity of every process in a metrics file over the last ``window_seconds``.
+
+    Each process writes cumulative snapshots, so its activity in the window is
+    its latest snapshot minus the last one written before the window started.
+    Without a window, the latest snapshot of every process is summed.
+    """
+    now = time.time() if now is None else now
+    start = now - window_seconds if window_seconds else None
+    combined = MetricsRegistry()
+    for snapshots in _by_pid(records).values():
+        latest = snapshots[-1]
+        if start is not None and latest.get("timestamp", 0) < start:
+            continue
+        baseline = None
+        if start is not None:
+            earlier = [s for s in snapshots if s.get("timestamp", 0) < start]
+            baseline = earlier[-1]["metrics"] if earlier else None
+        combined.merge(snapshot_delta(latest["metrics"], baseline))
+    return combined.snapshot(include_samples=False)
+
+
+def histogram_summary(snapshot: Dict[str, Any], name: str, by: Tuple[str, ...] = (),
+                      **label_filter) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+    """Count, mean and bucket-estimated p50/p95/p99 of a histogram, grouped by the ``by`` labels."""
+    wanted = {k: str(v) for k, v in label_filter.items()}
+    groups = {}
+    for entry in snapshot.get("histograms", {}).get(name, []):
+        labels = entry["labels"]
+        if any(labels.get(k) != v for k, v in wanted.items()):
+            continue
+        group = groups.setdefault(tuple(labels.get(k) for k in by), {"buckets": None, "sum": 0.0, "count": 0})
+        group["buckets"] = list(entry["buckets"]) if group["buckets"] is None else \
+            [a + b for a, b in zip(group["buckets"], entry["buckets"])]
+        group["sum"] += entry["sum"]
+        group["count"] += entry["count"]
+    return {
+        key: {
+            "count": group["count"],
+            "mean": group["sum"] / group["count"] if group["count"] else None,
+            "p50": bucket_percentile(group["buckets"], 50),
+            "p95": bucket_percentile(group["buckets"], 95),
+            "p99": bucket_percentile(group["buckets"], 99)
+        }
+        for key, group in groups.items() if group["count"]
+    }
+
+
+def counter_totals(snapshot: Dict[str, Any], name: str, by: Tuple[str, ...] = (),
+                   **label_filter) -> Dict[Tuple[str, ...], float]:
+    """Sum of a counter, grouped by the ``by`` labels."""
+    wanted = {k: str(v) for k, v in label_filter.items()}
+    totals = {}
+    for entry in snapshot.get("counters", {}).get(name, []):
+        labels = entry["labels"]
+        if any(labels.get(k) != v for k, v in wanted.items()):
+            continue
+        key = tuple(labels.get(k) for k in by)
+        totals[key] = totals.get(key, 0) + entry["value"]
+    return totals
+
+
+def counter_rate_history(records: List[Dict[str, Any]], name: str, bin_seconds: float = 300,
+                         **label_filter) -> List[Tuple[float, float]]:
+    """(bin start, per-second rate) of a counter across all processes, from consecutive snapshots."""
+    bins = {}
+    for snapshots in _by_pid(records).values():
+        previous = None
+        for record in snapshots:
+            total = sum(counter_totals(record["metrics"], name, **label_filter).values())
+            if previous is not None:
+                increase = total - previous if total >= previous else total
+                if increase:
+                    start = record["timestamp"] - record["timestamp"] % bin_seconds
+                    bins[start] = bins.get(start, 0) + increase
+            previous = total
+    return [(start, bins[start] / bin_seconds) for start in sorted(bins)]
+
+
+_metrics_writer = None
+_metrics_writer_lock = threading.Lock()
+
+
+def start_metrics_file(path: Optional[str] = None) -> Optional[MetricsFileWriter]:
+    """Start the process-wide metrics file writer if METRICS_FILE (or ``path``) is set."""
+    global _metrics_writer
+    path = path or os.getenv("METRICS_FILE")
+    # Worker processes (which re-import the main module under spawn/forkserver)
+    # hand their metrics to the parent, which writes the file
+    if not path or multiprocessing.parent_process() is not None:
+        return None
+    with _metrics_writer_lock:
+        if _metrics_writer is None:
+            _metrics_writer = MetricsFileWriter(
+                path,
+                interval=float(os.getenv("METRICS_INTERVAL", "60")),
+                max_bytes=int(os.getenv("METRICS_FILE_MAX_BYTES", str(5 * 1024 * 1024))),
+                backup_count=int(os.getenv("METRICS_FILE_BACKUPS", "3"))
+            )
+        return _metrics_writer.start()
+
+
+def format_stage_summary(summary: Dict[str, Dict[str, Any]]) -> str:
+    """Plain-text table of stage_summary(), in pipeline order."""
+    order = {stage: i for i, stage in enumerate(STAGES)}
+    lines = [f"{'stage':<10}{'count':>8}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for stage in sorted(summary, key=lambda s: order.get(s, len(order))):
+        entry = summary[stage]
+        lines.append(f"{stage:<10}{entry['count']:>8}{entry['total']:>10.2f}"
+                     f"{entry['p50'] * 1000:>10.1f}{entry['p95'] * 1000:>10.1f}{entry['p99'] * 1000:>10.1f}")
+    return "\n".join(lines)
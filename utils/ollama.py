@@ -0,0 +1,227 @@
+from typing import Any, Dict, Optional, Union
+import datetime
+import os
+import re
+import threading
+import time
+
+import requests
+
+from utils.scheduler import BACKGROUND, get_scheduler
+
+DEFAULT_OLLAMA_BASE_URL = "http://localhost:11434"
+
+
+def get_ollama_base_url() -> str:
+    """Ollama endpoint, overridable with OLLAMA_BASE_URL (e.g. to point at testing/fake_ollama.py).
+
+    Read at call time so it also picks up values loaded by load_dotenv() after import.
+    """
+    return os.getenv("OLLAMA_BASE_URL", DEFAULT_OLLAMA_BASE_URL).rstrip("/")
+
+
+def get_keep_alive() -> str:
+    """How long Ollama keeps a model in memory after a request (OLLAMA_KEEP_ALIVE, e.g. "30m", "1h", "-1")."""
+    return os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+
+def parse_duration(value: Union[str, int, float]) -> Optional[float]:
+    """Seconds for an Ollama duration ("90", "45s", "30m", "2h"); None means forever (negative)."""
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        value = value.strip().lower()
+        units = {"s": 1, "m": 60, "h": 3600}
+        if value and value[-1] in units:
+            seconds = float(value[:-1]) * units[value[-1]]
+        else:
+            seconds = float(value)
+    return None if seconds < 0 else seconds
+
+
+def normalize_model_name(name: str) -> str:
+    """Ollama's full name for a model: untagged names mean the ``latest`` tag ("nomic-embed-text:latest")."""
+    if ":" not in name.rsplit("/", 1)[-1]:
+        return f"{name}:latest"
+    return name
+
+
+def get_keep_alive_seconds() -> int:
+    """get_keep_alive() in whole seconds (-1: forever), for clients such as OllamaEmbeddings that only take a number."""
+    seconds = parse_duration(get_keep_alive())
+    return -1 if seconds is None else int(seconds)
+
+
+class ModelLifecycleManager:
+    """Preloads the embedding model and the LLM in Ollama and keeps them warm.
+
+    warm_up() loads each model with the configured keep_alive. start() does
+    that on a background thread and then re-warms any model that is about to
+    expire, but only while sessions are active (see touch()), so an idle
+    app still lets Ollama free the memory.
+    """
+
+    def __init__(self, embeddings_model: Optional[str], llm_model: Optional[str],
+                 keep_alive: Optional[str] = None, rewarm_margin: float = 120.0,
+                 check_interval: float = 30.0, small_llm_model: Optional[str] = None):
+        self.models = {}
+        if embeddings_model:
+            self.models[embeddings_model] = "embedding"
+        if llm_model:
+            self.models[llm_model] = "llm"
+        if small_llm_model:
+            # First stage of the generation cascade
+            self.models.setdefault(small_llm_model, "llm")
+        self.keep_alive = keep_alive or get_keep_alive()
+        self.rewarm_margin = rewarm_margin
+        self.check_interval = check_interval
+        self.last_activity = None
+        # Last /api/ps result (normalized name -> info), refreshed by the background loop
+        self.loaded = None
+        self.loaded_checked_at = None
+        self.load_state = {
+            model: {"kind": kind, "state": "not loaded", "load_time": None, "error": None, "warmed_at": None}
+            for model, kind in self.models.items()
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def touch(self):
+        """Record session activity; keeps the background re-warming alive."""
+        self.last_activity = time.time()
+
+    def _set_state(self, model: str, **fields):
+        with self._lock:
+            self.load_state[model].update(fields)
+
+    def warm_up(self, model: Optional[str] = None) -> Dict[str, Any]:
+        """Load one model (or all of them) into Ollama memory and report how long it took."""
+        for name in ([model] if model else list(self.models)):
+            kind = self.models[name]
+            self._set_state(name, state="loading", error=None)
+            start_time = time.perf_counter()
+            try:
+                with get_scheduler().slot(BACKGROUND, flow="warm-up"):
+                    self._load(name, kind)
+                self._set_state(name, state="loaded", load_time=time.perf_counter() - start_time,
+                                warmed_at=time.time())
+            except Exception as e:
+                self._set_state(name, state="error", error=str(e))
+        return self.status()
+
+    def _load(self, name: str, kind: str):
+        if kind == "embedding":
+            response = requests.post(f"{get_ollama_base_url()}/api/embed", json={
+                "model": name, "input": "warm-up", "keep_alive": self.keep_alive
+            }, timeout=300)
+        else:
+            # A generate request without a prompt only loads the model
+            response = requests.post(f"{get_ollama_base_url()}/api/generate", json={
+                "model": name, "keep_alive": self.keep_alive, "stream": False
+            }, timeout=300)
+        response.raise_for_status()
+
+    def loaded_models(self) -> Dict[str, Dict[str, Any]]:
+        """Models Ollama currently holds in memory (GET /api/ps), by normalized name."""
+        response = requests.get(f"{get_ollama_base_url()}/api/ps", timeout=3)
+        response.raise_for_status()
+        return {normalize_model_name(m.get("name") or m.get("model")): m for m in response.json().get("models", [])}
+
+    def refresh_loaded(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Fetch /api/ps and keep the result for status(); None if Ollama could not be asked."""
+        try:
+            loaded = self.loaded_models()
+        except Exception:
+            loaded = None
+        with self._lock:
+            self.loaded = loaded
+            self.loaded_checked_at = time.time()
+        return loaded
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Load state per model, from the last /api/ps check of the background loop (no request here)."""
+        with self._lock:
+            status = {model: dict(state) for model, state in self.load_state.items()}
+            loaded = self.loaded
+        if loaded is None:
+            return status
+        for model, state in status.items():
+            info = loaded.get(normalize_model_name(model))
+            if info:
+                state["state"] = "loaded"
+                state["expires_at"] = info.get("expires_at")
+                state["size_vram"] = info.get("size_vram")
+            elif state["state"] == "loaded":
+                state["state"] = "expired"
+        return status
+
+    def _expiring(self, model: str, loaded: Optional[Dict[str, Dict[str, Any]]]) -> bool:
+        keep_alive = parse_duration(self.keep_alive)
+        model = normalize_model_name(model)
+        if keep_alive is None:
+            return model not in loaded if loaded is not None else False
+        if loaded is not None:
+            info = loaded.get(model)
+            if info is None:
+                return True
+            expires_at = info.get("expires_at")
+            if expires_at:
+                try:
+                    # Ollama reports nanoseconds; fromisoformat accepts at most microseconds
+                    expires = datetime.datetime.fromisoformat(
+                        re.sub(r"(\.\d{6})\d+", r"\1", expires_at.replace("Z", "+00:00"))
+                    )
+                    remaining = (expires - datetime.datetime.now(expires.tzinfo)).total_seconds()
+                    return remaining < self.rewarm_margin
+                except ValueError:
+                    pass
+        # /api/ps unavailable: fall back to our own record of the last warm-up
+        warmed_at = self.load_state[model]["warmed_at"]
+        return warmed_at is None or time.time() - warmed_at > keep_alive - self.rewarm_margin
+
+    def _session_active(self) -> bool:
+        keep_alive = parse_duration(self.keep_alive)
+        if self.last_activity is None:
+            return False
+        return keep_alive is None or time.time() - self.last_activity < keep_alive
+
+    def _run(self):
+        self.warm_up()
+        self.refresh_loaded()
+        while not self._stop.wait(self.check_interval):
+            loaded = self.refresh_loaded()
+            if not self._session_active():
+                continue
+            for model in self.models:
+                if self._expiring(model, loaded):
+                    self.warm_up(model)
+
+    def start(self) -> "ModelLifecycleManager":
+        """Warm up in the background and keep re-warming; safe to call repeatedly."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="ollama-warmup", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+_model_manager = None
+_model_manager_lock = threading.Lock()
+
+
+def get_model_manager() -> ModelLifecycleManager:
+    """Process-wide manager for the configured EMBEDDINGS_MODEL, LLM_MODEL and SMALL_LLM_MODEL."""
+    global _model_manager
+    with _model_manager_lock:
+        if _model_manager is None:
+            _model_manager = ModelLifecycleManager(
+                embeddings_model=os.getenv("EMBEDDINGS_MODEL"),
+                llm_model=os.getenv("LLM_MODEL"),
+                small_llm_model=os.getenv("SMALL_LLM_MODEL")
+            )
+        return _model_manager
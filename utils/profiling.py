@@ -0,0 +1,177 @@
+"""Opt-in profiling of the ingestion and query paths.
+
+Set RAG_PROFILE (or pass ``--profile`` to main.py) to turn it on:
+
+    RAG_PROFILE=cprofile   deterministic cProfile, written as <name>-<pid>-<n>.prof (pstats)
+    RAG_PROFILE=sample     stack sampling every RAG_PROFILE_INTERVAL seconds (default 0.005),
+                           written as <name>-<pid>-<n>.collapsed (flamegraph.pl / speedscope format)
+    RAG_PROFILE=both       both of the above
+
+Files go to RAG_PROFILE_DIR (default ./profiles). Worker processes inherit
+the environment and write their own files. Merge a run with:
+
+    python -m utils.profiling merge profiles/ --output ingest
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+import argparse
+import cProfile
+import glob
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+
+MODES = ("cprofile", "sample", "both")
+# pid of the process whose outermost profiled block is running in this context;
+# a forked worker inherits the context but must still profile its own tasks
+_active = ContextVar("rag_profile_active", default=None)
+_sequence = itertools.count()
+_warned = set()
+
+
+def profile_mode() -> Optional[str]:
+    mode = (os.getenv("RAG_PROFILE") or "").strip().lower()
+    if mode in ("", "0", "false", "off"):
+        return None
+    if mode in ("1", "true", "on"):
+        return "both"
+    if mode not in MODES:
+        _warn(f"Unknown RAG_PROFILE '{mode}', expected one of {MODES}")
+        return None
+    return mode
+
+
+def enable_profiling(mode: str = "both", output_dir: Optional[str] = None):
+    """Turn profiling on for this process and any worker processes started after it."""
+    os.environ["RAG_PROFILE"] = mode
+    if output_dir:
+        os.environ["RAG_PROFILE_DIR"] = output_dir
+
+
+def _warn(message: str):
+    if message not in _warned:
+        _warned.add(message)
+        print(f"⚠️  {message}")
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a background thread and counts collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rag-stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profiled(name: str):
+    """Profile the enclosed block (or decorated function) when RAG_PROFILE is set.
+
+    Nested profiled blocks in the same thread are covered by the outermost
+    one. cProfile can only run once per process on some Python versions; a
+    block that cannot start it falls back to sampling only.
+    """
+    mode = profile_mode()
+    if mode is None or _active.get() == os.getpid():
+        yield
+        return
+
+    output_dir = os.getenv("RAG_PROFILE_DIR", "profiles")
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"{name}-{os.getpid()}-{int(time.time() * 1000)}-{next(_sequence)}")
+    token = _active.set(os.getpid())
+
+    profile = None
+    if mode in ("cprofile", "both"):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a concurrent request's) is already active
+            _warn(f"cProfile unavailable for '{name}' ({str(e)}); sampling only")
+            profile = None
+            mode = "sample"
+    sampler = None
+    if mode in ("sample", "both"):
+        sampler = StackSampler(threading.get_ident(), float(os.getenv("RAG_PROFILE_INTERVAL", "0.005"))).start()
+
+    try:
+        yield
+    finally:
+        _active.reset(token)
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(base + ".prof")
+        if sampler is not None:
+            sampler.stop()
+            sampler.write(base + ".collapsed")
+
+
+def merge_profiles(input_dir: str, output: str, pattern: str = "*") -> Dict[str, List[str]]:
+    """Combine every .prof and .collapsed file matching ``pattern`` into one of each."""
+    prof_files = sorted(glob.glob(os.path.join(input_dir, f"{pattern}.prof")))
+    collapsed_files = sorted(glob.glob(os.path.join(input_dir, f"{pattern}.collapsed")))
+    if prof_files:
+        pstats.Stats(*prof_files).dump_stats(output + ".prof")
+    if collapsed_files:
+        counts = Counter()
+        for path in collapsed_files:
+            # Per-process files are merged under a root frame naming the step they came from
+            step = os.path.basename(path).split("-")[0]
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if stack:
+                        counts[f"{step};{stack}"] += int(count)
+        with open(output + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+    return {"prof": prof_files, "collapsed": collapsed_files}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profiling output tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    merge = subparsers.add_parser("merge", help="Merge per-process profiles into one .prof and .collapsed")
+    merge.add_argument("input_dir")
+    merge.add_argument("--output", default="merged", help="Output path without extension")
+    merge.add_argument("--pattern", default="*", help="Glob for profile names, e.g. 'load_*'")
+    merge.add_argument("--top", type=int, default=25, help="Print the top N functions by cumulative time")
+    args = parser.parse_args()
+
+    merged = merge_profiles(args.input_dir, args.output, args.pattern)
+    print(f"Merged {len(merged['prof'])} pstats and {len(merged['collapsed'])} collapsed-stack files")
+    if merged["prof"]:
+        pstats.Stats(args.output + ".prof").sort_stats("cumulative").print_stats(args.top)
@@ -0,0 +1,236 @@
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from utils.metrics import metrics_registry, percentile
+from typing import Any, Dict, Optional
+import asyncio
+import os
+import threading
+import time
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+# Highest priority first
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+# Background slots when no total limit is configured, so ingestion never floods Ollama
+DEFAULT_BACKGROUND_CONCURRENCY = 2
+
+_current_priority = ContextVar("ollama_priority", default=INTERACTIVE)
+_current_flow = ContextVar("ollama_flow", default="default")
+
+
+@contextmanager
+def priority_context(priority: str, flow: Optional[str] = None):
+    """Run the enclosed Ollama calls in a priority class (and fairness flow, e.g. a collection)."""
+    priority_token = _current_priority.set(priority)
+    flow_token = _current_flow.set(flow) if flow is not None else None
+    try:
+        yield
+    finally:
+        _current_priority.reset(priority_token)
+        if flow_token is not None:
+            _current_flow.reset(flow_token)
+
+
+def current_priority() -> str:
+    return _current_priority.get()
+
+
+class _Ticket:
+    __slots__ = ("priority", "flow", "enqueued_at", "granted", "loop", "future")
+
+    def __init__(self, priority: str, flow: str):
+        self.priority = priority
+        self.flow = flow
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+        self.loop = None
+        self.future = None
+
+
+class OllamaScheduler:
+    """Admission control for every request sent to Ollama.
+
+    At most ``max_concurrency`` requests run at once (None: no limit), and
+    each priority class has its own limit, so background ingestion can never
+    take the slots that interactive queries need. Background defaults to one
+    slot less than the total, or DEFAULT_BACKGROUND_CONCURRENCY without a total. A free slot always goes to
+    the highest-priority class that has waiting requests and room under its
+    limit. Within a class, flows (usually collections) take turns
+    round-robin, so one large ingest cannot starve another.
+
+    The limit should match what Ollama runs in parallel (OLLAMA_NUM_PARALLEL):
+    lower wastes server capacity, higher lets requests queue inside Ollama,
+    where they are served first come first served regardless of priority.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None,
+                 class_limits: Optional[Dict[str, Optional[int]]] = None, history_size: int = 1000):
+        self.max_concurrency = max_concurrency
+        self.class_limits = class_limits or {
+            INTERACTIVE: max_concurrency,
+            BACKGROUND: default_background_limit(max_concurrency)
+        }
+        self._cond = threading.Condition()
+        self._queues = {p: OrderedDict() for p in PRIORITIES}
+        self._in_flight = {p: 0 for p in PRIORITIES}
+        self._completed = {p: 0 for p in PRIORITIES}
+        self._waits = {p: deque(maxlen=history_size) for p in PRIORITIES}
+        self._flow_waits = {}
+        self._history_size = history_size
+
+    def _enqueue(self, priority: Optional[str], flow: Optional[str],
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> _Ticket:
+        ticket = _Ticket(priority or _current_priority.get(), flow or _current_flow.get())
+        if ticket.priority not in self._queues:
+            raise ValueError(f"Unknown priority class '{ticket.priority}'")
+        if loop is not None:
+            ticket.loop = loop
+            ticket.future = loop.create_future()
+        with self._cond:
+            self._queues[ticket.priority].setdefault(ticket.flow, deque()).append(ticket)
+            self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        # Caller holds self._cond
+        while self.max_concurrency is None or sum(self._in_flight.values()) < self.max_concurrency:
+            for priority in PRIORITIES:
+                limit = self.class_limits.get(priority)
+                if self._queues[priority] and (limit is None or self._in_flight[priority] < limit):
+                    break
+            else:
+                return
+            flows = self._queues[priority]
+            flow, tickets = next(iter(flows.items()))
+            ticket = tickets.popleft()
+            # Round-robin: the flow just served goes to the back of the line
+            del flows[flow]
+            if tickets:
+                flows[flow] = tickets
+            self._grant(ticket)
+
+    def _grant(self, ticket: _Ticket):
+        wait = time.perf_counter() - ticket.enqueued_at
+        self._in_flight[ticket.priority] += 1
+        self._waits[ticket.priority].append(wait)
+        self._flow_waits.setdefault(ticket.flow, deque(maxlen=self._history_size)).append(wait)
+        metrics_registry.observe("ollama_queue_wait_seconds", wait, priority=ticket.priority, collection=ticket.flow)
+        ticket.granted = True
+        if ticket.future is not None:
+            ticket.loop.call_soon_threadsafe(self._resolve, ticket.future)
+        self._cond.notify_all()
+
+    @staticmethod
+    def _resolve(future):
+        if not future.done():
+            future.set_result(None)
+
+    def _release(self, ticket: _Ticket):
+        with self._cond:
+            self._in_flight[ticket.priority] -= 1
+            self._completed[ticket.priority] += 1
+            self._dispatch()
+
+    def _abandon(self, ticket: _Ticket):
+        with self._cond:
+            if ticket.granted:
+                self._in_flight[ticket.priority] -= 1
+                self._dispatch()
+                return
+            tickets = self._queues[ticket.priority].get(ticket.flow)
+            if tickets is not None:
+                try:
+                    tickets.remove(ticket)
+                except ValueError:
+                    pass
+                if not tickets:
+                    del self._queues[ticket.priority][ticket.flow]
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None, flow: Optional[str] = None):
+        """Block until this request may call Ollama; the slot is released on exit."""
+        ticket = self._enqueue(priority, flow)
+        with self._cond:
+            while not ticket.granted:
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, priority: Optional[str] = None, flow: Optional[str] = None):
+        """Async variant of slot(); waits on the event loop instead of a thread."""
+        ticket = self._enqueue(priority, flow, loop=asyncio.get_running_loop())
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            self._abandon(ticket)
+            raise
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, in-flight requests and wait-time percentiles (seconds) per class and flow."""
+        with self._cond:
+            classes = {}
+            for priority in PRIORITIES:
+                waits = list(self._waits[priority])
+                classes[priority] = {
+                    "queue_depth": sum(len(t) for t in self._queues[priority].values()),
+                    "in_flight": self._in_flight[priority],
+                    "limit": self.class_limits.get(priority),
+                    "completed": self._completed[priority],
+                    "wait_p50": percentile(waits, 50),
+                    "wait_p95": percentile(waits, 95),
+                    "wait_max": max(waits) if waits else None
+                }
+            flows = {
+                flow: {"wait_p50": percentile(waits, 50), "wait_p95": percentile(waits, 95), "samples": len(waits)}
+                for flow, waits in self._flow_waits.items()
+            }
+        return {"max_concurrency": self.max_concurrency, "classes": classes, "flows": flows}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _limit(value: Optional[str]) -> Optional[int]:
+    """Parse a concurrency setting; unset, empty or <= 0 means no limit."""
+    if not value:
+        return None
+    limit = int(value)
+    return limit if limit > 0 else None
+
+
+def default_background_limit(max_concurrency: Optional[int]) -> int:
+    """Background slots for a total limit: one less than the total, or DEFAULT_BACKGROUND_CONCURRENCY without one."""
+    if max_concurrency:
+        return max(1, max_concurrency - 1)
+    return DEFAULT_BACKGROUND_CONCURRENCY
+
+
+def get_scheduler() -> OllamaScheduler:
+    """Process-wide scheduler, sized from OLLAMA_MAX_CONCURRENCY / OLLAMA_BACKGROUND_CONCURRENCY.
+
+    OLLAMA_MAX_CONCURRENCY defaults to OLLAMA_NUM_PARALLEL (the server's own
+    setting) when that is set, and to no limit otherwise. Background
+    ingestion is always capped: by OLLAMA_BACKGROUND_CONCURRENCY, else one
+    slot less than the total, else DEFAULT_BACKGROUND_CONCURRENCY (2).
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            max_concurrency = _limit(os.getenv("OLLAMA_MAX_CONCURRENCY") or os.getenv("OLLAMA_NUM_PARALLEL"))
+            _scheduler = OllamaScheduler(
+                max_concurrency=max_concurrency,
+                class_limits={
+                    INTERACTIVE: _limit(os.getenv("OLLAMA_INTERACTIVE_CONCURRENCY")) or max_concurrency,
+                    BACKGROUND: _limit(os.getenv("OLLAMA_BACKGROUND_CONCURRENCY")) or default_background_limit(max_concurrency)
+                }
+            )
+        return _scheduler